@@ -0,0 +1,160 @@
+"""
+Métricas históricas vetorizadas com NumPy
+
+Todas as funções recebem uma matriz de fechamentos (pregões x símbolos),
+alinhada por data e com NaN onde o ativo não tem cotação, e calculam a
+métrica de todos os símbolos de uma vez, sem laços em Python.
+
+Ativos de calendários diferentes (cripto nos fins de semana, bolsas com
+feriados próprios) deixam buracos na matriz alinhada. Por isso cada métrica
+de um ativo usa só os pregões dele (`pack`) e o beta usa só as datas em
+comum entre o ativo e o benchmark.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+
+def price_matrix(frames, column='Close'):
+    """Alinha os históricos {símbolo: DataFrame} por data; retorna (datas, símbolos, matriz)"""
+    symbols = [symbol for symbol, frame in frames.items() if frame is not None and not frame.empty]
+    if not symbols:
+        return pd.DatetimeIndex([]), [], np.empty((0, 0))
+
+    closes = pd.concat([frames[symbol][column] for symbol in symbols], axis=1, keys=symbols, sort=True)
+    return closes.index, symbols, closes.to_numpy(dtype=np.float64)
+
+
+def _first_valid(matrix):
+    """Primeiro valor não-NaN de cada coluna"""
+    rows = np.argmax(~np.isnan(matrix), axis=0)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+def _last_valid(matrix):
+    """Último valor não-NaN de cada coluna"""
+    rows = matrix.shape[0] - 1 - np.argmax(~np.isnan(matrix[::-1]), axis=0)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+def pack(matrix, mask=None):
+    """Empurra os valores válidos de cada coluna para o fim, sem buracos
+
+    A linha i do resultado passa a ser a i-ésima cotação da coluna (contada a
+    partir do fim) e não mais uma data; o NaN fica só no topo das colunas com
+    menos cotações. `mask` escolhe as linhas mantidas (padrão: não-NaN).
+    """
+    if mask is None:
+        mask = ~np.isnan(matrix)
+    # Ordenação estável: linhas descartadas primeiro, as mantidas na ordem original
+    order = np.argsort(mask, axis=0, kind='stable')
+    return np.take_along_axis(np.where(mask, matrix, np.nan), order, axis=0)
+
+
+def log_returns(closes):
+    """Retornos logarítmicos diários (NaN onde falta cotação)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.diff(np.log(closes), axis=0)
+
+
+def total_return(closes):
+    """Retorno acumulado (%) do primeiro ao último fechamento válido"""
+    return (_last_valid(closes) / _first_valid(closes) - 1) * 100
+
+
+def annualized_volatility(returns):
+    """Volatilidade anualizada (%) dos retornos logarítmicos"""
+    return np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100
+
+
+def max_drawdown(closes):
+    """Maior queda (%) a partir de um topo anterior"""
+    peaks = np.fmax.accumulate(closes, axis=0)
+    return np.nanmin(closes / peaks - 1, axis=0) * 100
+
+
+def moving_average(closes, window):
+    """Média móvel simples dos últimos `window` fechamentos"""
+    tail = closes[-window:]
+    enough = np.sum(~np.isnan(tail), axis=0) >= window
+    return np.where(enough, np.nanmean(tail, axis=0), np.nan)
+
+
+def rsi(closes, period=14):
+    """RSI dos últimos `period` pregões (médias simples de altas e baixas)"""
+    changes = np.diff(closes[-(period + 1):], axis=0)
+    gains = np.nanmean(np.clip(changes, 0, None), axis=0)
+    losses = np.nanmean(np.clip(-changes, 0, None), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        strength = gains / losses
+    return np.where(losses == 0, 100.0, 100 - 100 / (1 + strength))
+
+
+def beta(closes, benchmark):
+    """Beta de cada coluna contra o benchmark, usando só os pregões em comum
+
+    Os retornos dos dois lados são calculados entre datas consecutivas em que
+    ambos têm cotação, então um fim de semana do BTC ou um feriado da B3 não
+    descarta os retornos em volta.
+    """
+    benchmark = np.broadcast_to(benchmark[:, None], closes.shape)
+    both = ~np.isnan(closes) & ~np.isnan(benchmark)
+    returns = log_returns(pack(closes, both))
+    benchmark = log_returns(pack(benchmark, both))
+
+    mask = ~np.isnan(returns) & ~np.isnan(benchmark)
+    count = mask.sum(axis=0)
+
+    x = np.where(mask, benchmark, 0.0)
+    y = np.where(mask, returns, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = x.sum(axis=0) / count
+        mean_y = y.sum(axis=0) / count
+        covariance = (np.where(mask, (x - mean_x) * (y - mean_y), 0.0)).sum(axis=0)
+        variance = (np.where(mask, (x - mean_x) ** 2, 0.0)).sum(axis=0)
+        return np.where(count > 1, covariance / variance, np.nan)
+
+
+def compute_metrics(closes, benchmark=None, short_window=20, long_window=50, rsi_period=14):
+    """Calcula todas as métricas para a matriz de fechamentos
+
+    `benchmark` é a série de fechamentos do índice de referência, alinhada
+    às mesmas datas. Retorna {métrica: array com um valor por símbolo}.
+    """
+    # Colunas sem dados suficientes resultam em NaN, sem avisos
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        # Cada ativo nos seus próprios pregões
+        own = pack(closes)
+        metrics = {
+            'last_price': _last_valid(own),
+            'total_return': total_return(own),
+            'annualized_volatility': annualized_volatility(log_returns(own)),
+            'max_drawdown': max_drawdown(own),
+            f'sma_{short_window}': moving_average(own, short_window),
+            f'sma_{long_window}': moving_average(own, long_window),
+            'rsi': rsi(own, rsi_period),
+            'observations': np.sum(~np.isnan(own), axis=0)
+        }
+
+        if benchmark is not None:
+            metrics['beta'] = beta(closes, benchmark)
+
+    return metrics
+
+
+def metrics_by_symbol(symbols, metrics, decimals=2):
+    """Converte {métrica: array} em {símbolo: {métrica: valor}} pronto para JSON"""
+    table = {}
+    for name, values in metrics.items():
+        if np.issubdtype(values.dtype, np.integer):
+            rounded = values.tolist()
+        else:
+            rounded = [None if np.isnan(value) else value for value in np.round(values, decimals).tolist()]
+        for symbol, value in zip(symbols, rounded):
+            table.setdefault(symbol, {})[name] = value
+    return table
@@ -1,14 +1,25 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import sys
 import json
+import asyncio
 from finance_api import FinanceAPI
+from session_store import create_session_store
+from history_manager import HistoryManager, TokenMetrics, history_tokens
+from sse import sse_stream, SSE_HEADERS
+from response_cache import ResponseCache
+from intent_router import IntentRouter
+from tool_registry import ToolSet
+from tool_output import encode
 
 app = Flask(__name__)
 CORS(app)
 
+# Máximo de rodadas de ferramentas antes de exigir a resposta final
+MAX_TOOL_ROUNDS = int(os.getenv('MAX_TOOL_ROUNDS', '3'))
+
 class FinanceChatBot:
     def __init__(self):
         """Inicializa o chatbot financeiro"""
@@ -23,12 +34,17 @@ class FinanceChatBot:
         # Inicializa o cliente da OpenAI
         self.client = OpenAI(api_key=api_key)
         
+        # Cliente assíncrono, criado sob demanda pelo modo ASGI
+        self._async_client = None
+        
         # Inicializa a API financeira
         self.finance_api = FinanceAPI()
         
-        # Histórico da conversa com contexto financeiro
-        self.conversation_history = [
-            {"role": "system", "content": """Você é um assistente financeiro especializado chamado FinanceBot. 
+        # Ferramentas financeiras (schemas prontos e despacho por dicionário)
+        self.tools = ToolSet(self.finance_api)
+        
+        # Prompt de sistema com contexto financeiro
+        self.system_prompt = """Você é um assistente financeiro especializado chamado FinanceBot. 
             Você tem acesso a dados financeiros em tempo real através de ferramentas especiais.
             
             Suas especialidades incluem:
@@ -40,174 +56,303 @@ class FinanceChatBot:
             
             Responda sempre em português de forma clara e educativa. Quando o usuário perguntar sobre:
             - Preços de ações: use get_stock_info
+            - Valuation, dividendos ou valor de mercado: use get_stock_fundamentals
             - Histórico: use get_stock_history  
             - Buscar ações: use search_stocks
             - Resumo do mercado: use get_market_summary
             - Ações em alta: use get_trending_stocks
+            - Maiores altas, quedas, picos de volume ou momentum por mercado: use screen_stocks
+            - Comparar risco e desempenho de vários ativos: use analyze_stocks
             
-            Formate suas respostas de forma organizada e fácil de entender."""}
-        ]
+            Quando precisar de dados de vários ativos, peça todas as ferramentas de uma vez,
+            na mesma resposta, em vez de uma por rodada.
+            
+            Formate suas respostas de forma organizada e fácil de entender."""
+        
+        # Históricos por sessão, com limite e expiração por inatividade
+        self.sessions = create_session_store(factory=self._new_history, table='chat_sessions')
+        
+        # Mantém cada histórico dentro do orçamento de tokens
+        self.history_manager = HistoryManager()
+        self.token_metrics = TokenMetrics()
+        
+        # Cotações e resumo do mercado respondidos sem o modelo
+        self.intent_router = IntentRouter(self.finance_api)
+        
+        # Respostas a perguntas repetidas enquanto os dados não mudam
+        self.response_cache = ResponseCache()
     
-    def _execute_finance_function(self, function_name, **kwargs):
-        """Executa funções da API financeira"""
-        try:
-            if function_name == "get_stock_info":
-                return self.finance_api.get_stock_info(kwargs.get('symbol', ''))
-            elif function_name == "get_stock_history":
-                return self.finance_api.get_stock_history(
-                    kwargs.get('symbol', ''), 
-                    kwargs.get('period', '1mo')
-                )
-            elif function_name == "search_stocks":
-                return self.finance_api.search_stocks(kwargs.get('query', ''))
-            elif function_name == "get_market_summary":
-                return self.finance_api.get_market_summary()
-            elif function_name == "get_trending_stocks":
-                return self.finance_api.get_trending_stocks()
-            else:
-                return {"error": "Função não encontrada"}
-        except Exception as e:
-            return {"error": f"Erro ao executar {function_name}: {str(e)}"}
+    def _new_history(self):
+        """Cria o histórico inicial de uma sessão"""
+        return [{"role": "system", "content": self.system_prompt}]
     
-    def get_response(self, user_message):
+    def get_response(self, user_message, session_id="default"):
         """Envia mensagem para a API e retorna a resposta"""
+        return "".join(self.stream_response(user_message, session_id)).strip()
+    
+    def stream_response(self, user_message, session_id="default"):
+        """Gera a resposta em trechos, conforme o modelo emite os tokens"""
         try:
-            # Adiciona a mensagem do usuário ao histórico
-            self.conversation_history.append({"role": "user", "content": user_message})
+            # Compacta o histórico da sessão e adiciona a mensagem do usuário
+            history = self.sessions.get(session_id)
+            compacted = self.history_manager.compact(history)
+            history.append({"role": "user", "content": user_message})
             
-            # Definição das funções disponíveis para o ChatGPT
-            functions = [
-                {
-                    "name": "get_stock_info",
-                    "description": "Obtém informações detalhadas sobre uma ação, incluindo preço atual, variação, volume, etc.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "symbol": {
-                                "type": "string",
-                                "description": "Símbolo da ação (ex: PETR4.SA, AAPL, BTC-USD)"
-                            }
-                        },
-                        "required": ["symbol"]
-                    }
-                },
-                {
-                    "name": "get_stock_history",
-                    "description": "Obtém histórico de preços de uma ação",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "symbol": {
-                                "type": "string",
-                                "description": "Símbolo da ação"
-                            },
-                            "period": {
-                                "type": "string",
-                                "description": "Período: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max",
-                                "default": "1mo"
-                            }
-                        },
-                        "required": ["symbol"]
-                    }
-                },
-                {
-                    "name": "search_stocks",
-                    "description": "Busca ações por nome ou símbolo",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Nome ou símbolo da empresa/ação para buscar"
-                            }
-                        },
-                        "required": ["query"]
-                    }
-                },
-                {
-                    "name": "get_market_summary",
-                    "description": "Obtém resumo dos principais índices do mercado",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                },
+            # Perguntas simples e repetidas são respondidas sem chamar o modelo
+            answer = self._local_answer(history, user_message)
+            if answer is not None:
+                self.sessions.save(session_id, history)
+                yield answer
+                return
+            
+            state = {"tool_calls": {}, "model_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            estimated_tokens = history_tokens(history)
+            
+            parts = []
+            calls, results = [], []
+            
+            # Rodadas de ferramentas até o modelo responder (limitadas)
+            for round_number in range(MAX_TOOL_ROUNDS + 1):
+                stream = self.client.chat.completions.create(
+                    **self._completion_args(history, final=round_number == MAX_TOOL_ROUNDS)
+                )
+                
+                round_parts = []
+                for chunk in stream:
+                    text = self._read_chunk(chunk, state)
+                    if text:
+                        round_parts.append(text)
+                        yield text
+                parts += round_parts
+                
+                pending = self._take_tool_calls(history, state, round_parts)
+                if not pending:
+                    break
+                
+                # Todas as ferramentas pedidas na mesma resposta rodam em paralelo
+                round_calls = [(name, arguments) for _, name, arguments in pending]
+                round_results = self.tools.execute_many(round_calls)
+                self._append_tool_results(history, pending, round_results)
+                calls += round_calls
+                results += round_results
+            
+            self._finish_response(session_id, user_message, history, parts, round_parts, state,
+                                  calls, results, estimated_tokens, compacted)
+            
+        except Exception as e:
+            yield f"❌ Erro ao processar solicitação: {str(e)}"
+    
+    def _local_answer(self, history, user_message):
+        """Resposta do roteador de intenções ou do cache, já no histórico, ou None"""
+        answer = self.intent_router.route(user_message)
+        if answer is not None:
+            history.append({"role": "assistant", "content": answer})
+            return answer
+        return self._cached_answer(history, user_message)
+    
+    def _cached_answer(self, history, user_message):
+        """Resposta em cache para a pergunta, já registrada no histórico, ou None"""
+        cached = self.response_cache.lookup(user_message, self.tools.execute)
+        if cached is None:
+            return None
+        
+        # O histórico fica igual ao de uma resposta gerada pelo modelo
+        pending = [(f"cached_{index}", name, arguments) for index, (name, arguments) in enumerate(cached.calls)]
+        self._append_tool_calls(history, pending)
+        self._append_tool_results(history, pending, cached.results)
+        history.append({"role": "assistant", "content": cached.answer})
+        return cached.answer
+    
+    def _completion_args(self, history, final=False):
+        """Parâmetros de uma chamada ao modelo; na última rodada, sem ferramentas"""
+        args = dict(
+            model="gpt-3.5-turbo",
+            messages=history,
+            max_tokens=800,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        if not final:
+            args.update(tools=self.tools.payload, tool_choice="auto")
+        return args
+    
+    def _read_chunk(self, chunk, state):
+        """Extrai o texto de um chunk do stream, acumulando chamadas de ferramentas e uso"""
+        if chunk.usage:
+            state["prompt_tokens"] += chunk.usage.prompt_tokens
+            state["completion_tokens"] += chunk.usage.completion_tokens
+        
+        if not chunk.choices:
+            return None
+        
+        delta = chunk.choices[0].delta
+        for call in delta.tool_calls or []:
+            # Cada chamada chega em pedaços, identificada pelo índice
+            pending = state["tool_calls"].setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+            pending["id"] += call.id or ""
+            if call.function:
+                pending["name"] += call.function.name or ""
+                pending["arguments"] += call.function.arguments or ""
+        return delta.content
+    
+    def _take_tool_calls(self, history, state, round_parts):
+        """Registra no histórico as chamadas pedidas na rodada e as retorna como (id, nome, argumentos)"""
+        state["model_calls"] += 1
+        received, state["tool_calls"] = state["tool_calls"], {}
+        
+        pending = []
+        for index in sorted(received):
+            call = received[index]
+            try:
+                arguments = json.loads(call["arguments"] or "{}")
+            except ValueError:
+                arguments = {}
+            pending.append((call["id"] or f"call_{index}", call["name"], arguments))
+        
+        if pending:
+            self._append_tool_calls(history, pending, "".join(round_parts) or None)
+        return pending
+    
+    def _append_tool_calls(self, history, pending, content=None):
+        """Adiciona a mensagem do assistente que pede as ferramentas"""
+        history.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [
                 {
-                    "name": "get_trending_stocks",
-                    "description": "Obtém lista de ações em alta/tendência",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}
                 }
+                for call_id, name, arguments in pending
             ]
-            
-            # Chama a API do ChatGPT com function calling
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=self.conversation_history,
-                functions=functions,
-                function_call="auto",
-                max_tokens=800,
-                temperature=0.7
+        })
+    
+    def _append_tool_results(self, history, pending, results):
+        """Adiciona o resultado de cada ferramenta ao histórico"""
+        for (call_id, _, _), result in zip(pending, results):
+            history.append({
+                "role": "tool",
+                "tool_call_id": call_id,
+                "content": encode(result)
+            })
+    
+    def _finish_response(self, session_id, user_message, history, parts, final_parts, state,
+                         calls, results, estimated_tokens, compacted):
+        """Guarda a resposta no histórico, registra as métricas e alimenta o cache
+
+        O texto das rodadas com ferramentas já está nas mensagens que as pedem;
+        o histórico recebe só o da rodada final, o cache recebe tudo o que o
+        usuário viu.
+        """
+        answer = "".join(parts).strip()
+        history.append({"role": "assistant", "content": "".join(final_parts).strip()})
+        self.sessions.save(session_id, history)
+        self._record_tokens(session_id, estimated_tokens, state, compacted, len(calls))
+        
+        if self.tools.cacheable(name for name, _ in calls):
+            self.response_cache.store(
+                user_message, calls, results, answer,
+                state["prompt_tokens"] + state["completion_tokens"]
             )
+    
+    def _record_tokens(self, session_id, estimated_tokens, state, compacted, tool_calls=0):
+        """Registra as métricas de tokens da requisição"""
+        self.token_metrics.record(
+            session_id,
+            estimated_tokens,
+            prompt_tokens=state["prompt_tokens"],
+            completion_tokens=state["completion_tokens"],
+            compacted_messages=compacted,
+            model_calls=state["model_calls"],
+            tool_calls=tool_calls
+        )
+    
+    def get_token_metrics(self):
+        """Retorna as métricas de tokens por requisição"""
+        return self.token_metrics.summary()
+    
+    @property
+    def async_client(self):
+        """Cliente AsyncOpenAI usado pelo modo ASGI"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.client.api_key)
+        return self._async_client
+    
+    async def aget_response(self, user_message, session_id="default"):
+        """Versão assíncrona de get_response (modo ASGI)"""
+        parts = [chunk async for chunk in self.astream_response(user_message, session_id)]
+        return "".join(parts).strip()
+    
+    async def astream_response(self, user_message, session_id="default"):
+        """Versão assíncrona de stream_response (modo ASGI)"""
+        try:
+            history = self.sessions.get(session_id)
+            compacted = self.history_manager.compact(history)
+            history.append({"role": "user", "content": user_message})
             
-            message = response.choices[0].message
+            loop = asyncio.get_running_loop()
+            answer = await loop.run_in_executor(None, self._local_answer, history, user_message)
+            if answer is not None:
+                self.sessions.save(session_id, history)
+                yield answer
+                return
             
-            # Verifica se o ChatGPT quer chamar uma função
-            if message.function_call:
-                function_name = message.function_call.name
-                function_args = json.loads(message.function_call.arguments)
+            state = {"tool_calls": {}, "model_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            estimated_tokens = history_tokens(history)
+            
+            parts = []
+            calls, results = [], []
+            
+            for round_number in range(MAX_TOOL_ROUNDS + 1):
+                stream = await self.async_client.chat.completions.create(
+                    **self._completion_args(history, final=round_number == MAX_TOOL_ROUNDS)
+                )
                 
-                # Executa a função
-                function_result = self._execute_finance_function(function_name, **function_args)
+                round_parts = []
+                async for chunk in stream:
+                    text = self._read_chunk(chunk, state)
+                    if text:
+                        round_parts.append(text)
+                        yield text
+                parts += round_parts
                 
-                # Adiciona o resultado da função ao histórico
-                self.conversation_history.append({
-                    "role": "function",
-                    "name": function_name,
-                    "content": json.dumps(function_result, ensure_ascii=False)
-                })
+                pending = self._take_tool_calls(history, state, round_parts)
+                if not pending:
+                    break
                 
-                # Chama o ChatGPT novamente para formatar a resposta
-                final_response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=self.conversation_history,
-                    max_tokens=800,
-                    temperature=0.7
-                )
-                
-                bot_message = final_response.choices[0].message.content.strip()
-            else:
-                bot_message = message.content.strip()
-            
-            # Adiciona a resposta do bot ao histórico
-            self.conversation_history.append({"role": "assistant", "content": bot_message})
+                # Consultas financeiras bloqueantes rodam fora do event loop
+                round_calls = [(name, arguments) for _, name, arguments in pending]
+                round_results = await loop.run_in_executor(None, self.tools.execute_many, round_calls)
+                self._append_tool_results(history, pending, round_results)
+                calls += round_calls
+                results += round_results
             
-            return bot_message
+            self._finish_response(session_id, user_message, history, parts, round_parts, state,
+                                  calls, results, estimated_tokens, compacted)
             
         except Exception as e:
-            return f"❌ Erro ao processar solicitação: {str(e)}"
+            yield f"❌ Erro ao processar solicitação: {str(e)}"
     
-    def clear_history(self):
-        """Limpa o histórico da conversa"""
-        self.conversation_history = [
-            {"role": "system", "content": """Você é um assistente financeiro especializado chamado FinanceBot. 
-            Você tem acesso a dados financeiros em tempo real através de ferramentas especiais.
-            
-            Suas especialidades incluem:
-            - Análise de ações brasileiras e internacionais
-            - Informações sobre criptomoedas
-            - Dados de índices financeiros
-            - Educação financeira
-            - Análise de tendências de mercado
-            
-            Responda sempre em português de forma clara e educativa."""}
-        ]
+    def clear_history(self, session_id="default"):
+        """Limpa o histórico da conversa da sessão"""
+        self.sessions.delete(session_id)
 
 # Instância global do chatbot
 chatbot = FinanceChatBot()
 
+@app.before_request
+def start_background_jobs():
+    """Monta o snapshot do screener e pré-carrega as cotações quentes em segundo plano
+
+    Só o processo que atende requisições inicia as threads (não o observador
+    do reloader nem scripts que apenas importam o módulo); as chamadas
+    seguintes não fazem nada.
+    """
+    chatbot.finance_api.screener.start()
+    chatbot.finance_api.prefetcher.start()
+
 @app.route('/')
 def index():
     """Página principal"""
@@ -219,12 +364,13 @@ def chat():
     try:
         data = request.get_json()
         user_message = data.get('message', '').strip()
+        session_id = data.get('session_id', 'default')
         
         if not user_message:
             return jsonify({'error': 'Mensagem vazia'}), 400
         
         # Obtém resposta do chatbot
-        bot_response = chatbot.get_response(user_message)
+        bot_response = chatbot.get_response(user_message, session_id)
         
         return jsonify({
             'response': bot_response,
@@ -234,15 +380,46 @@ def chat():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Endpoint que transmite a resposta em tempo real (SSE)"""
+    data = request.get_json() or {}
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+    
+    if not user_message:
+        return jsonify({'error': 'Mensagem vazia'}), 400
+    
+    return Response(
+        sse_stream(chatbot.stream_response(user_message, session_id)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
 @app.route('/clear', methods=['POST'])
 def clear_chat():
     """Endpoint para limpar o histórico do chat"""
     try:
-        chatbot.clear_history()
+        data = request.get_json(silent=True) or {}
+        chatbot.clear_history(data.get('session_id', 'default'))
         return jsonify({'status': 'success', 'message': 'Histórico limpo'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Métricas de tokens, sessões e cache"""
+    return jsonify({
+        'tokens': chatbot.get_token_metrics(),
+        'sessions': chatbot.sessions.stats(),
+        'quote_cache': chatbot.finance_api.get_cache_stats(),
+        'market_data': chatbot.finance_api.get_provider_stats(),
+        'screener': chatbot.finance_api.screener.stats(),
+        'prefetcher': chatbot.finance_api.prefetcher.stats(),
+        'response_cache': chatbot.response_cache.stats(),
+        'intent_router': chatbot.intent_router.stats()
+    })
+
 if __name__ == '__main__':
     print("🚀 Iniciando o Chatbot Web...")
     print("💻 Acesse: http://localhost:5000")
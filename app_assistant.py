@@ -1,11 +1,16 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import sys
-import json
-import time
+import asyncio
 from finance_api import FinanceAPI
+from intent_router import IntentRouter
+from tool_registry import ToolSet
+from assistant_runtime import stream_assistant, astream_assistant, RunTimeoutError, exchange_recorder
+from sse import sse_stream, SSE_HEADERS
+from session_store import ThreadRegistry
+from assistant_bootstrap import resolve_assistant, StartupTimer
 
 app = Flask(__name__)
 CORS(app)
@@ -21,34 +26,40 @@ class FinanceAssistantWeb:
             print("Configure a variável de ambiente OPENAI_API_KEY")
             sys.exit(1)
         
+        timer = StartupTimer()
+        
         # Inicializa o cliente da OpenAI
-        self.client = OpenAI(api_key=api_key)
+        with timer.step('cliente'):
+            self.client = OpenAI(api_key=api_key)
+        
+        # Cliente assíncrono, criado sob demanda pelo modo ASGI
+        self._async_client = None
         
         # Inicializa a API financeira
         self.finance_api = FinanceAPI()
         
+        # Ferramentas financeiras expostas ao assistente
+        self.tools = ToolSet(self.finance_api)
+        
+        # Cotações e resumo do mercado respondidos sem o modelo
+        self.intent_router = IntentRouter(self.finance_api)
+        
         # Cria ou recupera o assistente especializado
-        self.assistant = self._create_finance_assistant()
+        with timer.step('assistente'):
+            self.assistant = self._create_finance_assistant()
         
-        # Dicionário para armazenar threads por sessão
-        self.user_threads = {}
+        # Threads por sessão, com limite, expiração e persistência opcional
+        with timer.step('sessões'):
+            self.user_threads = ThreadRegistry()
         
         print("💰 Finance Assistant Web inicializado!")
+        timer.report()
     
     def _create_finance_assistant(self):
         """Cria um assistente especializado em finanças"""
         try:
-            # Tenta buscar assistente existente
-            assistants = self.client.beta.assistants.list()
-            for assistant in assistants.data:
-                if assistant.name == "Finance Expert Web":
-                    print("✅ Assistente Finance Expert Web encontrado!")
-                    return assistant
-            
-            # Cria novo assistente se não existir
-            print("🔧 Criando novo assistente Finance Expert Web...")
-            
-            assistant = self.client.beta.assistants.create(
+            # Reaproveita o id em cache; busca ou cria o assistente só quando necessário
+            assistant = resolve_assistant(self.client, dict(
                 name="Finance Expert Web",
                 instructions="""
                 Você é um ESPECIALISTA EM FINANÇAS altamente qualificado para interface web. 
@@ -81,93 +92,11 @@ class FinanceAssistantWeb:
                 - Eduque sobre conceitos financeiros
                 - Seja imparcial e objetivo
                 """,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_stock_info",
-                            "description": "Obtém informações completas de uma ação",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "symbol": {
-                                        "type": "string",
-                                        "description": "Símbolo da ação (ex: PETR4.SA, AAPL)"
-                                    }
-                                },
-                                "required": ["symbol"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_market_summary",
-                            "description": "Obtém resumo dos principais índices",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "search_stocks",
-                            "description": "Busca ações por nome",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "query": {
-                                        "type": "string",
-                                        "description": "Nome da empresa para buscar"
-                                    }
-                                },
-                                "required": ["query"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_trending_stocks",
-                            "description": "Obtém ações em tendência",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_stock_history",
-                            "description": "Obtém histórico de preços",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "symbol": {
-                                        "type": "string",
-                                        "description": "Símbolo da ação"
-                                    },
-                                    "period": {
-                                        "type": "string",
-                                        "description": "Período (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)",
-                                        "default": "1mo"
-                                    }
-                                },
-                                "required": ["symbol"]
-                            }
-                        }
-                    }
-                ],
+                tools=self.tools.payload,
                 model="gpt-3.5-turbo",
                 temperature=0.3
-            )
+            ))
             
-            print("✅ Assistente Finance Expert Web criado!")
             return assistant
             
         except Exception as e:
@@ -175,127 +104,145 @@ class FinanceAssistantWeb:
             # Fallback para o sistema anterior
             return None
     
-    def _handle_function_call(self, tool_call):
-        """Processa chamadas de função"""
-        function_name = tool_call.function.name
-        arguments = json.loads(tool_call.function.arguments)
-        
-        try:
-            if function_name == "get_stock_info":
-                result = self.finance_api.get_stock_info(arguments["symbol"])
-            elif function_name == "get_market_summary":
-                result = self.finance_api.get_market_summary()
-            elif function_name == "search_stocks":
-                result = self.finance_api.search_stocks(arguments["query"])
-            elif function_name == "get_trending_stocks":
-                result = self.finance_api.get_trending_stocks()
-            elif function_name == "get_stock_history":
-                result = self.finance_api.get_stock_history(
-                    arguments["symbol"], 
-                    arguments.get("period", "1mo")
-                )
-            else:
-                result = {"error": "Função não encontrada"}
-            
-            return json.dumps(result, ensure_ascii=False)
-            
-        except Exception as e:
-            return json.dumps({"error": str(e)}, ensure_ascii=False)
-    
     def get_or_create_thread(self, session_id):
-        """Obtém ou cria uma thread para a sessão"""
-        if session_id not in self.user_threads:
-            self.user_threads[session_id] = self.client.beta.threads.create()
-        return self.user_threads[session_id]
+        """Obtém ou cria a thread da sessão e retorna o seu id"""
+        return self.user_threads.get_or_create(session_id, self.client.beta.threads.create)
     
     def chat_with_assistant(self, message, session_id="default"):
         """Conversa com o assistente"""
+        return "".join(self.stream_chat_with_assistant(message, session_id))
+    
+    def stream_chat_with_assistant(self, message, session_id="default"):
+        """Conversa com o assistente, gerando a resposta em trechos"""
         try:
+            # Perguntas simples saem direto da FinanceAPI, sem run
+            answer = self.intent_router.route(message)
+            if answer is not None:
+                if self.assistant:
+                    thread_id = self.get_or_create_thread(session_id)
+                    exchange_recorder.record(session_id, self.client, thread_id, message, answer)
+                yield answer
+                return
+            
             if not self.assistant:
                 # Fallback para o sistema anterior
-                return self._fallback_chat(message)
+                yield self._fallback_chat(message)
+                return
             
             # Obtém a thread da sessão
-            thread = self.get_or_create_thread(session_id)
+            thread_id = self.get_or_create_thread(session_id)
+            
+            # Respostas locais anteriores precisam estar na thread antes da pergunta
+            exchange_recorder.wait(session_id)
             
             # Adiciona mensagem à thread
             self.client.beta.threads.messages.create(
-                thread_id=thread.id,
+                thread_id=thread_id,
                 role="user",
                 content=message
             )
             
-            # Executa o assistente
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread.id,
-                assistant_id=self.assistant.id
+            # Executa o assistente (streaming/polling adaptativo)
+            received = False
+            for chunk in stream_assistant(
+                self.client,
+                thread_id,
+                self.assistant.id,
+                self.tools
+            ):
+                received = True
+                yield chunk
+            
+            if not received:
+                yield "❌ Não foi possível obter resposta do assistente."
+                
+        except RunTimeoutError:
+            yield "⏱️ Timeout: A análise está demorando muito. Tente novamente."
+        except Exception as e:
+            yield f"❌ Erro na conversa: {str(e)}"
+    
+    def _fallback_chat(self, message):
+        """Sistema de fallback caso o Assistant não funcione"""
+        try:
+            # Usa o sistema anterior como backup
+            response = self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "Você é um assistente financeiro especializado. Responda de forma educativa e sempre mencione que não é aconselhamento financeiro."},
+                    {"role": "user", "content": message}
+                ],
+                max_tokens=800,
+                temperature=0.3
             )
             
-            # Aguarda conclusão
-            max_wait = 30  # 30 segundos timeout
-            wait_time = 0
+            return response.choices[0].message.content.strip()
             
-            while run.status in ["queued", "in_progress"] and wait_time < max_wait:
-                time.sleep(1)
-                wait_time += 1
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread.id,
-                    run_id=run.id
-                )
+        except Exception as e:
+            return f"❌ Erro no sistema de backup: {str(e)}"
+    
+    @property
+    def async_client(self):
+        """Cliente AsyncOpenAI usado pelo modo ASGI"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.client.api_key)
+        return self._async_client
+    
+    async def aget_or_create_thread(self, session_id):
+        """Versão assíncrona de get_or_create_thread"""
+        return await self.user_threads.aget_or_create(session_id, self.async_client.beta.threads.create)
+    
+    async def achat_with_assistant(self, message, session_id="default"):
+        """Versão assíncrona de chat_with_assistant (modo ASGI)"""
+        chunks = [chunk async for chunk in self.astream_chat_with_assistant(message, session_id)]
+        return "".join(chunks)
+    
+    async def astream_chat_with_assistant(self, message, session_id="default"):
+        """Versão assíncrona de stream_chat_with_assistant (modo ASGI)"""
+        try:
+            # Cotações vêm do cache na maioria das vezes; a rede roda fora do event loop
+            answer = await asyncio.get_running_loop().run_in_executor(None, self.intent_router.route, message)
+            if answer is not None:
+                if self.assistant:
+                    thread_id = await self.aget_or_create_thread(session_id)
+                    exchange_recorder.record(session_id, self.client, thread_id, message, answer)
+                yield answer
+                return
             
-            # Timeout protection
-            if wait_time >= max_wait:
-                return "⏱️ Timeout: A análise está demorando muito. Tente novamente."
+            if not self.assistant:
+                yield await self._afallback_chat(message)
+                return
             
-            # Verifica se precisa executar funções
-            if run.status == "requires_action":
-                tool_outputs = []
-                
-                for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                    output = self._handle_function_call(tool_call)
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": output
-                    })
-                
-                # Submete os resultados das funções
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread.id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs
-                )
-                
-                # Aguarda conclusão novamente
-                wait_time = 0
-                while run.status in ["queued", "in_progress"] and wait_time < max_wait:
-                    time.sleep(1)
-                    wait_time += 1
-                    run = self.client.beta.threads.runs.retrieve(
-                        thread_id=thread.id,
-                        run_id=run.id
-                    )
-                
-                if wait_time >= max_wait:
-                    return "⏱️ Timeout: A análise está demorando muito. Tente novamente."
+            thread_id = await self.aget_or_create_thread(session_id)
+            await exchange_recorder.await_pending(session_id)
             
-            # Obtém a resposta
-            messages = self.client.beta.threads.messages.list(
-                thread_id=thread.id
+            await self.async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message
             )
             
-            if messages.data:
-                return messages.data[0].content[0].text.value
-            else:
-                return "❌ Não foi possível obter resposta do assistente."
+            received = False
+            async for chunk in astream_assistant(
+                self.async_client,
+                thread_id,
+                self.assistant.id,
+                self.tools
+            ):
+                received = True
+                yield chunk
+            
+            if not received:
+                yield "❌ Não foi possível obter resposta do assistente."
                 
+        except RunTimeoutError:
+            yield "⏱️ Timeout: A análise está demorando muito. Tente novamente."
         except Exception as e:
-            return f"❌ Erro na conversa: {str(e)}"
+            yield f"❌ Erro na conversa: {str(e)}"
     
-    def _fallback_chat(self, message):
-        """Sistema de fallback caso o Assistant não funcione"""
+    async def _afallback_chat(self, message):
+        """Versão assíncrona de _fallback_chat"""
         try:
-            # Usa o sistema anterior como backup
-            response = self.client.chat.completions.create(
+            response = await self.async_client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "Você é um assistente financeiro especializado. Responda de forma educativa e sempre mencione que não é aconselhamento financeiro."},
@@ -312,14 +259,22 @@ class FinanceAssistantWeb:
     
     def clear_thread(self, session_id="default"):
         """Limpa a thread da sessão"""
-        if session_id in self.user_threads:
-            del self.user_threads[session_id]
-            return True
-        return False
+        return self.user_threads.delete(session_id)
 
 # Instância global do assistente
 finance_assistant = FinanceAssistantWeb()
 
+@app.before_request
+def start_background_jobs():
+    """Monta o snapshot do screener e pré-carrega as cotações quentes em segundo plano
+
+    Só o processo que atende requisições inicia as threads (não o observador
+    do reloader nem scripts que apenas importam o módulo); as chamadas
+    seguintes não fazem nada.
+    """
+    finance_assistant.finance_api.screener.start()
+    finance_assistant.finance_api.prefetcher.start()
+
 @app.route('/')
 def index():
     """Página principal"""
@@ -347,6 +302,22 @@ def chat():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Endpoint que transmite a resposta em tempo real (SSE)"""
+    data = request.get_json() or {}
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+    
+    if not user_message:
+        return jsonify({'error': 'Mensagem vazia'}), 400
+    
+    return Response(
+        sse_stream(finance_assistant.stream_chat_with_assistant(user_message, session_id)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
 @app.route('/clear', methods=['POST'])
 def clear_chat():
     """Endpoint para limpar o histórico do chat"""
@@ -364,7 +335,14 @@ def health_check():
     """Endpoint de saúde"""
     return jsonify({
         'status': 'healthy',
-        'assistant_available': finance_assistant.assistant is not None
+        'assistant_available': finance_assistant.assistant is not None,
+        'quote_cache': finance_assistant.finance_api.get_cache_stats(),
+        'market_data': finance_assistant.finance_api.get_provider_stats(),
+        'screener': finance_assistant.finance_api.screener.stats(),
+        'prefetcher': finance_assistant.finance_api.prefetcher.stats(),
+        'intent_router': finance_assistant.intent_router.stats(),
+        'thread_records': exchange_recorder.stats(),
+        'threads': finance_assistant.user_threads.stats()
     })
 
 if __name__ == '__main__':
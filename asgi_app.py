@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Modo ASGI (assíncrono) para as interfaces web do FinanceBot
+
+Usa Quart (API compatível com Flask) e o cliente AsyncOpenAI, de modo que um
+único processo atenda centenas de conversas simultâneas sem prender um worker
+por requisição. As consultas ao Yahoo Finance continuam síncronas e rodam em
+um pool de threads.
+
+Uso:
+    python asgi_app.py --mode assistant --port 5000
+    hypercorn "asgi_app:create_app('chat')" --bind 0.0.0.0:5000
+
+Modos: chat (app.py), assistant (app_assistant.py), speech (speech_app.py)
+"""
+
+import os
+import queue
+import argparse
+import asyncio
+from quart import Quart, render_template, request, websocket, jsonify, Response
+from quart_cors import cors
+from sse import asse_stream, SSE_HEADERS
+from voice_pipeline import VoicePipeline, astream_speech, split_sentences
+
+MODES = ('chat', 'assistant', 'speech')
+
+_CLOSED = object()
+
+
+class _ThreadedWebSocket:
+    """WebSocket do Quart com a interface síncrona do flask-sock (usada pelo VoicePipeline)
+
+    Uma tarefa no loop repassa as mensagens recebidas para uma fila lida pela
+    thread do pipeline; os envios são agendados de volta no loop.
+    """
+
+    def __init__(self, ws, loop):
+        self._ws = ws
+        self._loop = loop
+        self._inbox = queue.Queue()
+        self.connected = True
+
+    async def pump(self):
+        try:
+            while True:
+                self._inbox.put(await self._ws.receive())
+        finally:
+            self.close()
+
+    def close(self):
+        if self.connected:
+            self.connected = False
+            self._inbox.put(_CLOSED)
+
+    def receive(self, timeout=None):
+        """Próxima mensagem (str ou bytes), ou None se o tempo acabar"""
+        try:
+            message = self._inbox.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if message is _CLOSED:
+            self._inbox.put(_CLOSED)
+            raise ConnectionError('WebSocket fechado')
+        return message
+
+    def send(self, data):
+        if not self.connected:
+            raise ConnectionError('WebSocket fechado')
+        asyncio.run_coroutine_threadsafe(self._ws.send(data), self._loop).result()
+
+
+def _load_backend(mode):
+    """Importa a instância global do modo escolhido"""
+    if mode == 'chat':
+        from app import chatbot
+        return chatbot
+    if mode == 'assistant':
+        from app_assistant import finance_assistant
+        return finance_assistant
+    if mode == 'speech':
+        from speech_app import speech_assistant
+        return speech_assistant
+    raise ValueError(f"Modo inválido: {mode} (use {', '.join(MODES)})")
+
+
+def create_app(mode=None):
+    """Cria a aplicação Quart para o modo informado"""
+    mode = mode or os.getenv('ASGI_APP_MODE', 'assistant')
+    backend = _load_backend(mode)
+    template = 'speech_index.html' if mode == 'speech' else 'index.html'
+
+    app = cors(Quart(__name__))
+    voice_pipeline = VoicePipeline(backend) if mode == 'speech' else None
+
+    async def respond(message, session_id):
+        """Encaminha a mensagem para o backend do modo atual"""
+        if mode == 'chat':
+            return await backend.aget_response(message, session_id)
+        return await backend.achat_with_assistant(message, session_id)
+
+    def stream(message, session_id):
+        """Gera a resposta do backend em trechos"""
+        if mode == 'chat':
+            return backend.astream_response(message, session_id)
+        return backend.astream_chat_with_assistant(message, session_id)
+
+    def clear(session_id):
+        """Limpa o histórico da sessão"""
+        if mode == 'chat':
+            backend.clear_history(session_id)
+        else:
+            backend.clear_thread(session_id)
+
+    @app.before_serving
+    async def start_background_jobs():
+        """Monta o snapshot do screener e pré-carrega as cotações quentes em segundo plano"""
+        backend.finance_api.screener.start()
+        backend.finance_api.prefetcher.start()
+
+    @app.route('/')
+    async def index():
+        """Página principal"""
+        return await render_template(template)
+
+    @app.route('/chat', methods=['POST'])
+    async def chat():
+        """Endpoint para processar mensagens do chat"""
+        try:
+            data = await request.get_json()
+            user_message = data.get('message', '').strip()
+            session_id = data.get('session_id', 'default')
+
+            if not user_message:
+                return jsonify({'error': 'Mensagem vazia'}), 400
+
+            bot_response = await respond(user_message, session_id)
+
+            return jsonify({
+                'response': bot_response,
+                'status': 'success'
+            })
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/chat/stream', methods=['POST'])
+    async def chat_stream():
+        """Endpoint que transmite a resposta em tempo real (SSE)"""
+        data = await request.get_json(silent=True) or {}
+        user_message = data.get('message', '').strip()
+        session_id = data.get('session_id', 'default')
+
+        if not user_message:
+            return jsonify({'error': 'Mensagem vazia'}), 400
+
+        response = Response(
+            asse_stream(stream(user_message, session_id)),
+            mimetype='text/event-stream',
+            headers=SSE_HEADERS
+        )
+        response.timeout = None
+        return response
+
+    @app.route('/clear', methods=['POST'])
+    async def clear_chat():
+        """Endpoint para limpar o histórico do chat"""
+        try:
+            data = await request.get_json(silent=True) or {}
+            clear(data.get('session_id', 'default'))
+            return jsonify({'status': 'success', 'message': 'Histórico limpo'})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/health', methods=['GET'])
+    async def health_check():
+        """Endpoint de saúde"""
+        return jsonify({
+            'status': 'healthy',
+            'mode': mode,
+            'server': 'asgi',
+            'quote_cache': backend.finance_api.get_cache_stats(),
+            'market_data': backend.finance_api.get_provider_stats(),
+            'screener': backend.finance_api.screener.stats(),
+            'prefetcher': backend.finance_api.prefetcher.stats(),
+            'intent_router': backend.intent_router.stats(),
+            **({'response_cache': backend.response_cache.stats()} if mode == 'chat' else {}),
+            **({'voice': voice_pipeline.stats()} if mode == 'speech' else {})
+        })
+
+    if mode == 'speech':
+        @app.websocket('/voice')
+        async def voice():
+            """Pipeline de voz: recebe áudio em pedaços e devolve transcrição, resposta e fala"""
+            await websocket.accept()
+            bridge = _ThreadedWebSocket(websocket._get_current_object(), asyncio.get_running_loop())
+            pump = asyncio.create_task(bridge.pump())
+            try:
+                # O pipeline é síncrono (o mesmo do Flask): roda numa thread
+                await asyncio.to_thread(voice_pipeline.handle, bridge)
+            except ConnectionError:
+                pass
+            finally:
+                pump.cancel()
+                bridge.close()
+
+        @app.route('/transcribe', methods=['POST'])
+        async def transcribe():
+            """Endpoint para transcrever áudio"""
+            try:
+                files = await request.files
+                audio_file = files.get('audio')
+
+                if audio_file is None or audio_file.filename == '':
+                    return jsonify({'error': 'Nenhum arquivo de áudio'}), 400
+
+                transcript = await backend.atranscribe_audio(audio_file)
+
+                return jsonify({
+                    'transcript': transcript,
+                    'status': 'success'
+                })
+
+            except Exception as e:
+                return jsonify({'error': f'Erro na transcrição: {str(e)}'}), 500
+
+        @app.route('/speak', methods=['POST'])
+        async def speak():
+            """Endpoint para converter texto em fala"""
+            try:
+                data = await request.get_json()
+                text = data.get('text', '').strip()
+
+                if not text:
+                    return jsonify({'error': 'Texto vazio'}), 400
+
+                # Frases sintetizadas em paralelo, transmitidas na ordem
+                chunks = astream_speech(split_sentences(text), backend.atext_to_speech)
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return jsonify({'error': 'Erro ao gerar áudio'}), 500
+
+                async def generate():
+                    yield first
+                    async for audio in chunks:
+                        yield audio
+
+                return Response(generate(), mimetype='audio/mpeg')
+
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
+    return app
+
+
+def main():
+    """Sobe o servidor ASGI com Hypercorn"""
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    parser = argparse.ArgumentParser(description="FinanceBot em modo ASGI")
+    parser.add_argument('--mode', choices=MODES, default=os.getenv('ASGI_APP_MODE', 'assistant'))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    config = Config()
+    config.bind = [f"{args.host}:{args.port}"]
+    config.accesslog = None
+
+    print(f"🚀 Iniciando FinanceBot ASGI (modo {args.mode})...")
+    print(f"💻 Acesse: http://localhost:{args.port}")
+    asyncio.run(serve(create_app(args.mode), config))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Resolução do assistente na inicialização com cache local
+
+O id do assistente fica salvo em um arquivo JSON junto com o hash da sua
+definição (nome, instruções, ferramentas, modelo). Na partida seguinte o id
+é reaproveitado sem chamar `assistants.list()`, e a existência do assistente
+é conferida em segundo plano. Se a definição mudar, o assistente é
+atualizado em vez de recriado.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+ASSISTANT_CACHE_PATH = os.getenv('ASSISTANT_CACHE_PATH', '.assistant_cache.json')
+ASSISTANT_VERIFY = os.getenv('ASSISTANT_VERIFY', '1') != '0'
+
+_cache_lock = threading.Lock()
+
+
+class CachedAssistant:
+    """Referência leve ao assistente (apenas id e nome)
+
+    O id pode ser trocado pela verificação em segundo plano, e quem guarda
+    esta referência passa a usar o novo id automaticamente.
+    """
+
+    def __init__(self, assistant_id, name):
+        self.id = assistant_id
+        self.name = name
+
+
+def spec_hash(spec):
+    """Hash estável da definição do assistente"""
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _load_cache(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_entry(path, name, assistant_id, digest):
+    """Grava o id e o hash do assistente no cache (escrita atômica)"""
+    with _cache_lock:
+        cache = _load_cache(path)
+        cache[name] = {'id': assistant_id, 'hash': digest, 'updated_at': time.time()}
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Não foi possível salvar o cache do assistente: {e}")
+
+
+def _find_or_create(client, spec):
+    """Busca o assistente pelo nome (atualizando sua definição) ou cria um novo"""
+    name = spec['name']
+    for assistant in client.beta.assistants.list(limit=100).data:
+        if assistant.name == name:
+            print(f"✅ Assistente {name} encontrado!")
+            return client.beta.assistants.update(assistant.id, **spec).id
+
+    print(f"🔧 Criando novo assistente {name}...")
+    assistant_id = client.beta.assistants.create(**spec).id
+    print(f"✅ Assistente {name} criado!")
+    return assistant_id
+
+
+def _verify(client, spec, assistant, path, digest):
+    """Confere em segundo plano se o assistente do cache ainda existe"""
+    try:
+        client.beta.assistants.retrieve(assistant.id)
+    except Exception:
+        try:
+            assistant.id = _find_or_create(client, spec)
+            _save_entry(path, spec['name'], assistant.id, digest)
+            print(f"🔄 Assistente {spec['name']} do cache era inválido e foi substituído")
+        except Exception as e:
+            print(f"⚠️ Falha ao verificar o assistente {spec['name']}: {e}")
+
+
+def resolve_assistant(client, spec, path=ASSISTANT_CACHE_PATH, verify=ASSISTANT_VERIFY):
+    """Retorna o assistente descrito em `spec`, usando o cache local quando possível
+
+    `spec` recebe os mesmos argumentos de `assistants.create`.
+    """
+    name = spec['name']
+    digest = spec_hash(spec)
+    entry = _load_cache(path).get(name)
+
+    if entry and entry.get('hash') == digest:
+        assistant = CachedAssistant(entry['id'], name)
+        print(f"⚡ Assistente {name} carregado do cache")
+        if verify:
+            threading.Thread(
+                target=_verify,
+                args=(client, spec, assistant, path, digest),
+                name='assistant-verify',
+                daemon=True
+            ).start()
+        return assistant
+
+    assistant_id = None
+    if entry:
+        # Definição mudou: atualiza o assistente existente
+        try:
+            assistant_id = client.beta.assistants.update(entry['id'], **spec).id
+            print(f"🔄 Assistente {name} atualizado (definição alterada)")
+        except Exception:
+            assistant_id = None
+
+    if assistant_id is None:
+        assistant_id = _find_or_create(client, spec)
+
+    _save_entry(path, name, assistant_id, digest)
+    return CachedAssistant(assistant_id, name)
+
+
+class StartupTimer:
+    """Mede as etapas da inicialização e imprime um resumo"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []
+
+    def step(self, label):
+        """Context manager que cronometra uma etapa"""
+        return _TimedStep(self, label)
+
+    def report(self):
+        """Imprime o tempo de cada etapa e o total"""
+        total = time.perf_counter() - self.started
+        steps = " | ".join(f"{label} {elapsed:.2f}s" for label, elapsed in self.steps)
+        print(f"⏱️ Inicialização em {total:.2f}s ({steps})")
+        return total
+
+
+class _TimedStep:
+    def __init__(self, timer, label):
+        self.timer = timer
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.steps.append((self.label, time.perf_counter() - self.start))
+        return False
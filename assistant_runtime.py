@@ -0,0 +1,511 @@
+"""
+Utilitários compartilhados para execução de runs da OpenAI Assistant API
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+# Limites para execução das ferramentas pedidas pelo assistente
+TOOL_CALL_WORKERS = int(os.getenv('TOOL_CALL_WORKERS', '8'))
+TOOL_CALL_TIMEOUT = float(os.getenv('TOOL_CALL_TIMEOUT', '15'))
+
+# Pool compartilhado por todas as sessões do processo
+_tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_CALL_WORKERS,
+    thread_name_prefix='tool-call'
+)
+
+
+class TimedCall:
+    """Chamada enviada a um pool cujo prazo só começa a contar quando ela sai da fila
+
+    Com mais chamadas que workers, as que esperam na fila não perdem parte
+    do próprio timeout; a espera na fila também é limitada a um timeout.
+    """
+
+    def __init__(self, executor, fn, *args):
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self._started = threading.Event()
+        self.future = executor.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        self.started_at = time.monotonic()
+        self._started.set()
+        return fn(*args)
+
+    def result(self, timeout):
+        """Resultado em até `timeout` segundos de execução (FutureTimeoutError se passar)"""
+        if not self._started.wait(max(0, self.submitted_at + timeout - time.monotonic())):
+            self.future.cancel()
+            raise FutureTimeoutError()
+        try:
+            return self.future.result(timeout=max(0, self.started_at + timeout - time.monotonic()))
+        except FutureTimeoutError:
+            self.future.cancel()
+            raise
+
+
+def _call_timeout(handler, tool_call, timeout):
+    """Timeout da chamada: o da ferramenta (ToolSet.timeout_for) ou o padrão"""
+    timeout_for = getattr(handler, 'timeout_for', None)
+    return (timeout_for(tool_call.function.name) if timeout_for else None) or timeout
+
+
+def _error_output(message):
+    """Serializa um erro no formato esperado pelo assistente"""
+    return json.dumps({"error": message}, ensure_ascii=False)
+
+
+def execute_tool_calls(tool_calls, handler, timeout=TOOL_CALL_TIMEOUT):
+    """Executa as tool calls em paralelo e devolve os tool_outputs na ordem original
+
+    Cada chamada tem até `timeout` segundos (ou o timeout da própria
+    ferramenta, se o handler for um ToolSet) contados do início da sua
+    execução; falhas e timeouts viram uma saída de erro apenas para a
+    chamada afetada.
+    """
+    submitted = [(tool_call, TimedCall(_tool_executor, handler, tool_call)) for tool_call in tool_calls]
+
+    tool_outputs = []
+    for tool_call, call in submitted:
+        try:
+            output = call.result(_call_timeout(handler, tool_call, timeout))
+        except FutureTimeoutError:
+            output = _error_output(f"Tempo esgotado ao executar {tool_call.function.name}")
+        except Exception as e:
+            output = _error_output(f"Erro ao executar {tool_call.function.name}: {str(e)}")
+
+        tool_outputs.append({
+            "tool_call_id": tool_call.id,
+            "output": output
+        })
+
+    return tool_outputs
+
+
+# Espera pelas runs: streaming quando disponível, polling adaptativo como fallback
+RUN_TIMEOUT = float(os.getenv('ASSISTANT_RUN_TIMEOUT', '30'))
+RUN_STREAMING = os.getenv('ASSISTANT_RUN_STREAMING', '1') != '0'
+POLL_INITIAL_DELAY = 0.05
+POLL_MAX_DELAY = 1.0
+POLL_BACKOFF = 1.6
+
+_ACTIVE_STATUSES = ("queued", "in_progress", "cancelling")
+_FAILED_EVENTS = (
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete"
+)
+
+
+class RunTimeoutError(Exception):
+    """A run não terminou dentro do prazo"""
+
+
+class RunFailedError(Exception):
+    """A run terminou sem sucesso"""
+
+
+def _cancel_run(client, thread_id, run_id):
+    """Cancela uma run pendente (melhor esforço)"""
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception:
+        pass
+
+
+def _interpret_event(event):
+    """Traduz um evento do stream em (tipo, valor)
+
+    Retorna ("text", trecho), ("action", run) ou (None, None); eventos de
+    falha levantam RunFailedError.
+    """
+    if event.event == "thread.message.delta":
+        text = "".join(
+            block.text.value
+            for block in event.data.delta.content or []
+            if block.type == "text" and block.text and block.text.value
+        )
+        return ("text", text) if text else (None, None)
+    if event.event == "thread.run.requires_action":
+        return "action", event.data
+    if event.event in _FAILED_EVENTS:
+        error = event.data.last_error
+        raise RunFailedError(error.message if error else event.data.status)
+    return None, None
+
+
+def _event_run_id(event):
+    """Retorna o id da run para eventos de run (não de steps)"""
+    if event.event.startswith("thread.run.") and ".step." not in event.event:
+        return event.data.id
+    return None
+
+
+def stream_run(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT, state=None):
+    """Executa uma run via streaming, gerando os trechos de texto conforme chegam
+
+    Eventos `requires_action` são resolvidos com `execute_tool_calls` e a
+    run continua no stream de `submit_tool_outputs`. Cada stream tem timeout
+    de leitura igual ao prazo, então um stream que para de mandar eventos
+    também termina em RunTimeoutError. `state['run_id']` recebe o id da run.
+    """
+    state = {} if state is None else state
+    stream = client.beta.threads.runs.stream(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        timeout=timeout
+    )
+
+    while stream is not None:
+        deadline = time.monotonic() + timeout
+        pending_run = None
+
+        try:
+            with stream as events:
+                for event in events:
+                    state['run_id'] = _event_run_id(event) or state.get('run_id')
+                    kind, value = _interpret_event(event)
+                    if kind == "text":
+                        yield value
+                    elif kind == "action":
+                        pending_run = value
+
+                    if time.monotonic() > deadline:
+                        raise RunTimeoutError()
+        except RunFailedError:
+            raise
+        except Exception:
+            # Estouro do prazo no loop ou do timeout de leitura (stream parado)
+            if time.monotonic() < deadline:
+                raise
+            if state.get('run_id'):
+                _cancel_run(client, thread_id, state['run_id'])
+            raise RunTimeoutError()
+
+        stream = None
+        if pending_run is not None:
+            tool_outputs = execute_tool_calls(
+                pending_run.required_action.submit_tool_outputs.tool_calls,
+                handler
+            )
+            stream = client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=thread_id,
+                run_id=pending_run.id,
+                tool_outputs=tool_outputs,
+                timeout=timeout
+            )
+
+
+def poll_run(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT):
+    """Executa uma run consultando o status com backoff exponencial"""
+    run = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id
+    )
+    deadline = time.monotonic() + timeout
+    delay = POLL_INITIAL_DELAY
+
+    while True:
+        if run.status in _ACTIVE_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _cancel_run(client, thread_id, run.id)
+                raise RunTimeoutError()
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+            run = client.beta.threads.runs.retrieve(
+                thread_id=thread_id,
+                run_id=run.id
+            )
+        elif run.status == "requires_action":
+            tool_outputs = execute_tool_calls(
+                run.required_action.submit_tool_outputs.tool_calls,
+                handler
+            )
+            run = client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run.id,
+                tool_outputs=tool_outputs
+            )
+            # Cada fase tem seu próprio prazo, como no loop original
+            deadline = time.monotonic() + timeout
+            delay = POLL_INITIAL_DELAY
+        elif run.status == "completed":
+            return run
+        else:
+            error = run.last_error
+            raise RunFailedError(error.message if error else run.status)
+
+
+def _assistant_text(messages, run_id):
+    """Texto da mensagem mais recente do assistente (da run, se informada)"""
+    for message in messages.data:
+        if message.role != "assistant" or (run_id and message.run_id != run_id):
+            continue
+        text = "".join(block.text.value for block in message.content if block.type == "text")
+        if text:
+            return text
+    return None
+
+
+def _message_filter(run_id):
+    """Filtros da listagem: as mensagens da run, ou só as mais recentes sem ela"""
+    return {"run_id": run_id, "limit": 20} if run_id else {"limit": 20}
+
+
+def latest_message_text(client, thread_id, run_id=None):
+    """Retorna o texto da resposta mais recente do assistente na thread"""
+    messages = client.beta.threads.messages.list(thread_id=thread_id, **_message_filter(run_id))
+    return _assistant_text(messages, run_id)
+
+
+def stream_assistant(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT):
+    """Gera a resposta do assistente em trechos
+
+    Sem a API de streaming, aguarda via polling e entrega o texto de uma vez.
+    """
+    state = {}
+    if RUN_STREAMING and hasattr(client.beta.threads.runs, "stream"):
+        received = False
+        for chunk in stream_run(client, thread_id, assistant_id, handler, timeout, state):
+            received = True
+            yield chunk
+        if received:
+            return
+    else:
+        state['run_id'] = poll_run(client, thread_id, assistant_id, handler, timeout).id
+
+    text = latest_message_text(client, thread_id, state.get('run_id'))
+    if text:
+        yield text
+
+
+def run_assistant(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT):
+    """Executa o assistente na thread e devolve o texto final da resposta"""
+    return "".join(stream_assistant(client, thread_id, assistant_id, handler, timeout)) or None
+
+
+# Versões assíncronas para o modo ASGI (cliente AsyncOpenAI)
+
+async def aexecute_tool_calls(tool_calls, handler, timeout=TOOL_CALL_TIMEOUT):
+    """Versão assíncrona de execute_tool_calls (handlers rodam no pool de threads)"""
+    loop = asyncio.get_running_loop()
+
+    async def call(tool_call):
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(_tool_executor, handler, tool_call),
+                _call_timeout(handler, tool_call, timeout)
+            )
+        except asyncio.TimeoutError:
+            return _error_output(f"Tempo esgotado ao executar {tool_call.function.name}")
+        except Exception as e:
+            return _error_output(f"Erro ao executar {tool_call.function.name}: {str(e)}")
+
+    outputs = await asyncio.gather(*(call(tool_call) for tool_call in tool_calls))
+    return [
+        {"tool_call_id": tool_call.id, "output": output}
+        for tool_call, output in zip(tool_calls, outputs)
+    ]
+
+
+async def _acancel_run(client, thread_id, run_id):
+    """Cancela uma run pendente (melhor esforço)"""
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception:
+        pass
+
+
+async def astream_run(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT, state=None):
+    """Versão assíncrona de stream_run"""
+    state = {} if state is None else state
+    stream = client.beta.threads.runs.stream(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        timeout=timeout
+    )
+
+    while stream is not None:
+        deadline = time.monotonic() + timeout
+        pending_run = None
+
+        try:
+            async with stream as events:
+                async for event in events:
+                    state['run_id'] = _event_run_id(event) or state.get('run_id')
+                    kind, value = _interpret_event(event)
+                    if kind == "text":
+                        yield value
+                    elif kind == "action":
+                        pending_run = value
+
+                    if time.monotonic() > deadline:
+                        raise RunTimeoutError()
+        except RunFailedError:
+            raise
+        except Exception:
+            # Estouro do prazo no loop ou do timeout de leitura (stream parado)
+            if time.monotonic() < deadline:
+                raise
+            if state.get('run_id'):
+                await _acancel_run(client, thread_id, state['run_id'])
+            raise RunTimeoutError()
+
+        stream = None
+        if pending_run is not None:
+            tool_outputs = await aexecute_tool_calls(
+                pending_run.required_action.submit_tool_outputs.tool_calls,
+                handler
+            )
+            stream = client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=thread_id,
+                run_id=pending_run.id,
+                tool_outputs=tool_outputs,
+                timeout=timeout
+            )
+
+
+async def apoll_run(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT):
+    """Versão assíncrona de poll_run"""
+    run = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id
+    )
+    deadline = time.monotonic() + timeout
+    delay = POLL_INITIAL_DELAY
+
+    while True:
+        if run.status in _ACTIVE_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                await _acancel_run(client, thread_id, run.id)
+                raise RunTimeoutError()
+
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+            run = await client.beta.threads.runs.retrieve(
+                thread_id=thread_id,
+                run_id=run.id
+            )
+        elif run.status == "requires_action":
+            tool_outputs = await aexecute_tool_calls(
+                run.required_action.submit_tool_outputs.tool_calls,
+                handler
+            )
+            run = await client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run.id,
+                tool_outputs=tool_outputs
+            )
+            deadline = time.monotonic() + timeout
+            delay = POLL_INITIAL_DELAY
+        elif run.status == "completed":
+            return run
+        else:
+            error = run.last_error
+            raise RunFailedError(error.message if error else run.status)
+
+
+async def alatest_message_text(client, thread_id, run_id=None):
+    """Versão assíncrona de latest_message_text"""
+    messages = await client.beta.threads.messages.list(thread_id=thread_id, **_message_filter(run_id))
+    return _assistant_text(messages, run_id)
+
+
+async def astream_assistant(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT):
+    """Versão assíncrona de stream_assistant"""
+    state = {}
+    if RUN_STREAMING and hasattr(client.beta.threads.runs, "stream"):
+        received = False
+        async for chunk in astream_run(client, thread_id, assistant_id, handler, timeout, state):
+            received = True
+            yield chunk
+        if received:
+            return
+    else:
+        state['run_id'] = (await apoll_run(client, thread_id, assistant_id, handler, timeout)).id
+
+    text = await alatest_message_text(client, thread_id, state.get('run_id'))
+    if text:
+        yield text
+
+
+async def arun_assistant(client, thread_id, assistant_id, handler, timeout=RUN_TIMEOUT):
+    """Versão assíncrona de run_assistant"""
+    chunks = [chunk async for chunk in astream_assistant(client, thread_id, assistant_id, handler, timeout)]
+    return "".join(chunks) or None
+
+
+class ExchangeRecorder:
+    """Grava na thread, em segundo plano, as trocas respondidas sem o assistente
+
+    Perguntas resolvidas localmente (ex.: cotações pelo roteador de intenções)
+    não passam por uma run, mas as próximas runs precisam delas como contexto.
+    As gravações de uma sessão saem na ordem e `wait` garante que terminem
+    antes da próxima mensagem dessa sessão ser adicionada à thread.
+    """
+
+    def __init__(self, workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thread-record')
+        self._pending = {}  # sessão -> Future da última gravação
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'errors': 0}
+
+    def _write(self, previous, client, thread_id, message, answer):
+        if previous is not None:
+            wait([previous])
+        try:
+            client.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+            client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=answer)
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            print(f"⚠️ Falha ao gravar resposta local na thread: {e}")
+            return
+        with self._lock:
+            self._stats['recorded'] += 1
+
+    def _forget(self, session_id, future):
+        with self._lock:
+            if self._pending.get(session_id) is future:
+                del self._pending[session_id]
+
+    def record(self, session_id, client, thread_id, message, answer):
+        """Agenda a gravação da pergunta e da resposta na thread da sessão"""
+        with self._lock:
+            previous = self._pending.get(session_id)
+            future = self._executor.submit(self._write, previous, client, thread_id, message, answer)
+            self._pending[session_id] = future
+        future.add_done_callback(lambda done: self._forget(session_id, done))
+
+    def wait(self, session_id):
+        """Bloqueia até as gravações pendentes da sessão terminarem"""
+        with self._lock:
+            future = self._pending.get(session_id)
+        if future is not None:
+            wait([future])
+
+    async def await_pending(self, session_id):
+        """Versão assíncrona de wait"""
+        with self._lock:
+            future = self._pending.get(session_id)
+        if future is not None:
+            await asyncio.wrap_future(future)
+
+    def stats(self):
+        """Gravações concluídas, com erro e pendentes"""
+        with self._lock:
+            return {**self._stats, 'pending': len(self._pending)}
+
+
+# Compartilhado por todos os assistentes do processo
+exchange_recorder = ExchangeRecorder()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: busca antiga por substring vs SymbolIndex
+
+Compara a varredura antiga (`consulta in nome`) com a busca do SymbolIndex,
+medindo o tempo por consulta e quantas consultas encontram o ativo esperado
+em primeiro lugar. O resultado que vale é o da lista distribuída (a mestre,
+data/symbols.csv, mais as listagens de data/listings.csv), medida primeiro;
+`--listings` acrescenta um universo sintético maior só para ver como as duas
+buscas escalam.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_symbol_search --repeat 200
+    python -m benchmarks.bench_symbol_search --listings 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from symbol_index import SymbolIndex  # noqa: E402
+
+# (consulta, símbolo esperado em primeiro lugar)
+QUERIES = [
+    ("PETR4", "PETR4.SA"),
+    ("petrobras", "PETR4.SA"),
+    ("petrobas", "PETR4.SA"),
+    ("Itaú", "ITUB4.SA"),
+    ("itau unibanco", "ITUB4.SA"),
+    ("vale", "VALE3.SA"),
+    ("magalu", "MGLU3.SA"),
+    ("banco do brasil", "BBAS3.SA"),
+    ("bitcoin", "BTC-USD"),
+    ("mircosoft", "MSFT"),
+    ("microsoft", "MSFT"),
+    ("ibovespa", "^BVSP"),
+]
+
+
+def linear_search(entries, query, limit=10):
+    """Busca antiga: substring no símbolo ou no nome, na ordem da lista"""
+    query_lower = query.lower()
+    results = []
+    for symbol, name, market, _ in entries:
+        if query_lower in symbol.lower() or query_lower in name.lower():
+            results.append((symbol, name, market))
+            if len(results) == limit:
+                break
+    return results
+
+
+def synthetic_entries(entries, listings, seed=42):
+    """Completa a lista mestre com nomes aleatórios até `listings` ativos"""
+    rng = random.Random(seed)
+    words = sorted({word for _, name, _, _ in entries for word in name.split() if len(word) > 2})
+    extra = []
+    while len(entries) + len(extra) < listings:
+        ticker = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(4))
+        name = " ".join(rng.sample(words, 3))
+        extra.append((f"{ticker}{rng.randint(3, 11)}.SA", name, "B3", []))
+    return entries + extra
+
+
+def _measure(search, repeat):
+    """Microssegundos por consulta e acertos em primeiro lugar"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query, _ in QUERIES:
+            search(query)
+    elapsed = time.perf_counter() - started
+
+    hits = 0
+    for query, expected in QUERIES:
+        results = search(query)
+        hits += bool(results) and results[0][0] == expected
+    return elapsed / (repeat * len(QUERIES)) * 1e6, hits
+
+
+def run(label, entries, repeat):
+    """Mede as duas buscas sobre a mesma lista"""
+    started = time.perf_counter()
+    index = SymbolIndex(entries)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    linear_us, linear_hits = _measure(lambda query: linear_search(entries, query), repeat)
+    index_us, index_hits = _measure(index.search, repeat)
+
+    print(f"\n📚 {label}: {len(entries)} ativos (chaves montadas em {build_ms:.1f} ms)")
+    print(f"   {'busca':<12} {'µs/consulta':>12} {'acertos':>10}")
+    print(f"   {'antiga':<12} {linear_us:>12.1f} {linear_hits:>7}/{len(QUERIES)}")
+    print(f"   {'SymbolIndex':<12} {index_us:>12.1f} {index_hits:>7}/{len(QUERIES)}")
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Benchmark da busca de ativos")
+    parser.add_argument("--listings", type=int, default=0,
+                        help="tamanho de um universo sintético extra (0 mede só a lista distribuída)")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    entries = SymbolIndex.from_file().entries
+    run("Lista distribuída", entries, args.repeat)
+    if args.listings > len(entries):
+        run("Universo sintético", synthetic_entries(entries, args.listings), max(1, args.repeat // 10))
+
+
+if __name__ == "__main__":
+    main()
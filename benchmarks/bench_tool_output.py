@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON completo vs saída compacta das ferramentas
+
+Executa as ferramentas do registro sobre o provedor escolhido (sintético por
+padrão, sem rede) e compara, para cada resultado, os tokens do JSON antigo
+(`json.dumps(..., ensure_ascii=False)`) com os do encoder compacto, além do
+tempo de serialização.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_tool_output --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')
+os.environ.setdefault('PREFETCH_ENABLED', 'false')
+
+from finance_api import FinanceAPI  # noqa: E402
+from history_manager import count_tokens  # noqa: E402
+from tool_output import encode, orjson  # noqa: E402
+from tool_registry import ToolSet  # noqa: E402
+
+# Chamadas típicas de uma conversa
+CALLS = [
+    ("get_stock_info", {"symbol": "PETR4.SA"}),
+    ("get_stock_info", {"symbol": "BTC-USD"}),
+    ("get_stock_fundamentals", {"symbol": "AAPL"}),
+    ("get_stock_history", {"symbol": "VALE3.SA", "period": "1mo"}),
+    ("search_stocks", {"query": "banco"}),
+    ("get_market_summary", {}),
+    ("get_trending_stocks", {}),
+    ("screen_stocks", {"criterion": "change", "limit": 10}),
+    ("analyze_stocks", {"symbols": ["PETR4.SA", "VALE3.SA", "ITUB4.SA"], "period": "6mo"}),
+]
+
+
+def legacy(result):
+    """Serialização usada antes do encoder compacto"""
+    return json.dumps(result, ensure_ascii=False)
+
+
+def _time(encoder, results, repeat):
+    """Microssegundos por resultado serializado"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for result in results:
+            encoder(result)
+    return (time.perf_counter() - started) / (repeat * len(results)) * 1e6
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Benchmark da saída das ferramentas")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    tools = ToolSet(FinanceAPI())
+    results = []
+
+    print(f"\n🧮 Tokens por chamada ({os.environ['MARKET_DATA_PROVIDER']})")
+    print(f"   {'ferramenta':<24} {'antes':>7} {'depois':>7} {'economia':>9}")
+    total_before = total_after = 0
+    for name, arguments in CALLS:
+        result = tools.execute(name, arguments)
+        results.append(result)
+        before, after = count_tokens(legacy(result)), count_tokens(encode(result))
+        total_before += before
+        total_after += after
+        saved = (1 - after / before) * 100 if before else 0
+        print(f"   {name:<24} {before:>7} {after:>7} {saved:>8.1f}%")
+
+    print(f"   {'total':<24} {total_before:>7} {total_after:>7} {(1 - total_after / total_before) * 100:>8.1f}%")
+    print(f"   média economizada: {(total_before - total_after) / len(CALLS):.1f} tokens por chamada")
+
+    print(f"\n⏱️ Serialização (µs por resultado, orjson {'disponível' if orjson else 'ausente'})")
+    print(f"   {'json.dumps':<24} {_time(legacy, results, args.repeat):>9.1f}")
+    print(f"   {'encode (compacto)':<24} {_time(encode, results, args.repeat):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
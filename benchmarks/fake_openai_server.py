@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Servidor falso da API da OpenAI para testes de carga locais
+
+Implementa apenas POST /v1/chat/completions (com e sem `stream`), respondendo
+após uma latência configurável para simular o tempo do modelo. Usa somente a
+biblioteca padrão.
+
+Uso:
+    python -m benchmarks.fake_openai_server --port 8100 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake python app.py
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+REPLY = "Olá! Esta é uma resposta simulada do servidor de testes do FinanceBot."
+
+
+def _completion(model, content, usage):
+    """Monta uma resposta de chat.completion"""
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+def _chunk(model, delta, finish_reason=None):
+    """Monta um evento chat.completion.chunk"""
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+
+def _usage(payload):
+    """Estima o uso de tokens da requisição (~4 caracteres por token)"""
+    prompt_chars = sum(len(m.get("content") or "") for m in payload.get("messages", []))
+    prompt_tokens = prompt_chars // 4 + 4 * len(payload.get("messages", []))
+    completion_tokens = len(REPLY) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+class FakeOpenAIServer:
+    def __init__(self, latency=0.5, token_delay=0.01):
+        """Configura a latência total e o intervalo entre tokens no streaming"""
+        self.latency = latency
+        self.token_delay = token_delay
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        """Atende requisições HTTP/1.1 com keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+
+                if method != "POST" or not path.endswith("/chat/completions"):
+                    await self._send_json(writer, 404, {"error": {"message": "not found"}})
+                    continue
+
+                payload = json.loads(body or b"{}")
+                model = payload.get("model", "gpt-3.5-turbo")
+
+                if payload.get("stream"):
+                    await self._send_stream(writer, model, payload)
+                    break
+
+                await asyncio.sleep(self.latency)
+                await self._send_json(writer, 200, _completion(model, REPLY, _usage(payload)))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send_json(self, writer, status, payload):
+        """Envia uma resposta JSON mantendo a conexão aberta"""
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _send_stream(self, writer, model, payload):
+        """Envia a resposta como server-sent events, token a token"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await asyncio.sleep(self.latency)
+
+        events = [_chunk(model, {"role": "assistant", "content": ""})]
+        events += [_chunk(model, {"content": word + " "}) for word in REPLY.split()]
+        events.append(_chunk(model, {}, "stop"))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            events.append(dict(_chunk(model, {}), choices=[], usage=_usage(payload)))
+
+        for event in events:
+            writer.write(f"data: {json.dumps(event)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(self.token_delay)
+
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+    async def serve(self, host, port):
+        """Sobe o servidor e atende até ser interrompido"""
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Servidor falso da OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"🧪 Fake OpenAI em http://{args.host}:{args.port}/v1 (latência {args.latency}s)")
+    try:
+        asyncio.run(FakeOpenAIServer(args.latency).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
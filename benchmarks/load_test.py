@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Teste de carga: servidor Flask (com e sem threads) vs modo ASGI
+
+Sobe o servidor falso da OpenAI, inicia o app.py (chat completions) em cada
+modo apontando para ele e dispara requisições concorrentes em /chat,
+comparando vazão e latência. A referência justa é o `flask-threads`: é como
+o `app.run()` original atende (o servidor de desenvolvimento do Flask usa uma
+thread por requisição). O `flask-1-worker` mostra o pior caso de um worker
+WSGI síncrono sem threads.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.load_test --requests 100 --concurrency 100 --latency 0.5
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Servidor de desenvolvimento do Flask; sys.argv[2] liga as threads por requisição
+SYNC_SERVER = (
+    "import sys; from werkzeug.serving import run_simple; import app; "
+    "run_simple('127.0.0.1', int(sys.argv[1]), app.app, threaded=sys.argv[2] == 'threaded')"
+)
+
+
+def _free_port():
+    """Reserva uma porta livre"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, timeout=30):
+    """Aguarda o servidor responder"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"Servidor não respondeu em {url}")
+
+
+def _post_chat(base_url, index):
+    """Envia uma mensagem e mede a latência"""
+    body = json.dumps({"message": f"Olá {index}", "session_id": f"load-{index}"}).encode()
+    request = urllib.request.Request(
+        f"{base_url}/chat",
+        data=body,
+        headers={"Content-Type": "application/json"}
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+def run_load(base_url, total, concurrency):
+    """Dispara `total` requisições com `concurrency` clientes simultâneos"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _post_chat(base_url, i), range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for ok, latency in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "p50_s": round(statistics.median(latencies), 3) if latencies else None,
+        "p95_s": round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else None
+    }
+
+
+def _start(command, env):
+    """Inicia um subprocesso na raiz do projeto"""
+    return subprocess.Popen(
+        command,
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Teste de carga do FinanceBot")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="latência simulada do modelo (s)")
+    parser.add_argument("--only", choices=["flask-threads", "flask-1-worker", "asgi"],
+                        help="executa apenas um dos modos")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+        MARKET_DATA_PROVIDER=os.getenv("MARKET_DATA_PROVIDER", "synthetic")
+    )
+
+    processes = [_start(
+        [sys.executable, "-m", "benchmarks.fake_openai_server",
+         "--port", str(fake_port), "--latency", str(args.latency)],
+        env
+    )]
+
+    servers = {
+        "flask-threads": (
+            "Flask com uma thread por requisição (padrão do app.run)",
+            lambda port: [sys.executable, "-c", SYNC_SERVER, str(port), "threaded"]
+        ),
+        "flask-1-worker": (
+            "Flask sem threads (um worker WSGI síncrono, pior caso)",
+            lambda port: [sys.executable, "-c", SYNC_SERVER, str(port), "single"]
+        ),
+        "asgi": (
+            "Quart + Hypercorn (asgi_app.py)",
+            lambda port: [sys.executable, "asgi_app.py", "--mode", "chat",
+                          "--host", "127.0.0.1", "--port", str(port)]
+        )
+    }
+
+    results = {}
+    try:
+        for name, (description, command) in servers.items():
+            if args.only and args.only != name:
+                continue
+
+            port = _free_port()
+            server = _start(command(port), env)
+            processes.append(server)
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_for(base_url + "/")
+
+            print(f"⏱️ {name} ({description}): {args.requests} requisições, {args.concurrency} simultâneas...")
+            results[name] = run_load(base_url, args.requests, args.concurrency)
+            print(f"   {results[name]}")
+
+            server.terminate()
+            server.wait()
+    finally:
+        for process in processes:
+            process.terminate()
+
+    # O ganho do ASGI é medido contra o Flask com threads, não contra o pior caso
+    baseline = results.get("flask-threads", {}).get("throughput_rps")
+    if baseline and "asgi" in results:
+        print(f"\n📊 ASGI vs Flask com threads: {results['asgi']['throughput_rps'] / baseline:.2f}x a vazão")
+
+
+if __name__ == "__main__":
+    main()
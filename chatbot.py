@@ -8,6 +8,7 @@ import os
 import openai
 from openai import OpenAI
 import sys
+from history_manager import HistoryManager, TokenMetrics, history_tokens
 
 class ChatBot:
     def __init__(self):
@@ -29,14 +30,20 @@ class ChatBot:
             {"role": "system", "content": "Você é um assistente útil e amigável. Responda de forma clara e concisa."}
         ]
         
-        print("🤖 Chatbot iniciado! Digite 'sair' para encerrar.")
+        # Mantém o histórico dentro do orçamento de tokens
+        self.history_manager = HistoryManager()
+        self.token_metrics = TokenMetrics()
+        
+        print("🤖 Chatbot iniciado! Digite 'sair' para encerrar ou 'tokens' para ver o consumo.")
         print("=" * 50)
     
     def get_response(self, user_message):
         """Envia mensagem para a API e retorna a resposta"""
         try:
-            # Adiciona a mensagem do usuário ao histórico
+            # Compacta o histórico e adiciona a mensagem do usuário
+            compacted = self.history_manager.compact(self.conversation_history)
             self.conversation_history.append({"role": "user", "content": user_message})
+            estimated_tokens = history_tokens(self.conversation_history)
             
             # Chama a API do ChatGPT
             response = self.client.chat.completions.create(
@@ -52,6 +59,15 @@ class ChatBot:
             # Adiciona a resposta do bot ao histórico
             self.conversation_history.append({"role": "assistant", "content": bot_message})
             
+            usage = response.usage
+            self.token_metrics.record(
+                "terminal",
+                estimated_tokens,
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0,
+                compacted_messages=compacted
+            )
+            
             return bot_message
             
         except Exception as e:
@@ -69,6 +85,16 @@ class ChatBot:
                     print("\n🤖 Bot: Até logo! Foi um prazer conversar com você! 👋")
                     break
                 
+                # Mostra o consumo de tokens da sessão
+                if user_input.lower() == 'tokens':
+                    metrics = self.token_metrics.summary()
+                    print(f"\n📊 Requisições: {metrics['requests']} | "
+                          f"Prompt: {metrics['prompt_tokens']} tokens "
+                          f"(média {metrics['avg_prompt_tokens']}) | "
+                          f"Resposta: {metrics['completion_tokens']} tokens | "
+                          f"Mensagens resumidas: {metrics['compacted_messages']}")
+                    continue
+                
                 # Verifica se a entrada não está vazia
                 if not user_input:
                     print("⚠️  Por favor, digite uma mensagem!")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Gera data/listings.csv: ações dos principais índices mundiais
+
+A lista curada (data/symbols.csv) cobre a B3, as ações americanas mais
+buscadas, criptomoedas e índices, e é também o universo do screener. Esta
+lista complementa a busca com as empresas dos índices acompanhados pelo
+pacote pytickersymbols (licença MIT): S&P 500, NASDAQ 100, DOW JONES,
+DAX, FTSE 100, CAC 40, IBEX 35, AEX, Nikkei 225 e outros.
+
+Cada empresa entra uma vez, com a listagem que o Yahoo Finance usa como
+principal: a americana (sem sufixo, em USD) quando existe, senão a da bolsa
+de origem (.L, .T, .MC, ...) e por último Frankfurt (.F). Símbolos já
+presentes na lista curada ficam de fora.
+
+Uso (a partir da raiz do projeto):
+    pip install pytickersymbols
+    python data/build_listings.py
+"""
+
+import csv
+import os
+
+from pytickersymbols import PyTickerSymbols
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+CURATED = os.path.join(DATA_DIR, 'symbols.csv')
+OUTPUT = os.path.join(DATA_DIR, 'listings.csv')
+
+
+def _primary_listing(symbols):
+    """Símbolo principal no Yahoo Finance e mercado ('US' ou 'INTL')"""
+    listings = [item for item in symbols if item.get('yahoo')]
+    for item in listings:
+        if '.' not in item['yahoo'] and item.get('currency') == 'USD':
+            return item['yahoo'], 'US'
+    for item in listings:
+        if '.' in item['yahoo'] and not item['yahoo'].endswith('.F'):
+            return item['yahoo'], 'INTL'
+    if listings:
+        return listings[0]['yahoo'], 'INTL'
+    return None, None
+
+
+def main():
+    """Função principal"""
+    with open(CURATED, newline='', encoding='utf-8') as f:
+        seen = {row['symbol'].strip().upper() for row in csv.DictReader(f)}
+
+    rows = []
+    for stock in PyTickerSymbols().get_all_stocks():
+        symbol, market = _primary_listing(stock.get('symbols') or [])
+        if not symbol or symbol.upper() in seen:
+            continue
+        seen.add(symbol.upper())
+        rows.append((symbol.upper(), stock['name'].strip(), market, ''))
+
+    rows.sort()
+    with open(OUTPUT, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['symbol', 'name', 'market', 'aliases'])
+        writer.writerows(rows)
+    print(f"✅ {len(rows)} ativos gravados em {OUTPUT}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,243 @@
-import yfinance as yf
 import pandas as pd
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import requests
+from market_data import get_provider
+from history_store import HistoryStore, get_history_store
+import analytics
+from screener import Screener, get_screener
+from symbol_index import get_symbol_index, ASSET_TYPES
+from prefetcher import Prefetcher, symbol_traffic, market_of, is_market_open, seconds_until_open
+
+# Tempo de vida (segundos) das cotações em cache por classe de ativo
+QUOTE_TTLS = {
+    'Criptomoeda': 15,
+    'Ação Brasileira': 60,
+    'Ação Internacional': 60,
+    'Índice': 120
+}
+
+# Fundamentos (P/L, valor de mercado, dividendos) mudam no máximo uma vez por dia
+FUNDAMENTALS_TTL = int(os.getenv('FUNDAMENTALS_TTL', '21600'))
+
+# Com o pregão fechado o preço não muda: o cache vale por mais tempo
+CLOSED_MARKET_TTL = int(os.getenv('CLOSED_MARKET_TTL', '1800'))
+
+# Índices do resumo de mercado
+MARKET_INDICES = ['^BVSP', '^GSPC', '^DJI', '^IXIC']
+
+# Janela extra (segundos) em que um valor expirado ainda é servido
+# enquanto a atualização roda em segundo plano
+QUOTE_STALE_WINDOW = 600
+
+
+class _Flight:
+    """Carregamento em andamento de uma chave, compartilhado por quem a pediu"""
 
-class FinanceAPI:
     def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """Cache LRU com TTL, stale-while-revalidate e single-flight para cotações"""
+
+    def __init__(self, max_entries=512, stale_window=QUOTE_STALE_WINDOW):
+        self.max_entries = max_entries
+        self.stale_window = stale_window
+        self._entries = OrderedDict()  # chave -> (valor, obtido_em, ttl)
+        self._refreshing = set()
+        self._inflight = {}  # chave -> _Flight do carregamento em andamento
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'coalesced': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'evictions': 0
+        }
+
+    def get(self, key, loader, ttl, cache_if=None):
+        """Retorna o valor em cache ou carrega com `loader`
+
+        Valores vencidos há menos de `stale_window` segundos são servidos
+        imediatamente e atualizados em uma thread de fundo.
+        """
+        results = self.get_many(
+            [key],
+            lambda keys: {key: loader()},
+            lambda _key: ttl,
+            cache_if=cache_if
+        )
+        return results[key]
+
+    def get_many(self, keys, loader, ttl_for, cache_if=None):
+        """Versão em lote de `get`
+
+        `loader` recebe a lista de chaves ausentes e devolve um dicionário
+        {chave: valor}; `ttl_for` informa o TTL de cada chave. Chaves que já
+        estão sendo carregadas por outra thread não geram nova busca: a
+        chamada espera aquele carregamento e recebe o mesmo resultado.
+        """
+        now = time.monotonic()
+        results = {}
+        missing = []
+        waiting = []
+        stale = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    value, fetched_at, entry_ttl = entry
+                    age = now - fetched_at
+                    if age < entry_ttl:
+                        self._entries.move_to_end(key)
+                        self._stats['hits'] += 1
+                        results[key] = value
+                        continue
+                    if age < entry_ttl + self.stale_window:
+                        self._entries.move_to_end(key)
+                        self._stats['stale_hits'] += 1
+                        results[key] = value
+                        if key not in self._refreshing:
+                            stale.append(key)
+                        continue
+                self._stats['misses'] += 1
+                flight = self._inflight.get(key)
+                if flight is not None:
+                    self._stats['coalesced'] += 1
+                    waiting.append((key, flight))
+                else:
+                    self._inflight[key] = _Flight()
+                    missing.append(key)
+            
+            if missing:
+                self._stats['loads'] += 1
+            if stale:
+                self._schedule_refresh(stale, loader, ttl_for, cache_if)
+        
+        if missing:
+            self._load(missing, loader, ttl_for, cache_if, results)
+        
+        for key, flight in waiting:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            results[key] = flight.value
+        return results
+
+    def _load(self, keys, loader, ttl_for, cache_if, results):
+        """Carrega as chaves e entrega o resultado a quem estiver esperando"""
+        with self._lock:
+            flights = {key: self._inflight[key] for key in keys}
+        try:
+            loaded = loader(keys)
+            for key in keys:
+                value = loaded.get(key)
+                results[key] = flights[key].value = value
+                if value is not None and (cache_if is None or cache_if(value)):
+                    self.set(key, value, ttl_for(key))
+        except Exception as e:
+            for flight in flights.values():
+                flight.error = e
+            raise
+        finally:
+            with self._lock:
+                for key in keys:
+                    del self._inflight[key]
+            for flight in flights.values():
+                flight.done.set()
+
+    def set(self, key, value, ttl):
+        """Armazena um valor, removendo os menos usados se necessário"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic(), ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _schedule_refresh(self, keys, loader, ttl_for, cache_if):
+        """Dispara atualização em segundo plano (chamar com o lock)"""
+        self._refreshing.update(keys)
+        worker = threading.Thread(
+            target=self._refresh,
+            args=(keys, loader, ttl_for, cache_if),
+            daemon=True
+        )
+        worker.start()
+
+    def _refresh(self, keys, loader, ttl_for, cache_if):
+        """Recarrega chaves vencidas"""
+        try:
+            loaded = loader(keys)
+            for key in keys:
+                value = loaded.get(key)
+                if value is not None and (cache_if is None or cache_if(value)):
+                    self.set(key, value, ttl_for(key))
+                    with self._lock:
+                        self._stats['refreshes'] += 1
+                else:
+                    with self._lock:
+                        self._stats['refresh_errors'] += 1
+        except Exception:
+            with self._lock:
+                self._stats['refresh_errors'] += len(keys)
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    def clear(self):
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Retorna contadores de uso do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+        
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Cache compartilhado por todas as instâncias de FinanceAPI
+quote_cache = QuoteCache(max_entries=int(os.getenv('QUOTE_CACHE_SIZE', '512')))
+
+
+def _is_cacheable(result):
+    """Resultados de erro não são armazenados em cache"""
+    return not (isinstance(result, dict) and 'error' in result)
+
+
+class FinanceAPI:
+    def __init__(self, cache=None, provider=None, history_store=None, traffic=None):
         """Inicializa a classe de API financeira"""
+        self.cache = cache or quote_cache
+        self.market_data = provider or get_provider()
+        self.market_indices = MARKET_INDICES
+        
+        # Pedidos por símbolo, usados para escolher o que pré-carregar
+        self.traffic = traffic if traffic is not None else symbol_traffic
+        self._prefetcher = None
+        
+        # Históricos diários ficam em disco e só o fim da série é atualizado
+        if history_store is None:
+            history_store = get_history_store() if provider is None else HistoryStore(provider=provider)
+        self.history_store = history_store
+        self._screener = None
+        
         self.popular_stocks = {
             # Ações Brasileiras
             'PETR4.SA': 'Petrobras',
@@ -46,65 +277,86 @@ class FinanceAPI:
         }
     
     def get_stock_info(self, symbol):
-        """Obtém informações básicas de uma ação"""
+        """Cotação atual de um ativo (caminho rápido, sem fundamentos)"""
+        return self.get_quotes([symbol])[symbol.upper()]
+    
+    def get_fundamentals(self, symbol):
+        """Fundamentos de um ativo, buscados sob demanda e guardados por horas"""
+        symbol = symbol.upper()
+        return self.cache.get(
+            ('fundamentals', symbol),
+            lambda: self._fetch_fundamentals(symbol),
+            FUNDAMENTALS_TTL,
+            cache_if=_is_cacheable
+        )
+    
+    def get_cache_stats(self):
+        """Retorna as métricas do cache de cotações"""
+        return self.cache.stats()
+    
+    def get_provider_stats(self):
+        """Retorna as métricas do provedor de dados de mercado"""
+        stats = getattr(self.market_data, 'stats', None)
+        stats = stats() if stats else {'provider': self.market_data.name}
+        stats['history_store'] = self.history_store.stats()
+        return stats
+    
+    def get_quote_ttl(self, symbol):
+        """Define o TTL da cotação conforme o tipo do ativo e o horário do pregão"""
+        market = market_of(symbol)
+        if not is_market_open(market):
+            # Não passa da abertura: o preço volta a mudar no primeiro minuto do pregão
+            until_open = seconds_until_open(market)
+            return max(1, min(CLOSED_MARKET_TTL, int(until_open))) if until_open else CLOSED_MARKET_TTL
+        return QUOTE_TTLS.get(self._get_asset_type(symbol), 60)
+    
+    @property
+    def prefetcher(self):
+        """Pré-carregamento das cotações mais pedidas (criado sob demanda)"""
+        if self._prefetcher is None:
+            self._prefetcher = Prefetcher(self, self.traffic)
+        return self._prefetcher
+    
+    def _fetch_fundamentals(self, symbol):
+        """Busca os fundamentos no provedor (chamada `info`, lenta)"""
         try:
-            stock = yf.Ticker(symbol.upper())
-            info = stock.info
-            
-            # Dados básicos
-            current_price = info.get('currentPrice', info.get('regularMarketPrice', 'N/A'))
-            previous_close = info.get('previousClose', 'N/A')
-            company_name = info.get('longName', info.get('shortName', symbol))
-            
-            # Calcula variação
-            if current_price != 'N/A' and previous_close != 'N/A':
-                change = current_price - previous_close
-                change_percent = (change / previous_close) * 100
-            else:
-                change = change_percent = 'N/A'
+            info = self.market_data.info(symbol)
             
             return {
-                'symbol': symbol.upper(),
-                'name': company_name,
-                'current_price': current_price,
-                'previous_close': previous_close,
-                'change': change,
-                'change_percent': change_percent,
-                'currency': info.get('currency', 'USD'),
+                'symbol': symbol,
+                'name': info.get('longName', info.get('shortName', symbol)),
+                'currency': info.get('currency', self._get_currency(symbol)),
+                'sector': info.get('sector', 'N/A'),
                 'market_cap': info.get('marketCap', 'N/A'),
-                'volume': info.get('volume', 'N/A'),
                 'pe_ratio': info.get('trailingPE', 'N/A'),
+                'forward_pe': info.get('forwardPE', 'N/A'),
+                'price_to_book': info.get('priceToBook', 'N/A'),
                 'dividend_yield': info.get('dividendYield', 'N/A'),
-                'day_high': info.get('dayHigh', 'N/A'),
-                'day_low': info.get('dayLow', 'N/A'),
                 'week_52_high': info.get('fiftyTwoWeekHigh', 'N/A'),
                 'week_52_low': info.get('fiftyTwoWeekLow', 'N/A')
             }
         except Exception as e:
-            return {'error': f'Erro ao buscar dados para {symbol}: {str(e)}'}
+            return {'error': f'Erro ao buscar fundamentos para {symbol}: {str(e)}'}
     
     def get_stock_history(self, symbol, period='1mo'):
         """Obtém histórico de preços"""
         try:
-            stock = yf.Ticker(symbol.upper())
-            hist = stock.history(period=period)
+            hist = self.history_store.history(symbol.upper(), period)
             
             if hist.empty:
                 return {'error': f'Nenhum dado encontrado para {symbol}'}
             
             # Últimos 5 dias
             recent_data = hist.tail(5)
-            history_data = []
-            
-            for date, row in recent_data.iterrows():
-                history_data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'open': round(row['Open'], 2),
-                    'high': round(row['High'], 2),
-                    'low': round(row['Low'], 2),
-                    'close': round(row['Close'], 2),
-                    'volume': int(row['Volume'])
-                })
+            prices = recent_data[['Open', 'High', 'Low', 'Close']].round(2)
+            history_data = [
+                {'date': date, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+                for date, open_, high, low, close, volume in zip(
+                    recent_data.index.strftime('%Y-%m-%d'),
+                    *prices.to_numpy().T.tolist(),
+                    recent_data['Volume'].fillna(0).astype('int64').tolist()
+                )
+            ]
             
             return {
                 'symbol': symbol.upper(),
@@ -114,22 +366,55 @@ class FinanceAPI:
         except Exception as e:
             return {'error': f'Erro ao buscar histórico para {symbol}: {str(e)}'}
     
-    def search_stocks(self, query):
-        """Busca ações por nome ou símbolo"""
-        results = []
-        query_lower = query.lower()
-        
-        # Busca nas ações populares
-        for symbol, name in self.popular_stocks.items():
-            if (query_lower in symbol.lower() or 
-                query_lower in name.lower()):
-                results.append({
-                    'symbol': symbol,
-                    'name': name,
-                    'type': self._get_asset_type(symbol)
-                })
+    def analyze_stocks(self, symbols, period='1y', benchmark='^BVSP'):
+        """Calcula métricas históricas de vários ativos de uma só vez"""
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        if not symbols:
+            return {'error': 'Informe ao menos um símbolo'}
         
-        return results[:10]  # Limita a 10 resultados
+        try:
+            # Um download em lote para o que falta em disco, em vez de um por ativo
+            self.history_store.preload(symbols + [benchmark.upper()])
+            frames = {}
+            errors = {}
+            for symbol in symbols + [benchmark.upper()]:
+                try:
+                    frames[symbol] = self.history_store.history(symbol, period)
+                except Exception as e:
+                    errors[symbol] = str(e)
+            
+            dates, found, closes = analytics.price_matrix(frames)
+            if not found:
+                return {'error': 'Nenhum dado encontrado para os símbolos informados'}
+            
+            benchmark_series = None
+            if benchmark.upper() in found:
+                benchmark_series = closes[:, found.index(benchmark.upper())]
+            
+            metrics = analytics.compute_metrics(closes, benchmark=benchmark_series)
+            table = analytics.metrics_by_symbol(found, metrics)
+            
+            return {
+                'period': period,
+                'benchmark': benchmark.upper(),
+                'start_date': dates[0].strftime('%Y-%m-%d'),
+                'end_date': dates[-1].strftime('%Y-%m-%d'),
+                'metrics': {symbol: table[symbol] for symbol in symbols if symbol in table},
+                'missing': [symbol for symbol in symbols if symbol not in table]
+            }
+        except Exception as e:
+            return {'error': f'Erro ao analisar ativos: {str(e)}'}
+    
+    def search_stocks(self, query):
+        """Busca ações por nome ou símbolo (aproximada, sem diferenciar acentos)"""
+        return [
+            {
+                'symbol': symbol,
+                'name': name,
+                'type': ASSET_TYPES.get(market) or self._get_asset_type(symbol)
+            }
+            for symbol, name, market, _ in get_symbol_index().search(query, limit=10)
+        ]
     
     def _get_asset_type(self, symbol):
         """Determina o tipo do ativo"""
@@ -142,46 +427,122 @@ class FinanceAPI:
         else:
             return 'Ação Internacional'
     
+    def _get_currency(self, symbol):
+        """Moeda de negociação presumida pela bolsa do ativo"""
+        return 'BRL' if market_of(symbol) == 'B3' else 'USD'
+    
+    def get_quotes(self, symbols):
+        """Obtém cotações de vários ativos com um único download em lote"""
+        symbols = [symbol.upper() for symbol in symbols]
+        self.traffic.record('quote', symbols)
+        results = self.cache.get_many(
+            [('quote', symbol) for symbol in symbols],
+            lambda keys: {
+                ('quote', symbol): quote
+                for symbol, quote in self._download_quotes([key[1] for key in keys]).items()
+            },
+            lambda key: self.get_quote_ttl(key[1]),
+            cache_if=_is_cacheable
+        )
+        return {symbol: results[('quote', symbol)] for symbol in symbols}
+    
+    def refresh_quotes(self, symbols):
+        """Baixa as cotações em lote e grava no cache; retorna quantas foram gravadas"""
+        stored = 0
+        for symbol, quote in self._download_quotes(symbols).items():
+            if _is_cacheable(quote):
+                self.cache.set(('quote', symbol), quote, self.get_quote_ttl(symbol))
+                stored += 1
+        return stored
+    
+    def _download_quotes(self, symbols):
+        """Baixa os últimos pregões de vários símbolos em uma só chamada"""
+        try:
+            frames = self.market_data.download(symbols, period='5d')
+        except Exception as e:
+            return {symbol: {'error': f'Erro ao buscar dados para {symbol}: {str(e)}'} for symbol in symbols}
+        
+        quotes = {}
+        for symbol in symbols:
+            try:
+                frame = frames.get(symbol)
+                
+                if frame is None or frame.empty:
+                    quotes[symbol] = {'error': f'Nenhum dado encontrado para {symbol}'}
+                    continue
+                
+                last = frame.iloc[-1]
+                current_price = float(last['Close'])
+                previous_close = float(frame['Close'].iloc[-2]) if len(frame) > 1 else current_price
+                change = current_price - previous_close
+                change_percent = (change / previous_close) * 100 if previous_close else 0
+                
+                quotes[symbol] = {
+                    'symbol': symbol,
+                    'name': get_symbol_index().name_of(symbol) or self.popular_stocks.get(symbol, symbol),
+                    'current_price': current_price,
+                    'previous_close': previous_close,
+                    'change': change,
+                    'change_percent': change_percent,
+                    'currency': self._get_currency(symbol),
+                    'volume': int(last['Volume']) if pd.notna(last['Volume']) else 'N/A',
+                    'day_high': float(last['High']),
+                    'day_low': float(last['Low'])
+                }
+            except Exception as e:
+                quotes[symbol] = {'error': f'Erro ao buscar dados para {symbol}: {str(e)}'}
+        
+        return quotes
+    
     def get_market_summary(self):
         """Obtém resumo dos principais índices"""
-        indices = ['^BVSP', '^GSPC', '^DJI', '^IXIC']
         summary = []
         
-        for index in indices:
-            try:
-                data = self.get_stock_info(index)
-                if 'error' not in data:
-                    summary.append({
-                        'name': data['name'],
-                        'symbol': data['symbol'],
-                        'price': data['current_price'],
-                        'change': data['change'],
-                        'change_percent': data['change_percent']
-                    })
-            except:
-                continue
+        for data in self.get_quotes(self.market_indices).values():
+            if 'error' not in data:
+                summary.append({
+                    'name': data['name'],
+                    'symbol': data['symbol'],
+                    'price': data['current_price'],
+                    'change': data['change'],
+                    'change_percent': data['change_percent']
+                })
         
         return summary
     
+    @property
+    def screener(self):
+        """Screener do universo de ativos (criado sob demanda)"""
+        if self._screener is None:
+            self._screener = get_screener() if self.market_data is get_provider() else Screener(self.market_data)
+        return self._screener
+    
+    def screen_stocks(self, criterion='change', market=None, limit=10, order='desc'):
+        """Ranqueia o universo por variação diária, pico de volume ou momentum"""
+        try:
+            return {
+                'criterion': criterion,
+                'market': market or 'ALL',
+                'order': order,
+                'results': self.screener.rank(criterion, market, limit, order)
+            }
+        except Exception as e:
+            return {'error': f'Erro no screener: {str(e)}'}
+    
     def get_trending_stocks(self):
-        """Obtém ações em alta (simulado com ações populares)"""
-        trending = ['PETR4.SA', 'VALE3.SA', 'AAPL', 'TSLA', 'BTC-USD']
-        results = []
-        
-        for symbol in trending:
-            try:
-                data = self.get_stock_info(symbol)
-                if 'error' not in data:
-                    results.append({
-                        'symbol': data['symbol'],
-                        'name': data['name'],
-                        'price': data['current_price'],
-                        'change_percent': data['change_percent']
-                    })
-            except:
-                continue
-        
-        return results
+        """Obtém as ações com maior alta do dia no universo do screener"""
+        try:
+            return [
+                {
+                    'symbol': item['symbol'],
+                    'name': item['name'],
+                    'price': item['price'],
+                    'change_percent': item['change_percent']
+                }
+                for item in self.screener.rank('change', limit=5)
+            ]
+        except Exception:
+            return []
     
     def format_currency(self, value, currency='BRL'):
         """Formata valores monetários"""
@@ -5,9 +5,14 @@ Finance Assistant - Especialista em Finanças usando OpenAI Assistant API
 
 import os
 import json
-import time
 from openai import OpenAI
-import yfinance as yf
+from assistant_runtime import run_assistant
+from assistant_bootstrap import resolve_assistant, StartupTimer
+from finance_api import FinanceAPI
+from tool_registry import ToolSet
+from history_store import get_history_store
+import analytics
+from symbol_index import get_symbol_index
 from datetime import datetime, timedelta
 
 class FinanceAssistant:
@@ -18,32 +23,42 @@ class FinanceAssistant:
         if not api_key:
             raise ValueError("OPENAI_API_KEY não encontrada!")
         
+        timer = StartupTimer()
         self.client = OpenAI(api_key=api_key)
+        self.finance_api = FinanceAPI()
+        
+        # Ferramentas do registro compartilhado, com respostas formatadas por este CLI
+        self.tools = ToolSet(
+            self.finance_api,
+            ['get_stock_info', 'get_stock_fundamentals', 'get_market_summary', 'search_stocks', 'get_stock_history'],
+            overrides={
+                'get_stock_info': self.get_stock_price,
+                'get_stock_fundamentals': self.get_stock_fundamentals,
+                'get_market_summary': self.get_market_summary,
+                'search_stocks': self.search_stock,
+                'get_stock_history': self.get_historical_data
+            }
+        )
+        self.history_store = get_history_store()
         
         # Cria ou recupera o assistente especializado
-        self.assistant = self._create_finance_assistant()
+        with timer.step('assistente'):
+            self.assistant = self._create_finance_assistant()
         
         # Cria uma thread para a conversa
-        self.thread = self.client.beta.threads.create()
+        with timer.step('thread'):
+            self.thread = self.client.beta.threads.create()
         
         print("💰 Finance Assistant inicializado!")
+        timer.report()
         print("🤖 Sou um especialista em finanças. Como posso ajudá-lo?")
         print("=" * 60)
     
     def _create_finance_assistant(self):
         """Cria um assistente especializado em finanças"""
         try:
-            # Tenta buscar assistente existente
-            assistants = self.client.beta.assistants.list()
-            for assistant in assistants.data:
-                if assistant.name == "Finance Expert":
-                    print("✅ Assistente Finance Expert encontrado!")
-                    return assistant
-            
-            # Cria novo assistente se não existir
-            print("🔧 Criando novo assistente Finance Expert...")
-            
-            assistant = self.client.beta.assistants.create(
+            # Reaproveita o id em cache; busca ou cria o assistente só quando necessário
+            assistant = resolve_assistant(self.client, dict(
                 name="Finance Expert",
                 instructions="""
                 Você é um ESPECIALISTA EM FINANÇAS altamente qualificado. Suas responsabilidades incluem:
@@ -80,80 +95,11 @@ class FinanceAssistant:
                 - Use emojis para tornar as respostas mais amigáveis
                 - Responda em português brasileiro
                 """,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_stock_price",
-                            "description": "Obtém preço atual e informações de uma ação",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "symbol": {
-                                        "type": "string",
-                                        "description": "Símbolo da ação (ex: PETR4.SA, AAPL)"
-                                    }
-                                },
-                                "required": ["symbol"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_market_summary",
-                            "description": "Obtém resumo dos principais índices do mercado",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "search_stock",
-                            "description": "Busca ações por nome da empresa",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "company_name": {
-                                        "type": "string",
-                                        "description": "Nome da empresa para buscar"
-                                    }
-                                },
-                                "required": ["company_name"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_historical_data",
-                            "description": "Obtém dados históricos de preços",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "symbol": {
-                                        "type": "string",
-                                        "description": "Símbolo da ação"
-                                    },
-                                    "period": {
-                                        "type": "string",
-                                        "description": "Período (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)"
-                                    }
-                                },
-                                "required": ["symbol", "period"]
-                            }
-                        }
-                    }
-                ],
+                tools=self.tools.payload,
                 model="gpt-3.5-turbo",  # Modelo disponível
                 temperature=0.3  # Mais conservador para análises financeiras
-            )
+            ))
             
-            print("✅ Assistente Finance Expert criado com sucesso!")
             return assistant
             
         except Exception as e:
@@ -161,33 +107,23 @@ class FinanceAssistant:
             raise
     
     def get_stock_price(self, symbol):
-        """Obtém preço atual de uma ação"""
+        """Obtém preço atual de uma ação (sem fundamentos)"""
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            hist = ticker.history(period="2d")
+            quote = self.finance_api.get_stock_info(symbol)
             
-            if hist.empty:
+            if 'error' in quote:
                 return f"❌ Não foi possível obter dados para {symbol}"
             
-            current_price = hist['Close'].iloc[-1]
-            previous_close = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
-            change = current_price - previous_close
-            change_percent = (change / previous_close) * 100 if previous_close != 0 else 0
-            
             result = {
-                "symbol": symbol,
-                "current_price": round(current_price, 2),
-                "change": round(change, 2),
-                "change_percent": round(change_percent, 2),
-                "volume": int(hist['Volume'].iloc[-1]) if 'Volume' in hist.columns else 0,
-                "company_name": info.get('longName', 'N/A'),
-                "market_cap": info.get('marketCap', 'N/A'),
-                "pe_ratio": info.get('trailingPE', 'N/A'),
-                "dividend_yield": info.get('dividendYield', 'N/A'),
-                "day_high": round(hist['High'].iloc[-1], 2),
-                "day_low": round(hist['Low'].iloc[-1], 2),
-                "currency": info.get('currency', 'BRL')
+                "symbol": quote['symbol'],
+                "company_name": quote['name'],
+                "current_price": round(quote['current_price'], 2),
+                "change": round(quote['change'], 2),
+                "change_percent": round(quote['change_percent'], 2),
+                "volume": quote['volume'],
+                "day_high": round(quote['day_high'], 2),
+                "day_low": round(quote['day_low'], 2),
+                "currency": quote['currency']
             }
             
             return json.dumps(result, ensure_ascii=False)
@@ -195,127 +131,83 @@ class FinanceAssistant:
         except Exception as e:
             return f"❌ Erro ao obter dados: {str(e)}"
     
+    def get_stock_fundamentals(self, symbol):
+        """Obtém P/L, valor de mercado e dividendos (cache longo)"""
+        fundamentals = self.finance_api.get_fundamentals(symbol)
+        if 'error' in fundamentals:
+            return f"❌ {fundamentals['error']}"
+        return json.dumps(fundamentals, ensure_ascii=False)
+    
     def get_market_summary(self):
-        """Obtém resumo do mercado"""
+        """Obtém resumo do mercado (índices baixados em lote pela FinanceAPI)"""
         try:
-            indices = {
-                "IBOVESPA": "^BVSP",      # Bovespa
-                "S&P 500": "^GSPC",       # S&P 500
-                "NASDAQ": "^IXIC",        # NASDAQ
-                "DOW JONES": "^DJI",      # Dow Jones
-                "IFIX": "IFIX.SA",        # Índice de FIIs
-                "DOLAR": "BRL=X"          # USD/BRL
+            summary = {
+                item['name']: {
+                    "price": round(item['price'], 2),
+                    "change": round(item['change'], 2),
+                    "change_percent": round(item['change_percent'], 2),
+                    "symbol": item['symbol']
+                }
+                for item in self.finance_api.get_market_summary()
             }
-            
-            summary = {}
-            for name, symbol in indices.items():
-                try:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period="2d")
-                    
-                    if not hist.empty:
-                        current = hist['Close'].iloc[-1]
-                        previous = hist['Close'].iloc[-2] if len(hist) > 1 else current
-                        change = current - previous
-                        change_percent = (change / previous) * 100 if previous != 0 else 0
-                        
-                        summary[name] = {
-                            "price": round(current, 2),
-                            "change": round(change, 2),
-                            "change_percent": round(change_percent, 2),
-                            "symbol": symbol
-                        }
-                except:
-                    continue
-            
             return json.dumps(summary, ensure_ascii=False)
             
         except Exception as e:
             return f"❌ Erro ao obter resumo: {str(e)}"
     
-    def search_stock(self, company_name):
+    def search_stock(self, query):
         """Busca ações por nome da empresa"""
         try:
-            # Lista expandida de principais ações brasileiras
-            br_stocks = {
-                "petrobras": "PETR4.SA",
-                "vale": "VALE3.SA",
-                "itau": "ITUB4.SA",
-                "bradesco": "BBDC4.SA",
-                "ambev": "ABEV3.SA",
-                "magazine luiza": "MGLU3.SA",
-                "banco do brasil": "BBAS3.SA",
-                "nubank": "NUBR33.SA",
-                "via": "VIIA3.SA",
-                "b3": "B3SA3.SA",
-                "weg": "WEGE3.SA",
-                "suzano": "SUZB3.SA",
-                "locaweb": "LWSA3.SA",
-                "santander": "SANB11.SA",
-                "engie": "EGIE3.SA",
-                "cosan": "CSAN3.SA",
-                "carrefour": "CRFB3.SA",
-                "jbs": "JBSS3.SA",
-                "embraer": "EMBR3.SA",
-                "localiza": "RENT3.SA"
-            }
-            
-            # Busca por nome (case insensitive)
-            company_lower = company_name.lower()
-            found_stocks = []
-            
-            for name, symbol in br_stocks.items():
-                if company_lower in name.lower() or name.lower() in company_lower:
-                    found_stocks.append({"symbol": symbol, "company": name})
+            found_stocks = [
+                {"symbol": symbol, "company": name}
+                for symbol, name, _, _ in get_symbol_index().search(query, limit=5)
+            ]
             
             if found_stocks:
                 return json.dumps(found_stocks, ensure_ascii=False)
             else:
-                return json.dumps({"error": "Empresa não encontrada na base de dados brasileira"})
+                return json.dumps({"error": "Empresa não encontrada na base de ativos"})
             
         except Exception as e:
             return f"❌ Erro na busca: {str(e)}"
     
-    def get_historical_data(self, symbol, period):
+    def get_historical_data(self, symbol, period='1mo'):
         """Obtém dados históricos"""
         try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period=period)
+            hist = self.history_store.history(symbol, period)
             
             if hist.empty:
                 return f"❌ Sem dados históricos para {symbol}"
             
-            # Estatísticas principais
-            start_price = hist['Close'].iloc[0]
-            end_price = hist['Close'].iloc[-1]
-            max_price = hist['High'].max()
-            min_price = hist['Low'].min()
-            avg_volume = hist['Volume'].mean() if 'Volume' in hist.columns else 0
+            # Estatísticas principais (vetorizadas)
+            closes = hist[['Close']].to_numpy(dtype=float)
+            metrics = analytics.metrics_by_symbol([symbol], analytics.compute_metrics(closes))[symbol]
+            volumes = hist['Volume'] if 'Volume' in hist.columns else None
             
-            total_return = ((end_price - start_price) / start_price) * 100
-            volatility = hist['Close'].pct_change().std() * 100
-            
-            # Últimos 5 dias de dados
-            recent_data = []
-            for i in range(min(5, len(hist))):
-                idx = -(i+1)
-                date = hist.index[idx].strftime('%Y-%m-%d')
-                recent_data.append({
-                    "date": date,
-                    "close": round(hist['Close'].iloc[idx], 2),
-                    "volume": int(hist['Volume'].iloc[idx]) if 'Volume' in hist.columns else 0
-                })
+            # Últimos 5 dias de dados, do mais recente ao mais antigo
+            recent = hist.iloc[::-1].head(5)
+            recent_data = [
+                {"date": date, "close": close, "volume": volume}
+                for date, close, volume in zip(
+                    recent.index.strftime('%Y-%m-%d'),
+                    recent['Close'].round(2).tolist(),
+                    recent['Volume'].fillna(0).astype('int64').tolist() if volumes is not None else [0] * len(recent)
+                )
+            ]
             
             result = {
                 "symbol": symbol,
                 "period": period,
-                "start_price": round(start_price, 2),
-                "end_price": round(end_price, 2),
-                "max_price": round(max_price, 2),
-                "min_price": round(min_price, 2),
-                "total_return": round(total_return, 2),
-                "volatility": round(volatility, 2),
-                "avg_volume": int(avg_volume),
+                "start_price": round(float(hist['Close'].iloc[0]), 2),
+                "end_price": metrics['last_price'],
+                "max_price": round(float(hist['High'].max()), 2),
+                "min_price": round(float(hist['Low'].min()), 2),
+                "total_return": metrics['total_return'],
+                "volatility": round(float(hist['Close'].pct_change().std() * 100), 2),
+                "annualized_volatility": metrics['annualized_volatility'],
+                "max_drawdown": metrics['max_drawdown'],
+                "rsi": metrics['rsi'],
+                "avg_volume": int(volumes.mean()) if volumes is not None else 0,
                 "data_points": len(hist),
                 "recent_data": recent_data
             }
@@ -325,22 +217,6 @@ class FinanceAssistant:
         except Exception as e:
             return f"❌ Erro ao obter histórico: {str(e)}"
     
-    def _handle_function_call(self, tool_call):
-        """Processa chamadas de função"""
-        function_name = tool_call.function.name
-        arguments = json.loads(tool_call.function.arguments)
-        
-        if function_name == "get_stock_price":
-            return self.get_stock_price(arguments["symbol"])
-        elif function_name == "get_market_summary":
-            return self.get_market_summary()
-        elif function_name == "search_stock":
-            return self.search_stock(arguments["company_name"])
-        elif function_name == "get_historical_data":
-            return self.get_historical_data(arguments["symbol"], arguments["period"])
-        else:
-            return "❌ Função não encontrada"
-    
     def chat(self, message):
         """Envia mensagem para o assistente"""
         try:
@@ -351,53 +227,14 @@ class FinanceAssistant:
                 content=message
             )
             
-            # Executa o assistente
-            run = self.client.beta.threads.runs.create(
-                thread_id=self.thread.id,
-                assistant_id=self.assistant.id
+            # Executa o assistente e aguarda a resposta (streaming/polling adaptativo)
+            return run_assistant(
+                self.client,
+                self.thread.id,
+                self.assistant.id,
+                self.tools
             )
             
-            # Aguarda conclusão
-            while run.status in ["queued", "in_progress"]:
-                time.sleep(1)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=self.thread.id,
-                    run_id=run.id
-                )
-            
-            # Verifica se precisa executar funções
-            if run.status == "requires_action":
-                tool_outputs = []
-                
-                for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                    output = self._handle_function_call(tool_call)
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": output
-                    })
-                
-                # Submete os resultados das funções
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=self.thread.id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs
-                )
-                
-                # Aguarda conclusão novamente
-                while run.status in ["queued", "in_progress"]:
-                    time.sleep(1)
-                    run = self.client.beta.threads.runs.retrieve(
-                        thread_id=self.thread.id,
-                        run_id=run.id
-                    )
-            
-            # Obtém a resposta
-            messages = self.client.beta.threads.messages.list(
-                thread_id=self.thread.id
-            )
-            
-            return messages.data[0].content[0].text.value
-            
         except Exception as e:
             return f"❌ Erro na conversa: {str(e)}"
     
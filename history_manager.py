@@ -0,0 +1,231 @@
+"""
+Compactação do histórico de conversas dentro de um orçamento de tokens
+
+Mantém o prompt de sistema, resume os turnos mais antigos em uma sinopse
+curta (extrativa, sem chamar o modelo) e encurta resultados de funções de
+turnos anteriores, para que cada requisição carregue só o contexto útil.
+"""
+
+import os
+import re
+import json
+import math
+import threading
+import time
+from collections import deque
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '3000'))
+FUNCTION_RESULT_MAX_CHARS = int(os.getenv('FUNCTION_RESULT_MAX_CHARS', '600'))
+SYNOPSIS_MAX_CHARS = 1200
+SYNOPSIS_PREFIX = "Resumo da conversa anterior:"
+
+# Tokens extras que a API cobra por mensagem (papel, separadores)
+_MESSAGE_OVERHEAD = 4
+
+
+def count_tokens(text):
+    """Conta tokens com tiktoken; sem ele, estima ~4 caracteres por token"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def message_tokens(message):
+    """Tokens de uma mensagem no formato da API de chat"""
+    total = _MESSAGE_OVERHEAD + count_tokens(message.get("content") or "")
+    if message.get("name"):
+        total += count_tokens(message["name"])
+    for call in message.get("tool_calls") or []:
+        total += count_tokens(call["function"]["name"]) + count_tokens(call["function"]["arguments"])
+    return total
+
+
+def history_tokens(history):
+    """Tokens estimados de todo o histórico"""
+    return sum(message_tokens(message) for message in history)
+
+
+def _is_table(value):
+    """Tabela do encoder compacto (tool_output): colunas + linhas"""
+    return isinstance(value, dict) and 'columns' in value and 'rows' in value
+
+
+def _head(value, count=3):
+    """Primeiros itens de uma lista ou linhas de uma tabela"""
+    if isinstance(value, list):
+        return value[:count]
+    if _is_table(value):
+        return dict(value, rows=value['rows'][:count])
+    return value
+
+
+def truncate_function_result(content, max_chars=FUNCTION_RESULT_MAX_CHARS):
+    """Encurta o JSON de um resultado de função que já foi usado pelo modelo"""
+    if not content or len(content) <= max_chars:
+        return content
+
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return content[:max_chars] + "…"
+
+    # Listas e tabelas longas (histórico, buscas) ficam só com os primeiros itens
+    if isinstance(data, dict) and not _is_table(data):
+        data = {key: _head(value) for key, value in data.items()}
+    else:
+        data = _head(data)
+
+    compact = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if len(compact) > max_chars:
+        compact = compact[:max_chars] + "…"
+    return compact
+
+
+def _clip(text, limit):
+    """Primeiros `limit` caracteres de um texto sem HTML, em uma linha"""
+    text = re.sub(r"<[^>]+>", " ", text or "")
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+class HistoryManager:
+    """Mantém o histórico abaixo de um orçamento de tokens"""
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET,
+                 max_function_chars=FUNCTION_RESULT_MAX_CHARS,
+                 synopsis_max_chars=SYNOPSIS_MAX_CHARS):
+        self.token_budget = token_budget
+        self.max_function_chars = max_function_chars
+        self.synopsis_max_chars = synopsis_max_chars
+
+    def compact(self, history):
+        """Compacta o histórico no próprio objeto; retorna quantas mensagens foram resumidas
+
+        Deve ser chamado antes de adicionar a nova mensagem do usuário, para
+        que apenas resultados de funções de turnos anteriores sejam encurtados.
+        """
+        system = history[:1] if history and history[0]["role"] == "system" else []
+        body = history[len(system):]
+
+        synopsis = []
+        if body and body[0]["role"] == "system" and body[0]["content"].startswith(SYNOPSIS_PREFIX):
+            synopsis = body[0]["content"][len(SYNOPSIS_PREFIX):].strip().split("\n")
+            body = body[1:]
+
+        body = [self._shrink(message) for message in body]
+
+        # Resume turnos inteiros (a partir de uma mensagem do usuário) até caber
+        folded = 0
+        while body and self._tokens(system, synopsis, body) > self.token_budget:
+            end = next(
+                (i for i, message in enumerate(body) if i > 0 and message["role"] == "user"),
+                len(body)
+            )
+            synopsis.extend(self._summarize(body[:end]))
+            folded += end
+            body = body[end:]
+
+        history[:] = system + self._synopsis_messages(synopsis) + body
+        return folded
+
+    def _shrink(self, message):
+        """Encurta resultados de funções de turnos anteriores"""
+        if message["role"] in ("function", "tool"):
+            content = truncate_function_result(message["content"], self.max_function_chars)
+            if content != message["content"]:
+                return dict(message, content=content)
+        return message
+
+    def _summarize(self, turn):
+        """Resume um turno em linhas curtas"""
+        lines = []
+        for message in turn:
+            if message["role"] == "user":
+                lines.append(f"- Usuário: {_clip(message['content'], 150)}")
+            elif message["role"] == "function":
+                lines.append(f"- Consulta: {message.get('name', 'ferramenta')}")
+            elif message["role"] == "assistant":
+                # Mensagens "tool" não têm nome; ele vem da chamada do assistente
+                for call in message.get("tool_calls") or []:
+                    lines.append(f"- Consulta: {call['function']['name']}")
+                if message.get("content"):
+                    lines.append(f"- Assistente: {_clip(message['content'], 200)}")
+        return lines
+
+    def _synopsis_messages(self, lines):
+        """Monta a mensagem de sinopse, mantendo as linhas mais recentes"""
+        if not lines:
+            return []
+
+        kept = []
+        size = 0
+        for line in reversed(lines):
+            size += len(line) + 1
+            if size > self.synopsis_max_chars:
+                break
+            kept.append(line)
+
+        content = SYNOPSIS_PREFIX + "\n" + "\n".join(reversed(kept))
+        return [{"role": "system", "content": content}]
+
+    def _tokens(self, system, synopsis, body):
+        return history_tokens(system + self._synopsis_messages(synopsis) + body)
+
+
+class TokenMetrics:
+    """Métricas de tokens por requisição"""
+
+    def __init__(self, recent=100):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self._totals = {
+            'requests': 0,
+            'estimated_prompt_tokens': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'compacted_messages': 0,
+            'model_calls': 0,
+            'tool_calls': 0
+        }
+
+    def record(self, session_id, estimated_prompt_tokens, prompt_tokens=0,
+               completion_tokens=0, compacted_messages=0, model_calls=1, tool_calls=0):
+        """Registra os tokens de uma requisição"""
+        entry = {
+            'session_id': session_id,
+            'timestamp': time.time(),
+            'estimated_prompt_tokens': estimated_prompt_tokens,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'compacted_messages': compacted_messages,
+            'model_calls': model_calls,
+            'tool_calls': tool_calls
+        }
+        with self._lock:
+            self._recent.append(entry)
+            self._totals['requests'] += 1
+            for key in ('estimated_prompt_tokens', 'prompt_tokens', 'completion_tokens',
+                        'compacted_messages', 'model_calls', 'tool_calls'):
+                self._totals[key] += entry[key]
+        return entry
+
+    def summary(self):
+        """Totais, médias e as últimas requisições"""
+        with self._lock:
+            totals = dict(self._totals)
+            recent = list(self._recent)[-10:]
+
+        requests = totals['requests']
+        totals['avg_prompt_tokens'] = round(totals['prompt_tokens'] / requests, 1) if requests else 0
+        # Idas ao modelo por pergunta respondida (menos é melhor)
+        totals['avg_model_calls'] = round(totals['model_calls'] / requests, 2) if requests else 0
+        totals['recent'] = recent
+        return totals
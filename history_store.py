@@ -0,0 +1,282 @@
+"""
+Armazenamento local de históricos diários (OHLCV) com atualização incremental
+
+Cada símbolo vira um arquivo .npy (matriz float64: data, open, high, low,
+close, volume) lido via memória mapeada. O histórico completo é baixado uma
+única vez; depois só os pregões que faltam no fim da série são buscados, e
+qualquer período (5d, 1mo, 5y, max...) é recortado localmente. Vários
+símbolos pedidos juntos (preload) saem num único download em lote.
+
+Os preços vêm ajustados por proventos e desdobramentos, e cada novo evento
+reajusta toda a série passada. Por isso a busca do fim da série inclui
+alguns pregões já salvos: se eles não batem com os armazenados, o histórico
+completo é baixado de novo em vez de misturar duas bases de ajuste.
+"""
+
+import os
+import re
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from market_data import get_provider, OHLCV_COLUMNS
+
+HISTORY_STORE_DIR = os.getenv('HISTORY_STORE_DIR', 'history_cache')
+# Intervalo mínimo (segundos) entre buscas do fim da série de um símbolo
+HISTORY_REFRESH_INTERVAL = float(os.getenv('HISTORY_REFRESH_INTERVAL', '300'))
+# Pregões já salvos rebaixados a cada atualização para conferir o ajuste
+HISTORY_OVERLAP_SESSIONS = int(os.getenv('HISTORY_OVERLAP_SESSIONS', '5'))
+
+_COLUMNS = ['Date'] + OHLCV_COLUMNS
+# Diferença relativa tolerada entre os preços salvos e os rebaixados
+_ADJUSTMENT_TOLERANCE = 1e-4
+_PRICE_COLUMNS = slice(1, 5)  # open, high, low, close
+
+_TAIL_PERIODS = [('5d', 5), ('1mo', 21), ('3mo', 63), ('6mo', 126), ('1y', 252),
+                 ('2y', 504), ('5y', 1260), ('10y', 2520)]
+
+
+def _to_matrix(frame):
+    """Converte um DataFrame do provedor na matriz armazenada (datas em epoch)"""
+    frame = frame.dropna(subset=['Close'])
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    dates = index.normalize().as_unit('s').asi8
+
+    matrix = np.empty((len(frame), len(_COLUMNS)), dtype=np.float64)
+    matrix[:, 0] = dates
+    for column, name in enumerate(OHLCV_COLUMNS, start=1):
+        matrix[:, column] = frame[name].to_numpy(dtype=np.float64, na_value=np.nan)
+    return matrix
+
+
+def _to_frame(matrix):
+    """Converte um trecho da matriz de volta em DataFrame"""
+    index = pd.to_datetime(matrix[:, 0].astype(np.int64), unit='s')
+    index.name = 'Date'
+    return pd.DataFrame(matrix[:, 1:], index=index, columns=OHLCV_COLUMNS)
+
+
+def _period_start(dates, period):
+    """Primeira data incluída no período, contando a partir do último pregão salvo"""
+    if period == 'max':
+        return None
+    last_date = pd.Timestamp(int(dates[-1]), unit='s')
+    if period == 'ytd':
+        return last_date.replace(month=1, day=1)
+
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period or '')
+    if not match:
+        raise ValueError(f"Período inválido: {period}")
+
+    amount, unit = int(match.group(1)), match.group(2)
+    if unit == 'd':
+        # Pregões de fato salvos (fim de semana, feriado ou cripto 24x7)
+        return pd.Timestamp(int(dates[max(0, len(dates) - amount)]), unit='s')
+    if unit == 'wk':
+        return last_date - pd.DateOffset(weeks=amount)
+    if unit == 'mo':
+        return last_date - pd.DateOffset(months=amount)
+    return last_date - pd.DateOffset(years=amount)
+
+
+def _tail_period(missing):
+    """Menor período aceito pelo yfinance que cobre `missing` pregões"""
+    for period, sessions in _TAIL_PERIODS:
+        if missing <= sessions:
+            return period
+    return 'max'
+
+
+class HistoryStore:
+    """Históricos diários em disco, servidos por fatias de período"""
+
+    def __init__(self, directory=HISTORY_STORE_DIR, provider=None,
+                 refresh_interval=HISTORY_REFRESH_INTERVAL):
+        self.directory = directory
+        self.provider = provider or get_provider()
+        self.refresh_interval = refresh_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._symbol_locks = {}
+        self._arrays = {}     # símbolo -> matriz mapeada em memória
+        self._checked = {}    # símbolo -> instante da última busca (monotonic)
+        self._stats = {'full_downloads': 0, 'tail_refreshes': 0, 'adjustment_reloads': 0,
+                       'refresh_errors': 0, 'reads': 0}
+
+    def _count(self, name):
+        """Incrementa uma métrica (atualizações também rodam na thread do pré-carregamento)"""
+        with self._lock:
+            self._stats[name] += 1
+
+    def _path(self, symbol):
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9.-]', '-', symbol) + '.npy')
+
+    def _symbol_lock(self, symbol):
+        with self._lock:
+            return self._symbol_locks.setdefault(symbol, threading.Lock())
+
+    def _load(self, symbol):
+        """Matriz do símbolo (mapeada em memória) ou None"""
+        array = self._arrays.get(symbol)
+        if array is None and os.path.exists(self._path(symbol)):
+            array = self._arrays[symbol] = np.load(self._path(symbol), mmap_mode='r')
+        return array
+
+    def _write(self, symbol, matrix):
+        """Grava a matriz de forma atômica e reabre o mapeamento"""
+        path = self._path(symbol)
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, path)
+        self._arrays[symbol] = np.load(path, mmap_mode='r')
+
+    def _download_full(self, symbol):
+        self._store_full(symbol, _to_matrix(self.provider.history(symbol, 'max')))
+
+    def _store_full(self, symbol, matrix):
+        self._count('full_downloads')
+        if len(matrix):
+            self._write(symbol, matrix)
+
+    def _missing_sessions(self, array):
+        """Pregões desde o último salvo (inclusive), mais a sobreposição conferida"""
+        last_date = pd.Timestamp(int(array[-1, 0]), unit='s')
+        return len(pd.bdate_range(last_date, pd.Timestamp.today().normalize())) + HISTORY_OVERLAP_SESSIONS
+
+    def _refresh(self, symbol, array):
+        """Baixa o histórico completo ou apenas os pregões que faltam no fim"""
+        if array is None or not len(array):
+            self._download_full(symbol)
+            return
+        tail = self.provider.history(symbol, _tail_period(self._missing_sessions(array)))
+        self._merge_tail(symbol, array, _to_matrix(tail))
+
+    def _merge_tail(self, symbol, array, tail):
+        """Junta o fim da série baixado ao histórico salvo"""
+        self._count('tail_refreshes')
+        if not len(tail):
+            return
+
+        if not self._same_adjustment(array, tail):
+            # Provento ou desdobramento desde o último download: a série toda mudou
+            self._count('adjustment_reloads')
+            self._download_full(symbol)
+            return
+
+        # O último pregão salvo pode ter sido parcial: os dados novos o substituem
+        keep = array[array[:, 0] < tail[0, 0]]
+        if len(keep) + len(tail) == len(array) and np.array_equal(array[len(keep):], tail, equal_nan=True):
+            return
+        self._write(symbol, np.concatenate([keep, tail]))
+
+    def _same_adjustment(self, array, tail):
+        """Confere os pregões fechados presentes nos dois lados (o último salvo pode ser parcial)"""
+        closed = array[:-1]
+        dates = np.intersect1d(closed[:, 0], tail[:, 0])
+        if not len(dates):
+            return True
+
+        stored = closed[np.searchsorted(closed[:, 0], dates), _PRICE_COLUMNS]
+        fresh = tail[np.searchsorted(tail[:, 0], dates), _PRICE_COLUMNS]
+        return np.allclose(stored, fresh, rtol=_ADJUSTMENT_TOLERANCE, atol=0, equal_nan=True)
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        """Histórico do símbolo no período, no mesmo formato do provedor"""
+        if interval != '1d':
+            # Intradiário não é armazenado
+            return self.provider.history(symbol, period, interval)
+
+        symbol = symbol.upper()
+        with self._symbol_lock(symbol):
+            array = self._load(symbol)
+            checked = self._checked.get(symbol)
+            if checked is None or time.monotonic() - checked > self.refresh_interval:
+                try:
+                    self._refresh(symbol, array)
+                    self._checked[symbol] = time.monotonic()
+                except Exception:
+                    if array is None:
+                        raise
+                    # Sem conexão: serve o que já está em disco
+                    self._count('refresh_errors')
+                array = self._load(symbol)
+            self._count('reads')
+
+        if array is None or not len(array):
+            return _to_frame(np.empty((0, len(_COLUMNS))))
+
+        start = _period_start(array[:, 0], period)
+        if start is not None:
+            first = np.searchsorted(array[:, 0], pd.Timestamp(start).timestamp())
+            array = array[first:]
+        return _to_frame(np.asarray(array))
+
+    def preload(self, symbols):
+        """Atualiza vários símbolos com um download em lote em vez de um por símbolo
+
+        Os que ainda não estão em disco vêm juntos no histórico completo; os
+        vencidos, juntos no fim da série. Quem falhar aqui é buscado de novo,
+        sozinho, pelo history().
+        """
+        now = time.monotonic()
+        stale = [
+            symbol for symbol in dict.fromkeys(symbol.upper() for symbol in symbols)
+            if self._checked.get(symbol) is None or now - self._checked[symbol] > self.refresh_interval
+        ]
+        stored = {}
+        for symbol in stale:
+            with self._symbol_lock(symbol):
+                array = self._load(symbol)
+            if array is not None and len(array):
+                stored[symbol] = array
+
+        new = [symbol for symbol in stale if symbol not in stored]
+        if new:
+            self._preload(new, 'max')
+        if stored:
+            missing = max(self._missing_sessions(array) for array in stored.values())
+            self._preload(list(stored), _tail_period(missing))
+
+    def _preload(self, symbols, period):
+        try:
+            frames = self.provider.download(symbols, period=period)
+        except Exception:
+            self._count('refresh_errors')
+            return
+
+        for symbol in symbols:
+            frame = frames.get(symbol)
+            if frame is None or frame.empty:
+                continue
+            with self._symbol_lock(symbol):
+                array = self._load(symbol)
+                if array is None or not len(array):
+                    self._store_full(symbol, _to_matrix(frame))
+                else:
+                    self._merge_tail(symbol, array, _to_matrix(frame))
+                self._checked[symbol] = time.monotonic()
+
+    def stats(self):
+        """Métricas do armazenamento"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['symbols'] = len(self._arrays)
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Armazenamento compartilhado pelo processo"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
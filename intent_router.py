@@ -0,0 +1,221 @@
+"""
+Roteador de intenções para perguntas simples
+
+"preço da PETR4", "quanto está o bitcoin?" ou "como está o mercado hoje?"
+não precisam do modelo: uma gramática pequena em português reconhece a
+intenção (cotação, variação do dia ou resumo do mercado), o índice de ativos
+resolve o símbolo e a resposta sai de um modelo de texto preenchido com os
+dados da FinanceAPI. Qualquer palavra fora da gramática (ex.: "histórico",
+"dividendos", "vale a pena") manda a pergunta para o modelo.
+
+As respostas usam o mesmo HTML simples pedido ao modelo (<b>, <br>), já que
+as páginas exibem o texto com innerHTML e a voz remove as marcações.
+"""
+
+import os
+import re
+import html
+import time
+import threading
+
+from symbol_index import normalize, get_symbol_index
+
+INTENT_ROUTER_ENABLED = os.getenv('INTENT_ROUTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Perguntas mais longas que isso sempre vão para o modelo
+INTENT_MAX_WORDS = int(os.getenv('INTENT_MAX_WORDS', '12'))
+
+# Expressões trocadas antes da análise ("quanto vale" não é a ação VALE)
+_PHRASES = [
+    ('quanto vale', 'preco'),
+    ('quanto ta', 'preco'),
+    ('quanto esta', 'preco'),
+    ('quanto estao', 'preco'),
+    ('resumo do mercado', 'mercado'),
+]
+
+_INTENT_WORDS = {
+    'preco': 'price', 'precos': 'price', 'cotacao': 'price', 'cotacoes': 'price',
+    'custa': 'price', 'custando': 'price', 'valendo': 'price',
+    'variacao': 'change', 'variou': 'change', 'subiu': 'change', 'caiu': 'change',
+    'subindo': 'change', 'caindo': 'change', 'oscilacao': 'change',
+    'mercado': 'summary', 'mercados': 'summary', 'bolsa': 'summary', 'bolsas': 'summary',
+    'indices': 'summary', 'resumo': 'summary',
+}
+
+# Palavras que não mudam a intenção
+_FILLER_WORDS = {
+    'a', 'o', 'as', 'os', 'e', 'de', 'do', 'da', 'dos', 'das', 'no', 'na', 'nos', 'nas', 'em',
+    'qual', 'quais', 'como', 'quanto', 'esta', 'estao', 'ta', 'hoje', 'hj', 'agora', 'atual',
+    'atualmente', 'momento', 'neste', 'nesse', 'dia', 'me', 'mostra', 'mostre', 'diga', 'diz',
+    'ver', 'por', 'favor', 'pra', 'para', 'oi', 'ola', 'ai', 'um', 'uma', 'acao', 'acoes', 'papel',
+    'cripto', 'criptomoeda', 'indice', 'cotado', 'cotada', 'sobre', 'ultimo', 'ultima',
+}
+
+_B3_TICKER = re.compile(r'^[a-z]{4}\d{1,2}$')
+
+# Um nome só é aceito se casar por inteiro com o nome ou apelido do ativo
+# (score 1.2 no SymbolIndex) e ficar à frente do segundo colocado
+_NAME_MIN_SCORE = 1.2
+_NAME_MARGIN = 0.1
+
+
+def _number(value, decimals=2):
+    """1234.5 -> 1.234,50"""
+    return f"{value:,.{decimals}f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _money(value, currency):
+    """Valor com o símbolo da moeda"""
+    prefix = {'BRL': 'R$', 'USD': 'US$'}.get(currency, currency or '')
+    return f"{prefix} {_number(value)}".strip()
+
+
+def _price(quote):
+    """Índices em pontos, o resto na moeda do ativo"""
+    if quote['symbol'].startswith('^'):
+        return f"{_number(quote['current_price'], 0)} pontos"
+    return _money(quote['current_price'], quote.get('currency'))
+
+
+def _percent(value):
+    """+1,23% / -0,45%"""
+    return f"{'+' if value > 0 else ''}{_number(value)}%"
+
+
+def _bold(text):
+    return f"<b>{html.escape(text)}</b>"
+
+
+def _arrow(change):
+    return '📈' if change > 0 else '📉' if change < 0 else '➖'
+
+
+class IntentRouter:
+    """Responde localmente a cotações, variações e resumo do mercado"""
+
+    def __init__(self, finance_api, enabled=INTENT_ROUTER_ENABLED, max_words=INTENT_MAX_WORDS):
+        self.finance_api = finance_api
+        self.enabled = enabled
+        self.max_words = max_words
+        self._lock = threading.Lock()
+        self._stats = {'price': 0, 'change': 0, 'summary': 0, 'escalated': 0, 'routed_seconds': 0.0}
+
+    def parse(self, message):
+        """Retorna (intenção, [símbolos]) ou None se a pergunta não é simples"""
+        text = f" {normalize(message)} "
+        for phrase, replacement in _PHRASES:
+            text = text.replace(f" {phrase} ", f" {replacement} ")
+
+        words = text.split()
+        if not words or len(words) > self.max_words:
+            return None
+
+        intents = {_INTENT_WORDS[word] for word in words if word in _INTENT_WORDS}
+        rest = [word for word in words if word not in _INTENT_WORDS and word not in _FILLER_WORDS]
+
+        if not rest:
+            # "como está o mercado?" (sem ativo só faz sentido o resumo)
+            return ('summary', []) if intents == {'summary'} else None
+
+        intents.discard('summary')  # "petr4 na bolsa" ainda é cotação
+        if len(intents) > 1:
+            return None
+
+        symbols = self._resolve(rest)
+        if not symbols:
+            return None
+        return (intents.pop() if intents else 'price'), symbols
+
+    def _resolve(self, words):
+        """Símbolos citados: todos os termos como tickers, ou um único nome de ativo"""
+        index = get_symbol_index()
+
+        symbols = []
+        for word in words:
+            results = index.search(word, limit=1)
+            if results and results[0][3] >= 10:
+                symbols.append(results[0][0])
+            elif _B3_TICKER.match(word):
+                symbols.append(f"{word.upper()}.SA")  # Ticker da B3 fora da lista mestre
+            else:
+                symbols = None
+                break
+        if symbols:
+            return list(dict.fromkeys(symbols))
+
+        # Um nome só ("banco brasil", "petrobras"), sem ambiguidade
+        results = index.search(' '.join(words), limit=2)
+        if not results or results[0][3] < _NAME_MIN_SCORE:
+            return []
+        if len(results) > 1 and results[1][3] >= results[0][3] - _NAME_MARGIN:
+            return []
+        return [results[0][0]]
+
+    def route(self, message):
+        """Resposta pronta para a mensagem, ou None para seguir ao modelo"""
+        if not self.enabled:
+            return None
+
+        started = time.perf_counter()
+        parsed = self.parse(message)
+        answer = self._answer(*parsed) if parsed else None
+
+        with self._lock:
+            if answer is None:
+                self._stats['escalated'] += 1
+            else:
+                self._stats[parsed[0]] += 1
+                self._stats['routed_seconds'] += time.perf_counter() - started
+        return answer
+
+    def _answer(self, intent, symbols):
+        """Monta o texto da resposta; None se faltar algum dado"""
+        if intent == 'summary':
+            summary = self.finance_api.get_market_summary()
+            if not summary:
+                return None
+            lines = [f"📊 {_bold('Resumo do mercado')}"]
+            for item in summary:
+                quote = {'symbol': item['symbol'], 'current_price': item['price']}
+                lines.append(
+                    f"{_arrow(item['change'])} {html.escape(item['name'])}: {_price(quote)} "
+                    f"({_percent(item['change_percent'])})"
+                )
+            return '<br>'.join(lines)
+
+        quotes = self.finance_api.get_quotes(symbols)
+        if any('error' in quote for quote in quotes.values()):
+            return None  # O modelo explica o erro melhor que um modelo de texto
+
+        lines = []
+        for quote in quotes.values():
+            label = f"{_bold(quote['name'])} ({quote['symbol']})"
+            if intent == 'change':
+                if quote['change'] == 0:
+                    movement = 'está estável hoje'
+                else:
+                    direction = 'sobe' if quote['change'] > 0 else 'cai'
+                    movement = f"{direction} {_number(abs(quote['change_percent']))}% hoje"
+                lines.append(
+                    f"{_arrow(quote['change'])} {label} {movement}, "
+                    f"cotado a {_price(quote)} (fechamento anterior: {_price({**quote, 'current_price': quote['previous_close']})})."
+                )
+            else:
+                lines.append(
+                    f"💰 {label}: {_price(quote)} ({_percent(quote['change_percent'])} no dia) · "
+                    f"máxima {_price({**quote, 'current_price': quote['day_high']})}, "
+                    f"mínima {_price({**quote, 'current_price': quote['day_low']})}"
+                )
+        return '<br>'.join(lines)
+
+    def stats(self):
+        """Perguntas respondidas localmente por intenção e latência média"""
+        with self._lock:
+            stats = dict(self._stats)
+        routed_seconds = stats.pop('routed_seconds')
+        routed = stats['price'] + stats['change'] + stats['summary']
+        total = routed + stats['escalated']
+        stats['enabled'] = self.enabled
+        stats['routed_rate'] = round(routed / total, 4) if total else 0.0
+        stats['avg_routed_ms'] = round(routed_seconds / routed * 1000, 2) if routed else None
+        return stats
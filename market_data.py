@@ -0,0 +1,327 @@
+"""
+Camada única de acesso a dados de mercado
+
+Todos os módulos buscam cotações, fundamentos e históricos por aqui, em vez
+de chamar o yfinance diretamente. O provedor é escolhido em
+MARKET_DATA_PROVIDER:
+
+- yfinance: dados reais do Yahoo Finance (padrão)
+- record: igual ao yfinance, mas grava cada resposta em MARKET_DATA_DIR
+- replay: lê apenas o que foi gravado (offline, sem acesso ao Yahoo)
+- synthetic: séries determinísticas geradas localmente, para testes de carga
+
+Todos expõem a mesma interface: info(symbol), history(symbol, period,
+interval) e download(symbols, period, interval).
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'yfinance')
+MARKET_DATA_DIR = os.getenv('MARKET_DATA_DIR', 'market_recordings')
+# Latência artificial (segundos) do provedor sintético
+MARKET_DATA_LATENCY = float(os.getenv('MARKET_DATA_LATENCY', '0'))
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Pregões aproximados por unidade de período
+_PERIOD_UNITS = {'d': 1, 'wk': 5, 'mo': 21, 'y': 252}
+_MAX_SESSIONS = 252 * 10
+
+
+class MarketDataError(Exception):
+    """Dado indisponível no provedor"""
+
+
+def period_to_sessions(period):
+    """Converte um período do yfinance (5d, 1mo, 1y, ytd, max) em número de pregões"""
+    if period == 'max':
+        return _MAX_SESSIONS
+    if period == 'ytd':
+        today = pd.Timestamp.today().normalize()
+        return max(1, len(pd.bdate_range(today.replace(month=1, day=1), today)))
+
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period or '')
+    if not match:
+        raise ValueError(f"Período inválido: {period}")
+    return int(match.group(1)) * _PERIOD_UNITS[match.group(2)]
+
+
+def _empty_frame():
+    return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+
+
+class YFinanceProvider:
+    """Dados reais via yfinance"""
+
+    name = 'yfinance'
+
+    def __init__(self):
+        import yfinance as yf
+        self._yf = yf
+
+    def info(self, symbol):
+        return self._yf.Ticker(symbol).info
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        return self._yf.Ticker(symbol).history(period=period, interval=interval)
+
+    def download(self, symbols, period='5d', interval='1d'):
+        """Baixa vários símbolos em uma só chamada; retorna {símbolo: DataFrame}"""
+        data = self._yf.download(
+            list(symbols),
+            period=period,
+            interval=interval,
+            group_by='ticker',
+            auto_adjust=False,
+            progress=False,
+            threads=True
+        )
+
+        frames = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                frame = data[symbol] if symbol in data.columns.get_level_values(0) else _empty_frame()
+            else:
+                frame = data
+            frames[symbol] = frame.dropna(subset=['Close'])
+        return frames
+
+
+class RecordingProvider:
+    """Repassa as chamadas a outro provedor e grava as respostas em disco"""
+
+    name = 'record'
+
+    def __init__(self, inner, directory=MARKET_DATA_DIR):
+        self.inner = inner
+        self.store = _DiskStore(directory)
+
+    def info(self, symbol):
+        info = self.inner.info(symbol)
+        self.store.save_info(symbol, info)
+        return info
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        frame = self.inner.history(symbol, period, interval)
+        self.store.save_frame(symbol, period, interval, frame)
+        return frame
+
+    def download(self, symbols, period='5d', interval='1d'):
+        frames = self.inner.download(symbols, period, interval)
+        for symbol, frame in frames.items():
+            self.store.save_frame(symbol, period, interval, frame)
+        return frames
+
+
+class ReplayProvider:
+    """Serve apenas respostas gravadas pelo RecordingProvider"""
+
+    name = 'replay'
+
+    def __init__(self, directory=MARKET_DATA_DIR):
+        self.store = _DiskStore(directory)
+
+    def info(self, symbol):
+        return self.store.load_info(symbol)
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        return self.store.load_frame(symbol, period, interval)
+
+    def download(self, symbols, period='5d', interval='1d'):
+        frames = {}
+        for symbol in symbols:
+            try:
+                frames[symbol] = self.store.load_frame(symbol, period, interval)
+            except MarketDataError:
+                frames[symbol] = _empty_frame()
+        return frames
+
+
+class SyntheticProvider:
+    """Séries de preços determinísticas (passeio aleatório por símbolo)"""
+
+    name = 'synthetic'
+
+    def __init__(self, latency=MARKET_DATA_LATENCY, seed=0):
+        self.latency = latency
+        self.seed = seed
+
+    def _series(self, symbol, sessions):
+        """Últimos `sessions` pregões até hoje, sempre iguais para o mesmo símbolo"""
+        frame = _synthetic_series(symbol, self.seed, pd.Timestamp.today().normalize())
+        return frame.tail(min(sessions, len(frame)))
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def info(self, symbol):
+        self._wait()
+        frame = self._series(symbol, 260)
+        last, previous = frame.iloc[-1], frame.iloc[-2]
+        return {
+            'symbol': symbol,
+            'longName': f"{symbol} (sintético)",
+            'currency': 'BRL' if symbol.endswith('.SA') else 'USD',
+            'currentPrice': float(last['Close']),
+            'regularMarketPrice': float(last['Close']),
+            'previousClose': float(previous['Close']),
+            'dayHigh': float(last['High']),
+            'dayLow': float(last['Low']),
+            'volume': int(last['Volume']),
+            'marketCap': float(last['Close']) * 1e9,
+            'trailingPE': 12.5,
+            'dividendYield': 0.035,
+            'fiftyTwoWeekHigh': float(frame['High'].max()),
+            'fiftyTwoWeekLow': float(frame['Low'].min())
+        }
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        self._wait()
+        return self._series(symbol, period_to_sessions(period))
+
+    def download(self, symbols, period='5d', interval='1d'):
+        self._wait()
+        sessions = period_to_sessions(period)
+        return {symbol: self._series(symbol, sessions) for symbol in symbols}
+
+
+@lru_cache(maxsize=1024)
+def _synthetic_series(symbol, seed, end):
+    """Gera a série completa de um símbolo (memorizada por dia)"""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()) + seed)
+    start_price = rng.uniform(5, 500)
+    total = _MAX_SESSIONS
+    returns = rng.normal(0.0003, 0.018, total)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = close * (1 + rng.normal(0, 0.004, total))
+    spread = np.abs(rng.normal(0, 0.01, total))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.integers(100_000, 50_000_000, total)
+
+    return pd.DataFrame(
+        {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+        index=_business_days(end, total)
+    )
+
+
+@lru_cache(maxsize=8)
+def _business_days(end, periods):
+    """Índice de pregões terminando em `end` (bdate_range é lento; calculado uma vez por dia)"""
+    return pd.bdate_range(end=end, periods=periods, name='Date')
+
+
+class _DiskStore:
+    """Arquivos de gravação: info em JSON, séries em CSV"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, *parts, ext):
+        name = "_".join(re.sub(r'[^A-Za-z0-9.-]', '-', part) for part in parts)
+        return os.path.join(self.directory, f"{name}.{ext}")
+
+    def save_info(self, symbol, info):
+        with open(self._path('info', symbol, ext='json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, default=str)
+
+    def load_info(self, symbol):
+        try:
+            with open(self._path('info', symbol, ext='json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise MarketDataError(f"Sem dados gravados para {symbol}")
+
+    def save_frame(self, symbol, period, interval, frame):
+        frame.to_csv(self._path('history', symbol, period, interval, ext='csv'))
+
+    def load_frame(self, symbol, period, interval):
+        path = self._path('history', symbol, period, interval, ext='csv')
+        try:
+            frame = pd.read_csv(path, index_col=0)
+        except FileNotFoundError:
+            raise MarketDataError(f"Sem histórico gravado para {symbol} ({period}, {interval})")
+        frame.index = pd.to_datetime(frame.index, utc=True)
+        frame.index.name = 'Date'
+        return frame
+
+
+class MeteredProvider:
+    """Envolve um provedor contando chamadas, erros e latência por operação"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _call(self, operation, *args):
+        started = time.perf_counter()
+        error = False
+        try:
+            return getattr(self.inner, operation)(*args)
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                stats = self._stats.setdefault(operation, {'calls': 0, 'errors': 0, 'total_ms': 0.0})
+                stats['calls'] += 1
+                stats['errors'] += error
+                stats['total_ms'] += elapsed * 1000
+
+    def info(self, symbol):
+        return self._call('info', symbol)
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        return self._call('history', symbol, period, interval)
+
+    def download(self, symbols, period='5d', interval='1d'):
+        return self._call('download', symbols, period, interval)
+
+    def stats(self):
+        """Chamadas, erros e latência média por operação"""
+        with self._lock:
+            operations = {
+                operation: dict(stats, avg_ms=round(stats['total_ms'] / stats['calls'], 2))
+                for operation, stats in self._stats.items()
+            }
+        return {'provider': self.name, 'operations': operations}
+
+
+def create_provider(name=MARKET_DATA_PROVIDER):
+    """Cria o provedor configurado (sem métricas)"""
+    if name == 'yfinance':
+        return YFinanceProvider()
+    if name == 'record':
+        return RecordingProvider(YFinanceProvider())
+    if name == 'replay':
+        return ReplayProvider()
+    if name == 'synthetic':
+        return SyntheticProvider()
+    raise ValueError(f"Provedor de dados inválido: {name} (use yfinance, record, replay ou synthetic)")
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Provedor compartilhado pelo processo, com métricas"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = MeteredProvider(create_provider())
+        return _provider
@@ -0,0 +1,195 @@
+"""
+Pré-carregamento de cotações em segundo plano
+
+Os símbolos "quentes" (índices do resumo de mercado, ações em alta e os mais
+pedidos pelos usuários, aprendidos com o tráfego) são atualizados no cache
+um pouco antes de vencerem, apenas enquanto a bolsa de cada um está aberta.
+Assim as consultas feitas durante a conversa viram acertos de cache.
+"""
+
+import os
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta, time as clock
+from zoneinfo import ZoneInfo
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Intervalo (segundos) entre verificações do agendador
+PREFETCH_TICK = float(os.getenv('PREFETCH_TICK', '5'))
+# Quantos símbolos mais pedidos entram no pré-carregamento
+PREFETCH_HOT_SYMBOLS = int(os.getenv('PREFETCH_HOT_SYMBOLS', '20'))
+# Fração do TTL após a qual a cotação é renovada
+PREFETCH_LEAD = float(os.getenv('PREFETCH_LEAD', '0.8'))
+# Minutos após o fechamento em que ainda buscamos (captura o preço de fechamento)
+MARKET_CLOSE_MARGIN = int(os.getenv('MARKET_CLOSE_MARGIN', '15'))
+# Meia-vida (segundos) da contagem de pedidos por símbolo
+TRAFFIC_HALF_LIFE = float(os.getenv('TRAFFIC_HALF_LIFE', '3600'))
+
+# Pregão regular (fuso, abertura, fechamento); feriados não são considerados
+MARKET_HOURS = {
+    'B3': (ZoneInfo('America/Sao_Paulo'), clock(10, 0), clock(17, 55)),
+    'US': (ZoneInfo('America/New_York'), clock(9, 30), clock(16, 0))
+}
+
+
+def market_of(symbol):
+    """Bolsa em que o símbolo é negociado: B3, US ou CRYPTO"""
+    if symbol.endswith('-USD'):
+        return 'CRYPTO'
+    if symbol.endswith('.SA') or symbol == '^BVSP':
+        return 'B3'
+    return 'US'
+
+
+def is_market_open(market, now=None, margin=MARKET_CLOSE_MARGIN):
+    """Indica se o pregão está aberto (com `margin` minutos após o fechamento)"""
+    if market not in MARKET_HOURS:
+        return True  # Cripto negocia 24x7
+
+    zone, opens, closes = MARKET_HOURS[market]
+    local = (now or datetime.now(zone)).astimezone(zone)
+    if local.weekday() >= 5:
+        return False
+
+    minutes = local.hour * 60 + local.minute
+    return opens.hour * 60 + opens.minute <= minutes <= closes.hour * 60 + closes.minute + margin
+
+
+def seconds_until_open(market, now=None):
+    """Segundos até a próxima abertura do pregão (None para cripto)"""
+    if market not in MARKET_HOURS:
+        return None
+
+    zone, opens, _ = MARKET_HOURS[market]
+    local = (now or datetime.now(zone)).astimezone(zone)
+    opening = local.replace(hour=opens.hour, minute=opens.minute, second=0, microsecond=0)
+    if opening <= local:
+        opening += timedelta(days=1)
+    while opening.weekday() >= 5:
+        opening += timedelta(days=1)
+    return (opening - local).total_seconds()
+
+
+class SymbolTraffic:
+    """Contagem de pedidos por símbolo com decaimento exponencial"""
+
+    def __init__(self, half_life=TRAFFIC_HALF_LIFE, max_symbols=1000):
+        self.half_life = half_life
+        self.max_symbols = max_symbols
+        self._scores = {}  # (tipo, símbolo) -> (pontuação, atualizada_em)
+        self._lock = threading.Lock()
+
+    def _decayed(self, score, updated_at, now):
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def record(self, kind, symbols):
+        """Registra pedidos de `kind` (ex.: 'quote') para os símbolos"""
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                key = (kind, symbol)
+                score, updated_at = self._scores.get(key, (0.0, now))
+                self._scores[key] = (self._decayed(score, updated_at, now) + 1, now)
+
+            if len(self._scores) > self.max_symbols:
+                # Descarta os menos pedidos
+                keep = heapq.nlargest(
+                    self.max_symbols // 2,
+                    self._scores.items(),
+                    key=lambda item: self._decayed(*item[1], now)
+                )
+                self._scores = dict(keep)
+
+    def top(self, limit):
+        """As `limit` chaves (tipo, símbolo) mais pedidas recentemente"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._scores.items())
+        best = heapq.nlargest(limit, items, key=lambda item: self._decayed(*item[1], now))
+        return [key for key, _ in best]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._scores)
+
+
+# Tráfego compartilhado por todas as instâncias de FinanceAPI
+symbol_traffic = SymbolTraffic()
+
+
+class Prefetcher:
+    """Mantém as cotações dos símbolos quentes sempre frescas no cache"""
+
+    def __init__(self, finance_api, traffic=None, tick=PREFETCH_TICK,
+                 hot_limit=PREFETCH_HOT_SYMBOLS, lead=PREFETCH_LEAD, enabled=PREFETCH_ENABLED):
+        self.finance_api = finance_api
+        self.traffic = traffic if traffic is not None else symbol_traffic
+        self.tick = tick
+        self.hot_limit = hot_limit
+        self.lead = lead
+        self.enabled = enabled
+
+        self._due = {}  # (tipo, símbolo) -> instante da próxima atualização (monotonic)
+        self._start_lock = threading.Lock()
+        self._worker = None
+        self._stats = {'runs': 0, 'quotes': 0, 'errors': 0, 'idle_runs': 0}
+
+    def targets(self):
+        """Chaves (tipo, símbolo) a manter no cache, sem repetição"""
+        keys = [('quote', symbol) for symbol in self.finance_api.market_indices]
+
+        screener = self.finance_api.screener
+        if screener.ready:
+            keys += [('quote', item['symbol']) for item in screener.rank('change', limit=5)]
+
+        keys += [key for key in self.traffic.top(self.hot_limit) if key[0] == 'quote']
+        return list(dict.fromkeys(keys))
+
+    def run_once(self):
+        """Atualiza as chaves que estão para vencer em bolsas abertas"""
+        now = time.monotonic()
+        open_markets = {market: is_market_open(market) for market in ('B3', 'US', 'CRYPTO')}
+        due = [
+            (kind, symbol) for kind, symbol in self.targets()
+            if open_markets[market_of(symbol)] and self._due.get((kind, symbol), 0) <= now
+        ]
+
+        self._stats['runs'] += 1
+        if not due:
+            self._stats['idle_runs'] += 1
+            return 0
+
+        self._stats['quotes'] += self.finance_api.refresh_quotes([symbol for _, symbol in due])
+
+        # Erros também esperam o próximo ciclo, para não martelar o provedor
+        for kind, symbol in due:
+            self._due[(kind, symbol)] = now + self.finance_api.get_quote_ttl(symbol) * self.lead
+        return len(due)
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"⚠️ Falha no pré-carregamento de cotações: {e}")
+            time.sleep(self.tick)
+
+    def start(self):
+        """Inicia o agendador em segundo plano (idempotente)"""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, name='quote-prefetch', daemon=True)
+                self._worker.start()
+
+    def stats(self):
+        """Métricas do pré-carregamento"""
+        stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['running'] = self._worker is not None
+        stats['tracked_symbols'] = len(self.traffic)
+        stats['markets_open'] = [market for market in ('B3', 'US', 'CRYPTO') if is_market_open(market)]
+        return stats
@@ -0,0 +1,162 @@
+"""
+Cache de respostas completas do chat
+
+Perguntas quase idênticas ("como está o Ibovespa hoje?") recebem a mesma
+resposta enquanto os dados de mercado não mudam. A chave é o texto da
+pergunta normalizado; cada entrada guarda as funções que o modelo chamou e
+uma impressão digital dos resultados. Ao reencontrar a pergunta, as funções
+são executadas de novo (acertos do cache de cotações, sem rede) e, se a
+impressão digital bate, a resposta é servida sem nenhuma chamada ao modelo.
+
+Só entram no cache perguntas autossuficientes: os ativos usados nas funções
+precisam aparecer na própria pergunta. Assim um "e o histórico?" feito no
+meio de uma conversa sobre PETR4 nunca é servido para outra sessão.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from symbol_index import normalize, get_symbol_index, base_symbol
+from finance_api import QUOTE_TTLS
+
+# Uma resposta não sobrevive a mais de um ciclo de atualização das cotações
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', str(max(QUOTE_TTLS.values()))))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+
+# Palavras que não mudam o sentido da pergunta
+_FILLER_WORDS = {
+    'a', 'o', 'as', 'os', 'e', 'me', 'pra', 'para', 'por', 'favor', 'oi', 'ola',
+    'voce', 'sabe', 'diga', 'diz', 'ai', 'agora', 'entao', 'bom', 'dia', 'tarde', 'noite'
+}
+
+
+def normalize_question(text):
+    """Minúsculas, sem acentos, pontuação nem palavras de preenchimento"""
+    return ' '.join(word for word in normalize(text).split() if word not in _FILLER_WORDS)
+
+
+def fingerprint(results):
+    """Impressão digital dos resultados das funções"""
+    payload = json.dumps(results, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def is_self_contained(question, calls):
+    """Indica se os ativos e buscas das chamadas aparecem na própria pergunta"""
+    words = set(normalize(question).split())
+    mentioned = None  # símbolos citados na pergunta, calculados sob demanda
+
+    for _, arguments in calls:
+        query = arguments.get('query')
+        if query is not None and not set(normalize(query).split()) <= words:
+            return False
+
+        symbols = arguments.get('symbols') or []
+        if arguments.get('symbol'):
+            symbols = [arguments['symbol'], *symbols]
+        for symbol in symbols:
+            if base_symbol(symbol) in words:
+                continue
+            if mentioned is None:
+                index = get_symbol_index()
+                mentioned = {
+                    result[0] for word in words if len(word) >= 3
+                    for result in index.search(word, limit=3)
+                }
+            if symbol.upper() not in mentioned:
+                return False
+    return True
+
+
+class CachedResponse:
+    """Resposta pronta e as chamadas de função que a produziram"""
+
+    def __init__(self, answer, calls, results, tokens):
+        self.answer = answer
+        self.calls = calls          # [(nome, argumentos)]
+        self.results = results      # resultados da última validação
+        self.fingerprint = fingerprint(results)
+        self.tokens = tokens        # tokens gastos para gerar a resposta
+        self.stored_at = time.monotonic()
+
+
+class ResponseCache:
+    """Cache LRU de respostas validado pelos dados usados em cada uma"""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # pergunta normalizada -> CachedResponse
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'stores': 0, 'skipped': 0, 'saved_tokens': 0}
+
+    def lookup(self, question, execute):
+        """Resposta ainda válida para a pergunta, ou None
+
+        `execute(nome, argumentos)` reexecuta as funções da entrada; se os
+        resultados mudaram desde que a resposta foi gerada, ela é descartada.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.stored_at >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+        results = [execute(name, arguments) for name, arguments in entry.calls]
+
+        with self._lock:
+            if fingerprint(results) != entry.fingerprint:
+                # Os dados mudaram: a resposta antiga já não vale
+                self._entries.pop(key, None)
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            entry.results = results
+            self._stats['hits'] += 1
+            self._stats['saved_tokens'] += entry.tokens
+        return entry
+
+    def store(self, question, calls, results, answer, tokens):
+        """Guarda a resposta gerada a partir das funções `calls`"""
+        key = normalize_question(question)
+        if not key or not calls or not answer:
+            return
+        if any(isinstance(result, dict) and 'error' in result for result in results):
+            return
+        if not is_self_contained(question, calls):
+            # Depende do contexto da conversa (ex.: "e o histórico?")
+            with self._lock:
+                self._stats['skipped'] += 1
+            return
+
+        with self._lock:
+            self._entries[key] = CachedResponse(answer, calls, results, tokens)
+            self._entries.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Taxa de acerto e tokens economizados"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
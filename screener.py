@@ -0,0 +1,249 @@
+"""
+Screener de ativos sobre um universo configurável
+
+Um snapshot com os últimos pregões de todo o universo (data/symbols.csv) é
+montado com downloads em lote e atualizado periodicamente em segundo plano,
+baixando de novo só os ativos dos pregões abertos.
+As consultas ordenam arrays NumPy já calculados, sem tocar na rede.
+"""
+
+import os
+import csv
+import time
+import threading
+
+import numpy as np
+
+from market_data import get_provider
+from prefetcher import market_of, is_market_open
+
+SCREENER_UNIVERSE = os.getenv(
+    'SCREENER_UNIVERSE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv')
+)
+SCREENER_REFRESH_INTERVAL = float(os.getenv('SCREENER_REFRESH_INTERVAL', '300'))
+SCREENER_BATCH_SIZE = int(os.getenv('SCREENER_BATCH_SIZE', '100'))
+
+# Pregões usados para média de volume e momentum
+_LOOKBACK = 20
+
+CRITERIA = {
+    'change': 'change_percent',
+    'volume_spike': 'volume_ratio',
+    'momentum': 'momentum'
+}
+MARKETS = ('B3', 'US', 'CRYPTO', 'INDEX')
+
+
+def load_universe(path=SCREENER_UNIVERSE):
+    """Lê o universo de ativos (symbol, name, market)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [
+            (row['symbol'].strip().upper(), row['name'].strip(), row['market'].strip().upper())
+            for row in csv.DictReader(f)
+            if row.get('symbol')
+        ]
+
+
+class Snapshot:
+    """Métricas de todo o universo em arrays alinhados"""
+
+    def __init__(self, symbols, names, markets, columns, built_at, close, volume):
+        self.symbols = symbols
+        self.names = names
+        self.markets = markets
+        self.columns = columns
+        self.built_at = built_at
+        self.close = close    # últimos pregões de cada ativo, base das atualizações parciais
+        self.volume = volume
+
+
+class Screener:
+    """Ranqueia o universo por variação diária, pico de volume ou momentum"""
+
+    def __init__(self, provider=None, universe=None, refresh_interval=SCREENER_REFRESH_INTERVAL,
+                 batch_size=SCREENER_BATCH_SIZE):
+        self.provider = provider or get_provider()
+        self.universe = universe if universe is not None else load_universe()
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        # Pregão de cada ativo (índices seguem a bolsa de origem)
+        self._trading_markets = [market_of(symbol) for symbol, _, _ in self.universe]
+
+        self._snapshot = None
+        self._build_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._refresher = None
+        self._stats = {'builds': 0, 'skipped_builds': 0, 'build_errors': 0, 'last_build_seconds': 0.0, 'queries': 0}
+
+    def _build(self, base=None, markets=None):
+        """Baixa o universo em lotes e calcula as métricas de cada ativo
+
+        Com um snapshot `base` e um conjunto de `markets`, só os ativos desses
+        pregões são baixados de novo; os demais reaproveitam as séries da base.
+        """
+        started = time.perf_counter()
+        symbols = [symbol for symbol, _, _ in self.universe]
+        rows = len(symbols)
+        if base is None:
+            close = np.full((rows, _LOOKBACK + 1), np.nan)
+            volume = np.full((rows, _LOOKBACK + 1), np.nan)
+            fetch = list(range(rows))
+        else:
+            close, volume = base.close.copy(), base.volume.copy()
+            fetch = [row for row, market in enumerate(self._trading_markets) if market in markets]
+
+        for start in range(0, len(fetch), self.batch_size):
+            batch = fetch[start:start + self.batch_size]
+            try:
+                frames = self.provider.download([symbols[row] for row in batch], period='3mo')
+            except Exception:
+                self._stats['build_errors'] += 1
+                continue
+            for row in batch:
+                frame = frames.get(symbols[row])
+                close[row] = volume[row] = np.nan
+                if frame is None or frame.empty:
+                    continue
+                tail = frame.tail(_LOOKBACK + 1)
+                close[row, -len(tail):] = tail['Close'].to_numpy(dtype=np.float64)
+                volume[row, -len(tail):] = tail['Volume'].to_numpy(dtype=np.float64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            last, previous = close[:, -1], close[:, -2]
+            average_volume = np.nanmean(volume[:, :-1], axis=1)
+            columns = {
+                'price': last,
+                'change_percent': (last / previous - 1) * 100,
+                'volume': volume[:, -1],
+                'volume_ratio': np.where(average_volume > 0, volume[:, -1] / average_volume, np.nan),
+                'momentum': (last / close[:, 0] - 1) * 100
+            }
+
+        snapshot = Snapshot(
+            np.array(symbols),
+            np.array([name for _, name, _ in self.universe]),
+            np.array([market for _, _, market in self.universe]),
+            columns,
+            time.time(),
+            close,
+            volume
+        )
+
+        self._stats['builds'] += 1
+        self._stats['last_build_seconds'] = round(time.perf_counter() - started, 3)
+        return snapshot
+
+    def _open_markets(self):
+        """Pregões do universo abertos agora (incluindo a margem após o fechamento)"""
+        return {market for market in set(self._trading_markets) if is_market_open(market)}
+
+    def refresh(self):
+        """Reconstrói o snapshot agora"""
+        with self._build_lock:
+            self._snapshot = self._build()
+        return self._snapshot
+
+    def _refresh_due(self):
+        """Atualiza o snapshot vencido; pregões fechados não mudam e não são baixados"""
+        with self._build_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                self._snapshot = self._build()
+            elif time.time() - snapshot.built_at >= self.refresh_interval:
+                markets = self._open_markets()
+                if markets:
+                    self._snapshot = self._build(snapshot, markets)
+                else:
+                    self._stats['skipped_builds'] += 1
+
+    def _refresh_loop(self):
+        """Mantém o snapshot com no máximo `refresh_interval` segundos"""
+        while True:
+            try:
+                self._refresh_due()
+            except Exception as e:
+                self._stats['build_errors'] += 1
+                print(f"⚠️ Falha ao atualizar o screener: {e}")
+            time.sleep(self.refresh_interval)
+
+    def start(self):
+        """Monta o snapshot em segundo plano e agenda as atualizações (idempotente)"""
+        with self._start_lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(
+                    target=self._refresh_loop,
+                    name='screener-refresh',
+                    daemon=True
+                )
+                self._refresher.start()
+
+    def snapshot(self):
+        """Snapshot atual; sem snapshot ainda, aguarda a primeira montagem"""
+        if self._snapshot is None:
+            self.start()
+            with self._build_lock:
+                if self._snapshot is None:
+                    self._snapshot = self._build()
+        return self._snapshot
+
+    @property
+    def ready(self):
+        """Indica se já existe um snapshot montado"""
+        return self._snapshot is not None
+
+    def rank(self, criterion='change', market=None, limit=10, order='desc'):
+        """Os `limit` ativos com maior (ou menor) valor no critério escolhido"""
+        if criterion not in CRITERIA:
+            raise ValueError(f"Critério inválido: {criterion} (use {', '.join(CRITERIA)})")
+
+        snapshot = self.snapshot()
+        values = snapshot.columns[CRITERIA[criterion]]
+
+        mask = ~np.isnan(values) & (snapshot.markets != 'INDEX')
+        if market:
+            mask &= snapshot.markets == market.upper()
+        candidates = np.flatnonzero(mask)
+
+        keys = values[candidates] if order == 'asc' else -values[candidates]
+        limit = max(1, min(int(limit), len(candidates))) if len(candidates) else 0
+        top = candidates[np.argpartition(keys, limit - 1)[:limit]] if limit else candidates
+        top = top[np.argsort(values[top] if order == 'asc' else -values[top], kind='stable')]
+
+        self._stats['queries'] += 1
+        return [
+            {
+                'symbol': str(snapshot.symbols[i]),
+                'name': str(snapshot.names[i]),
+                'market': str(snapshot.markets[i]),
+                'price': _round_or_none(snapshot.columns['price'][i]),
+                'change_percent': _round_or_none(snapshot.columns['change_percent'][i]),
+                'volume_ratio': _round_or_none(snapshot.columns['volume_ratio'][i]),
+                'momentum': _round_or_none(snapshot.columns['momentum'][i])
+            }
+            for i in top
+        ]
+
+    def stats(self):
+        """Métricas do screener"""
+        stats = dict(self._stats)
+        stats['universe'] = len(self.universe)
+        stats['snapshot_age'] = round(time.time() - self._snapshot.built_at, 1) if self._snapshot else None
+        return stats
+
+
+def _round_or_none(value, decimals=2):
+    return None if np.isnan(value) else round(float(value), decimals)
+
+
+_screener = None
+_screener_lock = threading.Lock()
+
+
+def get_screener():
+    """Screener compartilhado pelo processo"""
+    global _screener
+    with _screener_lock:
+        if _screener is None:
+            _screener = Screener()
+        return _screener
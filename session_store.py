@@ -0,0 +1,269 @@
+"""
+Armazenamento de estado por sessão com limite de tamanho e expiração por inatividade
+
+Os backends só persistem os valores; o SessionStore controla a ordem de uso
+(LRU), o número máximo de sessões e a remoção de sessões ociosas.
+"""
+
+import os
+import json
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+SESSION_MAX = int(os.getenv('SESSION_MAX', '1000'))
+SESSION_IDLE_TIMEOUT = float(os.getenv('SESSION_IDLE_TIMEOUT', '3600'))
+# Intervalo mínimo (segundos) entre gravações do último acesso de uma sessão
+SESSION_TOUCH_INTERVAL = float(os.getenv('SESSION_TOUCH_INTERVAL', '60'))
+
+
+class MemorySessionBackend:
+    """Backend em memória (valores mutáveis são compartilhados, sem cópia)"""
+
+    def __init__(self):
+        self._data = {}
+
+    def load(self, session_id):
+        return self._data.get(session_id)
+
+    def save(self, session_id, value, updated_at):
+        self._data[session_id] = value
+
+    def touch(self, session_id, updated_at):
+        """O último acesso só fica no SessionStore"""
+
+    def delete(self, session_id):
+        self._data.pop(session_id, None)
+
+    def items(self):
+        """Sessões em memória não sobrevivem a reinícios: nada a recuperar"""
+        return []
+
+
+class SQLiteSessionBackend:
+    """Backend persistente em SQLite (valores serializados em JSON)"""
+
+    def __init__(self, path=SESSION_DB_PATH, table='sessions'):
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT data FROM {self.table} WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, value, updated_at):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(value, ensure_ascii=False), updated_at)
+            )
+
+    def touch(self, session_id, updated_at):
+        """Atualiza só o último acesso, sem regravar o valor"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE {self.table} SET updated_at = ? WHERE session_id = ?",
+                (updated_at, session_id)
+            )
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE session_id = ?",
+                (session_id,)
+            )
+
+    def items(self):
+        """Retorna [(session_id, updated_at)] do mais antigo ao mais recente"""
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT session_id, updated_at FROM {self.table} ORDER BY updated_at"
+            ).fetchall()
+
+
+class SessionStore:
+    """Estado por sessão com LRU, limite de sessões e expiração por inatividade"""
+
+    def __init__(self, backend=None, factory=None, max_sessions=SESSION_MAX,
+                 idle_timeout=SESSION_IDLE_TIMEOUT, touch_interval=SESSION_TOUCH_INTERVAL):
+        self.backend = backend or MemorySessionBackend()
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'evicted_idle': 0, 'evicted_lru': 0}
+
+        # session_id -> último acesso (epoch), do mais antigo ao mais recente
+        self._access = OrderedDict(self.backend.items())
+        # session_id -> último acesso gravado no backend
+        self._persisted = dict(self._access)
+        with self._lock:
+            self._evict()
+
+    def get(self, session_id):
+        """Retorna o estado da sessão, criando-o com `factory` se necessário"""
+        with self._lock:
+            self._evict()
+            value = self.backend.load(session_id)
+            now = time.time()
+
+            if value is None:
+                if self.factory is None:
+                    return None
+                value = self.factory()
+                self.backend.save(session_id, value, now)
+                self._persisted[session_id] = now
+                self._stats['created'] += 1
+            elif now - self._persisted.get(session_id, 0) >= self.touch_interval:
+                # Sessões só lidas (ex.: thread_id) também precisam sobreviver
+                # à expiração depois de um reinício
+                self.backend.touch(session_id, now)
+                self._persisted[session_id] = now
+
+            self._access[session_id] = now
+            self._access.move_to_end(session_id)
+            self._evict()
+            return value
+
+    def save(self, session_id, value):
+        """Persiste o estado da sessão (necessário em backends não compartilhados)"""
+        with self._lock:
+            now = time.time()
+            self.backend.save(session_id, value, now)
+            self._persisted[session_id] = now
+            self._access[session_id] = now
+            self._access.move_to_end(session_id)
+            self._evict()
+
+    def delete(self, session_id):
+        """Remove a sessão; retorna True se ela existia"""
+        with self._lock:
+            existed = self._access.pop(session_id, None) is not None
+            self._persisted.pop(session_id, None)
+            self.backend.delete(session_id)
+            return existed
+
+    def _evict(self):
+        """Remove sessões ociosas e as menos usadas além do limite (chamar com o lock)"""
+        cutoff = time.time() - self.idle_timeout
+        while self._access:
+            session_id, last_access = next(iter(self._access.items()))
+            if last_access >= cutoff:
+                break
+            self._access.popitem(last=False)
+            self._persisted.pop(session_id, None)
+            self.backend.delete(session_id)
+            self._stats['evicted_idle'] += 1
+
+        while len(self._access) > self.max_sessions:
+            session_id, _ = self._access.popitem(last=False)
+            self._persisted.pop(session_id, None)
+            self.backend.delete(session_id)
+            self._stats['evicted_lru'] += 1
+
+    def __len__(self):
+        return len(self._access)
+
+    def stats(self):
+        """Retorna métricas do armazenamento"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['sessions'] = len(self._access)
+            stats['max_sessions'] = self.max_sessions
+            stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+def create_session_store(factory=None, table='sessions', **kwargs):
+    """Cria um SessionStore com o backend configurado em SESSION_BACKEND"""
+    if SESSION_BACKEND == 'sqlite':
+        backend = SQLiteSessionBackend(SESSION_DB_PATH, table=table)
+    else:
+        backend = MemorySessionBackend()
+    return SessionStore(backend=backend, factory=factory, **kwargs)
+
+
+class ThreadRegistry:
+    """Mapa session_id -> thread_id da Assistants API com limite e expiração
+
+    Guarda apenas o id da thread (persistível em SQLite, de modo que um
+    reinício reaproveita as threads remotas). Pedidos simultâneos da mesma
+    sessão criam uma única thread.
+    """
+
+    def __init__(self, store=None, table='assistant_threads'):
+        self.store = store if store is not None else create_session_store(table=table)
+        self._lock = threading.Lock()
+        # Locks das sessões com thread em criação (threading e asyncio não se misturam)
+        self._pending = {}
+        self._apending = {}
+
+    def _session_lock(self, pending, session_id, lock_type):
+        """Lock exclusivo da sessão enquanto a thread é criada"""
+        with self._lock:
+            lock = pending.get(session_id)
+            if lock is None:
+                lock = pending[session_id] = lock_type()
+            return lock
+
+    def _release(self, pending, session_id):
+        with self._lock:
+            pending.pop(session_id, None)
+
+    def get_or_create(self, session_id, create):
+        """Retorna o thread_id da sessão, chamando `create()` se ainda não existir"""
+        thread_id = self.store.get(session_id)
+        if thread_id is not None:
+            return thread_id
+
+        try:
+            with self._session_lock(self._pending, session_id, threading.Lock):
+                thread_id = self.store.get(session_id)
+                if thread_id is None:
+                    thread_id = create().id
+                    self.store.save(session_id, thread_id)
+        finally:
+            self._release(self._pending, session_id)
+        return thread_id
+
+    async def aget_or_create(self, session_id, create):
+        """Versão assíncrona de get_or_create (`create` é uma corrotina)"""
+        thread_id = self.store.get(session_id)
+        if thread_id is not None:
+            return thread_id
+
+        try:
+            async with self._session_lock(self._apending, session_id, asyncio.Lock):
+                thread_id = self.store.get(session_id)
+                if thread_id is None:
+                    thread_id = (await create()).id
+                    self.store.save(session_id, thread_id)
+        finally:
+            self._release(self._apending, session_id)
+        return thread_id
+
+    def delete(self, session_id):
+        """Esquece a thread da sessão; retorna True se ela existia"""
+        return self.store.delete(session_id)
+
+    def __len__(self):
+        return len(self.store)
+
+    def stats(self):
+        """Retorna métricas do registro"""
+        return self.store.stats()
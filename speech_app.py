@@ -1,20 +1,27 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from flask_sock import Sock
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import sys
-import json
-import time
+import asyncio
 import io
-import tempfile
 from finance_api import FinanceAPI
+from intent_router import IntentRouter
+from tool_registry import ToolSet
+from assistant_runtime import stream_assistant, astream_assistant, RunTimeoutError, exchange_recorder
+from sse import sse_stream, SSE_HEADERS
+from session_store import ThreadRegistry
+from assistant_bootstrap import resolve_assistant, StartupTimer
+from voice_pipeline import VoicePipeline, SpeechQueue, split_sentences
 
 # Carrega as variáveis de ambiente
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
 
 class SpeechFinanceAssistantWeb:
     def __init__(self):
@@ -26,34 +33,43 @@ class SpeechFinanceAssistantWeb:
             print("❌ Erro: Chave da API do OpenAI não encontrada!")
             sys.exit(1)
         
+        timer = StartupTimer()
+        
         # Inicializa o cliente da OpenAI
-        self.client = OpenAI(api_key=api_key)
+        with timer.step('cliente'):
+            self.client = OpenAI(api_key=api_key)
+        
+        # Cliente assíncrono, criado sob demanda pelo modo ASGI
+        self._async_client = None
         
         # Inicializa a API financeira
         self.finance_api = FinanceAPI()
         
+        # Só as ferramentas úteis numa conversa por voz
+        self.tools = ToolSet(
+            self.finance_api,
+            ['get_stock_info', 'get_stock_fundamentals', 'get_market_summary', 'search_stocks']
+        )
+        
+        # Cotações e resumo do mercado respondidos sem o modelo
+        self.intent_router = IntentRouter(self.finance_api)
+        
         # Cria ou recupera o assistente especializado
-        self.assistant = self._create_speech_assistant()
+        with timer.step('assistente'):
+            self.assistant = self._create_speech_assistant()
         
-        # Dicionário para armazenar threads por sessão
-        self.user_threads = {}
+        # Threads por sessão, com limite, expiração e persistência opcional
+        with timer.step('sessões'):
+            self.user_threads = ThreadRegistry(table='speech_threads')
         
         print("🎙️ Speech Finance Assistant Web inicializado!")
+        timer.report()
     
     def _create_speech_assistant(self):
         """Cria um assistente especializado para interface de voz"""
         try:
-            # Tenta buscar assistente existente
-            assistants = self.client.beta.assistants.list()
-            for assistant in assistants.data:
-                if assistant.name == "Speech Finance Expert Web":
-                    print("✅ Speech Finance Expert Web encontrado!")
-                    return assistant
-            
-            # Cria novo assistente se não existir
-            print("🔧 Criando Speech Finance Expert Web...")
-            
-            assistant = self.client.beta.assistants.create(
+            # Reaproveita o id em cache; busca ou cria o assistente só quando necessário
+            assistant = resolve_assistant(self.client, dict(
                 name="Speech Finance Expert Web",
                 instructions="""
                 Você é um ESPECIALISTA EM FINANÇAS com interface WEB e VOZ.
@@ -85,59 +101,11 @@ class SpeechFinanceAssistantWeb:
                 - Explique impostos nacionais
                 - Contexto econômico do Brasil
                 """,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_stock_info",
-                            "description": "Obtém informações de ação",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "symbol": {
-                                        "type": "string",
-                                        "description": "Símbolo da ação"
-                                    }
-                                },
-                                "required": ["symbol"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_market_summary",
-                            "description": "Resumo do mercado",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "search_stocks",
-                            "description": "Busca empresas",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "query": {
-                                        "type": "string",
-                                        "description": "Nome da empresa"
-                                    }
-                                },
-                                "required": ["query"]
-                            }
-                        }
-                    }
-                ],
+                tools=self.tools.payload,
                 model="gpt-3.5-turbo",
                 temperature=0.4
-            )
+            ))
             
-            print("✅ Speech Finance Expert Web criado!")
             return assistant
             
         except Exception as e:
@@ -176,6 +144,15 @@ class SpeechFinanceAssistantWeb:
             print(f"❌ Erro na transcrição: {str(e)}")
             raise e
     
+    def transcribe_bytes(self, audio, filename='speech.webm', mime='audio/webm'):
+        """Transcreve áudio já em memória (usado pelo pipeline de voz)"""
+        transcript = self.client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(filename, audio, mime),
+            language="pt"
+        )
+        return transcript.text.strip()
+    
     def text_to_speech(self, text):
         """Converte texto em fala"""
         try:
@@ -197,120 +174,173 @@ class SpeechFinanceAssistantWeb:
             print(f"❌ Erro no TTS: {str(e)}")
             return None
     
-    def _handle_function_call(self, tool_call):
-        """Processa chamadas de função"""
-        function_name = tool_call.function.name
-        arguments = json.loads(tool_call.function.arguments)
+    async def atranscribe_audio(self, audio_file):
+        """Versão assíncrona de transcribe_audio (modo ASGI)"""
+        content = audio_file.read()
+        
+        if not content:
+            return "Erro: Arquivo de áudio vazio"
+        
+        transcript = await self.async_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(audio_file.filename, content, audio_file.content_type),
+            language="pt"
+        )
         
+        return transcript.text.strip()
+    
+    async def atext_to_speech(self, text):
+        """Versão assíncrona de text_to_speech (modo ASGI)"""
         try:
-            if function_name == "get_stock_info":
-                result = self.finance_api.get_stock_info(arguments["symbol"])
-            elif function_name == "get_market_summary":
-                result = self.finance_api.get_market_summary()
-            elif function_name == "search_stocks":
-                result = self.finance_api.search_stocks(arguments["query"])
-            else:
-                result = {"error": "Função não encontrada"}
+            response = await self.async_client.audio.speech.create(
+                model="tts-1",
+                voice="alloy",
+                input=text,
+                speed=1.0
+            )
             
-            return json.dumps(result, ensure_ascii=False)
+            return response.content
             
         except Exception as e:
-            return json.dumps({"error": str(e)}, ensure_ascii=False)
+            print(f"❌ Erro no TTS: {str(e)}")
+            return None
     
     def get_or_create_thread(self, session_id):
-        """Obtém ou cria uma thread para a sessão"""
-        if session_id not in self.user_threads:
-            self.user_threads[session_id] = self.client.beta.threads.create()
-        return self.user_threads[session_id]
+        """Obtém ou cria a thread da sessão e retorna o seu id"""
+        return self.user_threads.get_or_create(session_id, self.client.beta.threads.create)
     
     def chat_with_assistant(self, message, session_id="default"):
         """Conversa com o assistente"""
+        return "".join(self.stream_chat_with_assistant(message, session_id))
+    
+    def stream_chat_with_assistant(self, message, session_id="default"):
+        """Conversa com o assistente, gerando a resposta em trechos"""
         try:
+            # Perguntas simples saem direto da FinanceAPI, sem run
+            answer = self.intent_router.route(message)
+            if answer is not None:
+                if self.assistant:
+                    thread_id = self.get_or_create_thread(session_id)
+                    exchange_recorder.record(session_id, self.client, thread_id, message, answer)
+                yield answer
+                return
+            
             if not self.assistant:
-                return "Assistente não disponível no momento."
+                yield "Assistente não disponível no momento."
+                return
             
             # Obtém a thread da sessão
-            thread = self.get_or_create_thread(session_id)
+            thread_id = self.get_or_create_thread(session_id)
+            
+            # Respostas locais anteriores precisam estar na thread antes da pergunta
+            exchange_recorder.wait(session_id)
             
             # Adiciona mensagem à thread
             self.client.beta.threads.messages.create(
-                thread_id=thread.id,
+                thread_id=thread_id,
                 role="user",
                 content=message
             )
             
-            # Executa o assistente
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread.id,
-                assistant_id=self.assistant.id
-            )
-            
-            # Aguarda conclusão
-            max_wait = 30
-            wait_time = 0
+            # Executa o assistente (streaming/polling adaptativo)
+            received = False
+            for chunk in stream_assistant(
+                self.client,
+                thread_id,
+                self.assistant.id,
+                self.tools
+            ):
+                received = True
+                yield chunk
             
-            while run.status in ["queued", "in_progress"] and wait_time < max_wait:
-                time.sleep(1)
-                wait_time += 1
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread.id,
-                    run_id=run.id
-                )
+            if not received:
+                yield "Não consegui gerar uma resposta."
+                
+        except RunTimeoutError:
+            yield "A análise está demorando muito. Tente novamente."
+        except Exception as e:
+            yield f"Erro na conversa: {str(e)}"
+    
+    @property
+    def async_client(self):
+        """Cliente AsyncOpenAI usado pelo modo ASGI"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.client.api_key)
+        return self._async_client
+    
+    async def aget_or_create_thread(self, session_id):
+        """Versão assíncrona de get_or_create_thread"""
+        return await self.user_threads.aget_or_create(session_id, self.async_client.beta.threads.create)
+    
+    async def achat_with_assistant(self, message, session_id="default"):
+        """Versão assíncrona de chat_with_assistant (modo ASGI)"""
+        chunks = [chunk async for chunk in self.astream_chat_with_assistant(message, session_id)]
+        return "".join(chunks)
+    
+    async def astream_chat_with_assistant(self, message, session_id="default"):
+        """Versão assíncrona de stream_chat_with_assistant (modo ASGI)"""
+        try:
+            # Cotações vêm do cache na maioria das vezes; a rede roda fora do event loop
+            answer = await asyncio.get_running_loop().run_in_executor(None, self.intent_router.route, message)
+            if answer is not None:
+                if self.assistant:
+                    thread_id = await self.aget_or_create_thread(session_id)
+                    exchange_recorder.record(session_id, self.client, thread_id, message, answer)
+                yield answer
+                return
             
-            if wait_time >= max_wait:
-                return "A análise está demorando muito. Tente novamente."
+            if not self.assistant:
+                yield "Assistente não disponível no momento."
+                return
             
-            # Verifica se precisa executar funções
-            if run.status == "requires_action":
-                tool_outputs = []
-                
-                for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                    output = self._handle_function_call(tool_call)
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": output
-                    })
-                
-                # Submete os resultados das funções
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread.id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs
-                )
-                
-                # Aguarda conclusão novamente
-                wait_time = 0
-                while run.status in ["queued", "in_progress"] and wait_time < max_wait:
-                    time.sleep(1)
-                    wait_time += 1
-                    run = self.client.beta.threads.runs.retrieve(
-                        thread_id=thread.id,
-                        run_id=run.id
-                    )
+            thread_id = await self.aget_or_create_thread(session_id)
+            await exchange_recorder.await_pending(session_id)
             
-            # Obtém a resposta
-            messages = self.client.beta.threads.messages.list(
-                thread_id=thread.id
+            await self.async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message
             )
             
-            if messages.data:
-                return messages.data[0].content[0].text.value
-            else:
-                return "Não consegui gerar uma resposta."
+            received = False
+            async for chunk in astream_assistant(
+                self.async_client,
+                thread_id,
+                self.assistant.id,
+                self.tools
+            ):
+                received = True
+                yield chunk
+            
+            if not received:
+                yield "Não consegui gerar uma resposta."
                 
+        except RunTimeoutError:
+            yield "A análise está demorando muito. Tente novamente."
         except Exception as e:
-            return f"Erro na conversa: {str(e)}"
+            yield f"Erro na conversa: {str(e)}"
     
     def clear_thread(self, session_id="default"):
         """Limpa a thread da sessão"""
-        if session_id in self.user_threads:
-            del self.user_threads[session_id]
-            return True
-        return False
+        return self.user_threads.delete(session_id)
 
 # Instância global do assistente
 speech_assistant = SpeechFinanceAssistantWeb()
 
+@app.before_request
+def start_background_jobs():
+    """Monta o snapshot do screener e pré-carrega as cotações quentes em segundo plano
+
+    Só o processo que atende requisições inicia as threads (não o observador
+    do reloader nem scripts que apenas importam o módulo); as chamadas
+    seguintes não fazem nada.
+    """
+    speech_assistant.finance_api.screener.start()
+    speech_assistant.finance_api.prefetcher.start()
+
+# Turnos de voz completos (áudio -> resposta falada) em um único WebSocket
+voice_pipeline = VoicePipeline(speech_assistant)
+
 @app.route('/')
 def index():
     """Página principal"""
@@ -365,6 +395,11 @@ def transcribe():
         print(f"❌ Erro no endpoint /transcribe: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@sock.route('/voice')
+def voice(ws):
+    """Pipeline de voz: recebe áudio em pedaços e devolve transcrição, resposta e fala"""
+    voice_pipeline.handle(ws)
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """Endpoint para processar mensagens do chat"""
@@ -397,36 +432,50 @@ def speak():
         if not text:
             return jsonify({'error': 'Texto vazio'}), 400
         
-        print(f"🔊 Convertendo texto para fala: {text[:50]}...")
+        sentences = split_sentences(text)
+        print(f"🔊 Convertendo texto para fala em {len(sentences)} trechos: {text[:50]}...")
         
-        # Converte texto em áudio
-        audio_content = speech_assistant.text_to_speech(text)
+        # Frases sintetizadas em paralelo, transmitidas na ordem assim que ficam prontas
+        speech = SpeechQueue(speech_assistant.text_to_speech)
+        speech.submit(sentences)
+        chunks = speech.ready(block=True)
         
-        if audio_content is None:
-            print("❌ Erro ao gerar áudio - audio_content é None")
+        first = next(chunks, None)
+        if first is None:
+            speech.close()
+            print("❌ Erro ao gerar áudio - nenhum trecho sintetizado")
             return jsonify({'error': 'Erro ao gerar áudio'}), 500
         
-        print(f"✅ Áudio gerado com sucesso - {len(audio_content)} bytes")
+        def generate():
+            try:
+                yield first[2]
+                for _, _, audio in chunks:
+                    yield audio
+            finally:
+                speech.close()
         
-        # Cria arquivo temporário
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_file.write(audio_content)
-        temp_file.close()
-        
-        print(f"📁 Arquivo temporário criado: {temp_file.name}")
-        
-        # Retorna o arquivo de áudio
-        return send_file(
-            temp_file.name,
-            as_attachment=False,
-            download_name='response.mp3',
-            mimetype='audio/mpeg'
-        )
+        return Response(stream_with_context(generate()), mimetype='audio/mpeg')
         
     except Exception as e:
         print(f"❌ Erro no endpoint /speak: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Endpoint que transmite a resposta em tempo real (SSE)"""
+    data = request.get_json() or {}
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+    
+    if not user_message:
+        return jsonify({'error': 'Mensagem vazia'}), 400
+    
+    return Response(
+        sse_stream(speech_assistant.stream_chat_with_assistant(user_message, session_id)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
 @app.route('/clear', methods=['POST'])
 def clear_chat():
     """Endpoint para limpar o histórico do chat"""
@@ -447,8 +496,17 @@ def health_check():
         'features': {
             'speech_recognition': True,
             'text_to_speech': True,
+            'voice_pipeline': True,
             'assistant_available': speech_assistant.assistant is not None
-        }
+        },
+        'quote_cache': speech_assistant.finance_api.get_cache_stats(),
+        'market_data': speech_assistant.finance_api.get_provider_stats(),
+        'screener': speech_assistant.finance_api.screener.stats(),
+        'prefetcher': speech_assistant.finance_api.prefetcher.stats(),
+        'intent_router': speech_assistant.intent_router.stats(),
+        'thread_records': exchange_recorder.stats(),
+        'threads': speech_assistant.user_threads.stats(),
+        'voice': voice_pipeline.stats()
     })
 
 if __name__ == '__main__':
@@ -6,12 +6,15 @@ Assistente Financeiro com Reconhecimento de Fala usando OpenAI Whisper
 
 import os
 import json
-import time
 import io
 import wave
 import threading
 from openai import OpenAI
-import yfinance as yf
+from assistant_runtime import run_assistant, RunTimeoutError
+from assistant_bootstrap import resolve_assistant, StartupTimer
+from finance_api import FinanceAPI
+from tool_registry import ToolSet
+from symbol_index import get_symbol_index
 from datetime import datetime, timedelta
 import speech_recognition as sr
 import pyaudio
@@ -24,41 +27,50 @@ class SpeechFinanceAssistant:
         if not api_key:
             raise ValueError("OPENAI_API_KEY não encontrada!")
         
+        timer = StartupTimer()
         self.client = OpenAI(api_key=api_key)
+        self.finance_api = FinanceAPI()
+        
+        # Ferramentas do registro compartilhado, com respostas formatadas por este CLI
+        self.tools = ToolSet(
+            self.finance_api,
+            ['get_stock_info', 'get_stock_fundamentals', 'get_market_summary', 'search_stocks', 'get_trending_stocks'],
+            overrides={
+                'get_stock_info': self.get_stock_price,
+                'get_stock_fundamentals': self.get_stock_fundamentals,
+                'get_market_summary': self.get_market_summary,
+                'search_stocks': self.search_stock,
+                'get_trending_stocks': self.get_trending_stocks
+            }
+        )
         
         # Inicializa o reconhecedor de fala
         self.recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
         
-        # Calibra o microfone para ruído ambiente
+        # Calibra o microfone em segundo plano enquanto o assistente é carregado
         print("🎤 Calibrando microfone...")
-        with self.microphone as source:
-            self.recognizer.adjust_for_ambient_noise(source, duration=2)
+        self._calibration = threading.Thread(target=self._calibrate_microphone, daemon=True)
+        self._calibration.start()
         
         # Cria ou recupera o assistente especializado
-        self.assistant = self._create_finance_assistant()
+        with timer.step('assistente'):
+            self.assistant = self._create_finance_assistant()
         
         # Cria uma thread para a conversa
-        self.thread = self.client.beta.threads.create()
+        with timer.step('thread'):
+            self.thread = self.client.beta.threads.create()
         
         print("🎙️ Speech Finance Assistant inicializado!")
+        timer.report()
         print("🤖 Agora você pode falar comigo! Pressione ENTER para começar a gravar.")
         print("=" * 70)
     
     def _create_finance_assistant(self):
         """Cria um assistente especializado em finanças"""
         try:
-            # Tenta buscar assistente existente
-            assistants = self.client.beta.assistants.list()
-            for assistant in assistants.data:
-                if assistant.name == "Speech Finance Expert":
-                    print("✅ Assistente Speech Finance Expert encontrado!")
-                    return assistant
-            
-            # Cria novo assistente se não existir
-            print("🔧 Criando novo assistente Speech Finance Expert...")
-            
-            assistant = self.client.beta.assistants.create(
+            # Reaproveita o id em cache; busca ou cria o assistente só quando necessário
+            assistant = resolve_assistant(self.client, dict(
                 name="Speech Finance Expert",
                 instructions="""
                 Você é um ESPECIALISTA EM FINANÇAS com interface de VOZ.
@@ -90,80 +102,31 @@ class SpeechFinanceAssistant:
                 - Use reais como moeda padrão
                 - Contexto econômico nacional
                 """,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_stock_price",
-                            "description": "Obtém preço atual de uma ação",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "symbol": {
-                                        "type": "string",
-                                        "description": "Símbolo da ação (ex: PETR4.SA, AAPL)"
-                                    }
-                                },
-                                "required": ["symbol"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_market_summary",
-                            "description": "Obtém resumo dos principais índices",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "search_stock",
-                            "description": "Busca ações por nome",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "company_name": {
-                                        "type": "string",
-                                        "description": "Nome da empresa"
-                                    }
-                                },
-                                "required": ["company_name"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "get_trending_stocks",
-                            "description": "Obtém ações em tendência",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        }
-                    }
-                ],
+                tools=self.tools.payload,
                 model="gpt-3.5-turbo",
                 temperature=0.4  # Pouco mais criativo para conversação
-            )
+            ))
             
-            print("✅ Assistente Speech Finance Expert criado!")
             return assistant
             
         except Exception as e:
             print(f"❌ Erro ao criar assistente: {e}")
             raise
     
+    def _calibrate_microphone(self):
+        """Ajusta o reconhecedor ao ruído ambiente"""
+        try:
+            with self.microphone as source:
+                self.recognizer.adjust_for_ambient_noise(source, duration=2)
+        except Exception as e:
+            print(f"⚠️ Falha ao calibrar o microfone: {e}")
+    
     def record_audio(self, duration=5):
         """Grava áudio do microfone"""
         try:
+            # A primeira gravação aguarda a calibração terminar
+            self._calibration.join()
+            
             print("🔴 Gravando... (Fale agora)")
             
             with self.microphone as source:
@@ -242,25 +205,20 @@ class SpeechFinanceAssistant:
     def get_stock_price(self, symbol):
         """Obtém preço atual de uma ação"""
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            hist = ticker.history(period="2d")
+            quote = self.finance_api.get_stock_info(symbol)
             
-            if hist.empty:
+            if 'error' in quote:
                 return f"Não consegui obter dados para {symbol}"
             
-            current_price = hist['Close'].iloc[-1]
-            previous_close = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
-            change = current_price - previous_close
-            change_percent = (change / previous_close) * 100 if previous_close != 0 else 0
+            change = quote['change']
             
             # Formato mais conversacional para fala
             result = {
-                "symbol": symbol,
-                "company": info.get('longName', symbol),
-                "price": f"R$ {current_price:.2f}",
+                "symbol": quote['symbol'],
+                "company": quote['name'],
+                "price": f"R$ {quote['current_price']:.2f}",
                 "change": f"{change:+.2f}",
-                "change_percent": f"{change_percent:+.2f}%",
+                "change_percent": f"{quote['change_percent']:+.2f}%",
                 "status": "alta" if change > 0 else "baixa" if change < 0 else "estável"
             }
             
@@ -269,56 +227,36 @@ class SpeechFinanceAssistant:
         except Exception as e:
             return f"Erro ao buscar dados de {symbol}: {str(e)}"
     
+    def get_stock_fundamentals(self, symbol):
+        """Obtém P/L, valor de mercado e dividendos"""
+        fundamentals = self.finance_api.get_fundamentals(symbol)
+        if 'error' in fundamentals:
+            return f"Não consegui obter os fundamentos de {symbol}"
+        return json.dumps(fundamentals, ensure_ascii=False)
+    
     def get_market_summary(self):
-        """Obtém resumo do mercado"""
+        """Obtém resumo do mercado (índices baixados em lote pela FinanceAPI)"""
         try:
-            indices = {
-                "Ibovespa": "^BVSP",
-                "S&P 500": "^GSPC",
-                "NASDAQ": "^IXIC",
-                "Dólar": "BRL=X"
-            }
-            
             summary = {}
-            for name, symbol in indices.items():
-                try:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period="2d")
-                    
-                    if not hist.empty:
-                        current = hist['Close'].iloc[-1]
-                        previous = hist['Close'].iloc[-2] if len(hist) > 1 else current
-                        change_percent = ((current - previous) / previous) * 100 if previous != 0 else 0
-                        
-                        summary[name] = {
-                            "price": round(current, 2),
-                            "change_percent": round(change_percent, 2),
-                            "trend": "subindo" if change_percent > 0 else "caindo" if change_percent < 0 else "estável"
-                        }
-                except:
-                    continue
-            
+            for item in self.finance_api.get_market_summary():
+                change_percent = round(item['change_percent'], 2)
+                summary[item['name']] = {
+                    "price": round(item['price'], 2),
+                    "change_percent": change_percent,
+                    "trend": "subindo" if change_percent > 0 else "caindo" if change_percent < 0 else "estável"
+                }
             return json.dumps(summary, ensure_ascii=False)
             
         except Exception as e:
             return f"Erro ao obter resumo: {str(e)}"
     
-    def search_stock(self, company_name):
+    def search_stock(self, query):
         """Busca ações por nome"""
         try:
-            br_stocks = {
-                "petrobras": "PETR4.SA",
-                "vale": "VALE3.SA", 
-                "itau": "ITUB4.SA",
-                "bradesco": "BBDC4.SA",
-                "ambev": "ABEV3.SA",
-                "magazine luiza": "MGLU3.SA"
-            }
-            
-            company_lower = company_name.lower()
-            for name, symbol in br_stocks.items():
-                if company_lower in name:
-                    return json.dumps({"found": True, "symbol": symbol, "company": name})
+            matches = get_symbol_index().search(query, limit=1)
+            if matches:
+                symbol, name, _, _ = matches[0]
+                return json.dumps({"found": True, "symbol": symbol, "company": name}, ensure_ascii=False)
             
             return json.dumps({"found": False, "message": "Empresa não encontrada"})
             
@@ -340,22 +278,6 @@ class SpeechFinanceAssistant:
         
         return json.dumps(results, ensure_ascii=False)
     
-    def _handle_function_call(self, tool_call):
-        """Processa chamadas de função"""
-        function_name = tool_call.function.name
-        arguments = json.loads(tool_call.function.arguments)
-        
-        if function_name == "get_stock_price":
-            return self.get_stock_price(arguments["symbol"])
-        elif function_name == "get_market_summary":
-            return self.get_market_summary()
-        elif function_name == "search_stock":
-            return self.search_stock(arguments["company_name"])
-        elif function_name == "get_trending_stocks":
-            return self.get_trending_stocks()
-        else:
-            return "Função não encontrada"
-    
     def chat_with_assistant(self, message):
         """Conversa com o assistente"""
         try:
@@ -366,62 +288,19 @@ class SpeechFinanceAssistant:
                 content=message
             )
             
-            # Executa o assistente
-            run = self.client.beta.threads.runs.create(
-                thread_id=self.thread.id,
-                assistant_id=self.assistant.id
-            )
-            
-            # Aguarda conclusão
-            max_wait = 30
-            wait_time = 0
-            
-            while run.status in ["queued", "in_progress"] and wait_time < max_wait:
-                time.sleep(1)
-                wait_time += 1
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=self.thread.id,
-                    run_id=run.id
+            # Executa o assistente e aguarda a resposta (streaming/polling adaptativo)
+            try:
+                response = run_assistant(
+                    self.client,
+                    self.thread.id,
+                    self.assistant.id,
+                    self.tools
                 )
-            
-            if wait_time >= max_wait:
+            except RunTimeoutError:
                 return "Desculpe, a análise está demorando muito. Tente novamente."
             
-            # Verifica se precisa executar funções
-            if run.status == "requires_action":
-                tool_outputs = []
-                
-                for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                    output = self._handle_function_call(tool_call)
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": output
-                    })
-                
-                # Submete os resultados das funções
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=self.thread.id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs
-                )
-                
-                # Aguarda conclusão novamente
-                wait_time = 0
-                while run.status in ["queued", "in_progress"] and wait_time < max_wait:
-                    time.sleep(1)
-                    wait_time += 1
-                    run = self.client.beta.threads.runs.retrieve(
-                        thread_id=self.thread.id,
-                        run_id=run.id
-                    )
-            
-            # Obtém a resposta
-            messages = self.client.beta.threads.messages.list(
-                thread_id=self.thread.id
-            )
-            
-            if messages.data:
-                return messages.data[0].content[0].text.value
+            if response:
+                return response
             else:
                 return "Não consegui gerar uma resposta."
                 
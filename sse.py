@@ -0,0 +1,45 @@
+"""
+Utilitários para respostas em Server-Sent Events (SSE)
+"""
+
+import json
+
+# Cabeçalhos que evitam buffer em proxies e no navegador
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+def sse_event(data, event=None):
+    """Formata um evento SSE com payload JSON"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+def sse_stream(chunks):
+    """Converte um gerador de trechos de texto em eventos SSE
+
+    Cada trecho vira um evento `{"delta": ...}`; o fim é sinalizado com o
+    evento `done` e falhas com o evento `error`.
+    """
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield sse_event({"delta": chunk})
+    except Exception as e:
+        yield sse_event({"error": str(e)}, event="error")
+    yield sse_event({}, event="done")
+
+
+async def asse_stream(chunks):
+    """Versão assíncrona de sse_stream"""
+    try:
+        async for chunk in chunks:
+            if chunk:
+                yield sse_event({"delta": chunk})
+    except Exception as e:
+        yield sse_event({"error": str(e)}, event="error")
+    yield sse_event({}, event="done")
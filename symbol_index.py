@@ -0,0 +1,255 @@
+"""
+Busca de ativos por nome ou símbolo
+
+A lista curada (data/symbols.csv) é completada pelas ações dos principais
+índices mundiais (data/listings.csv), somando alguns milhares de ativos.
+As chaves (símbolo, nome e apelidos) são normalizadas (minúsculas, sem
+acentos) e indexadas de dois jeitos:
+
+- palavras em ordem alfabética: as que começam com cada palavra da consulta
+  são achadas por busca binária, então o custo cresce com o número de
+  resultados, não com o tamanho da lista;
+- listas de trigramas: dão as chaves que contêm a consulta no meio de uma
+  palavra e, quando nada casa, as mais parecidas com ela (erros de digitação).
+
+Símbolo ou apelido exato vem primeiro, depois nomes com todas as palavras da
+consulta, com bônus para nome inteiro. Assim "itau", "Itaú" e "petrobas"
+levam ao mesmo ativo.
+"""
+
+import os
+import csv
+import heapq
+import bisect
+import threading
+import unicodedata
+from collections import Counter
+
+SYMBOL_MASTER = os.getenv(
+    'SYMBOL_MASTER',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv')
+)
+# Ações dos índices mundiais, somadas à lista mestre só na busca (vazio desativa)
+SYMBOL_LISTINGS = os.getenv(
+    'SYMBOL_LISTINGS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'listings.csv')
+)
+
+# Similaridade mínima para um resultado aproximado ser retornado
+MIN_SCORE = 0.3
+
+# Palavras ignoradas ao comparar nomes inteiros ("banco brasil" = "Banco do Brasil")
+_CONNECTORS = {'de', 'do', 'da', 'dos', 'das', 'e'}
+
+# Maior que qualquer caractere: fecha o intervalo das palavras com um prefixo
+_LAST_CHAR = chr(0x10FFFF)
+
+ASSET_TYPES = {
+    'B3': 'Ação Brasileira',
+    'US': 'Ação Internacional',
+    'INTL': 'Ação Internacional',
+    'CRYPTO': 'Criptomoeda',
+    'INDEX': 'Índice'
+}
+
+
+def normalize(text):
+    """Minúsculas, sem acentos e só com letras, números e espaços simples"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    text = ''.join(char if char.isalnum() else ' ' for char in text)
+    return ' '.join(text.split())
+
+
+def trigrams(text):
+    """Trigramas da chave com bordas marcadas (' ab' conta como início de palavra)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def base_symbol(symbol):
+    """PETR4.SA -> petr4, BTC-USD -> btc, ^BVSP -> bvsp"""
+    symbol = symbol.lstrip('^').split('.')[0]
+    if symbol.endswith('-USD'):
+        symbol = symbol[:-4]
+    return normalize(symbol)
+
+
+def _read_entries(path):
+    """Linhas do CSV (symbol, name, market e aliases opcionais separados por ';')"""
+    entries = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if not row.get('symbol'):
+                continue
+            aliases = [alias.strip() for alias in (row.get('aliases') or '').split(';') if alias.strip()]
+            entries.append((
+                row['symbol'].strip().upper(),
+                row['name'].strip(),
+                (row.get('market') or '').strip().upper(),
+                aliases
+            ))
+    return entries
+
+
+class SymbolIndex:
+    """Busca aproximada sobre a lista mestre de ativos"""
+
+    def __init__(self, entries):
+        self.entries = entries  # [(símbolo, nome, mercado, apelidos)]
+        self._exact = {}        # símbolo normalizado -> id
+        self._aliases = {}      # apelido normalizado -> id (vence símbolos de outros mercados)
+        self._entry_keys = []   # id -> ids das chaves do ativo (símbolo base, nome e apelidos)
+        self._keys = []         # id da chave -> (chave, ' chave', palavras sem conectivos)
+        self._key_owner = []    # id da chave -> id do ativo
+        self._key_sizes = []    # id da chave -> número de trigramas
+        self._grams = {}        # trigrama -> ids das chaves que o contêm
+
+        postings = {}  # palavra -> ids dos ativos
+        for entry_id, (symbol, name, _, aliases) in enumerate(entries):
+            base = base_symbol(symbol)
+            self._exact.setdefault(normalize(symbol), entry_id)
+            self._exact.setdefault(base, entry_id)
+            for alias in aliases:
+                self._aliases.setdefault(normalize(alias), entry_id)
+
+            first = len(self._keys)
+            for key in dict.fromkeys([base, *(normalize(text) for text in [name, *aliases])]):
+                if not key:
+                    continue
+                key_id = len(self._keys)
+                self._keys.append((key, f" {key}", frozenset(key.split()) - _CONNECTORS))
+                self._key_owner.append(entry_id)
+                grams = trigrams(key)
+                self._key_sizes.append(len(grams))
+                for gram in grams:
+                    self._grams.setdefault(gram, []).append(key_id)
+                for word in key.split():
+                    postings.setdefault(word, set()).add(entry_id)
+            self._entry_keys.append(range(first, len(self._keys)))
+
+        self._words = sorted(postings)
+        self._word_entries = [postings[word] for word in self._words]
+
+    @classmethod
+    def from_file(cls, path=SYMBOL_MASTER, listings=SYMBOL_LISTINGS):
+        """Carrega a lista mestre e, se existir, a de listagens (símbolos repetidos ficam com a mestre)"""
+        entries = _read_entries(path)
+        if listings and os.path.exists(listings):
+            known = {entry[0] for entry in entries}
+            entries += [entry for entry in _read_entries(listings) if entry[0] not in known]
+        return cls(entries)
+
+    def name_of(self, symbol):
+        """Nome do ativo com exatamente esse símbolo, ou None"""
+        entry_id = self._exact.get(normalize(symbol))
+        if entry_id is not None and self.entries[entry_id][0] == symbol.upper():
+            return self.entries[entry_id][1]
+        return None
+
+    def _prefixed(self, word):
+        """Ativos com alguma palavra que começa com `word` (busca binária nas palavras)"""
+        first = bisect.bisect_left(self._words, word)
+        last = bisect.bisect_left(self._words, word + _LAST_CHAR, first)
+        found = set()
+        for entry_ids in self._word_entries[first:last]:
+            found.update(entry_ids)
+        return found
+
+    def _containing(self, word):
+        """Ativos com alguma chave que contém `word` (interseção das listas de trigramas)"""
+        postings = sorted((self._grams.get(word[i:i + 3], ()) for i in range(len(word) - 2)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        key_ids = set(postings[0])
+        for key_list in postings[1:]:
+            key_ids.intersection_update(key_list)
+            if not key_ids:
+                break
+        return {self._key_owner[key_id] for key_id in key_ids}
+
+    def _candidates(self, words, lookup):
+        """Ativos em que todas as palavras da consulta são achadas por `lookup`"""
+        # Conectivos só restringem a busca quando são a consulta inteira
+        words = sorted([word for word in words if word not in _CONNECTORS] or words, key=len, reverse=True)
+        found = lookup(words[0])
+        for word in words[1:]:
+            if not found:
+                break
+            found &= lookup(word)
+        return found
+
+    def _match_score(self, entry_id, key, words):
+        """Nome inteiro 1.2, palavras no início de palavras até 1.1, substrings até 0.6"""
+        best = 0.0
+        whole = set(words) - _CONNECTORS
+        for key_id in self._entry_keys[entry_id]:
+            text, padded, text_words = self._keys[key_id]
+            if text == key or text_words == whole:
+                return 1.2
+            coverage = len(key) / len(text)
+            if all(f" {word}" in padded for word in words):
+                best = max(best, 0.6 + 0.5 * coverage)
+            elif all(word in text for word in words):
+                best = max(best, 0.3 + 0.3 * coverage)
+        return best
+
+    def _fuzzy_scores(self, key):
+        """Similaridade de trigramas (coeficiente de Dice) com a melhor chave de cada ativo"""
+        grams = trigrams(key)
+        size = len(grams)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+
+        scores = {}
+        for key_id, count in shared.items():
+            score = 2 * count / (size + self._key_sizes[key_id])
+            entry_id = self._key_owner[key_id]
+            if score >= MIN_SCORE and score > scores.get(entry_id, 0):
+                scores[entry_id] = score
+        return scores
+
+    def search(self, query, limit=10):
+        """Retorna [(símbolo, nome, mercado, score)] do mais ao menos relevante"""
+        key = normalize(query)
+        if not key or not self.entries:
+            return []
+
+        # Candidatos: palavras que começam com as da consulta, senão que as contêm
+        words = list(dict.fromkeys(key.split()))
+        candidates = self._candidates(words, self._prefixed) or self._candidates(words, self._containing)
+        scores = {}
+        for entry_id in candidates:
+            score = self._match_score(entry_id, key, words)
+            if score >= MIN_SCORE:
+                scores[entry_id] = score
+
+        if not scores:
+            # Nada casou: provavelmente um erro de digitação
+            scores = self._fuzzy_scores(key)
+
+        # Apelido ou símbolo exato vem sempre primeiro ("vale" é a VALE3, não o ADR)
+        exact = self._aliases.get(key, self._exact.get(key))
+        if exact is not None:
+            scores[exact] = 10.0
+
+        # Empates ficam com a ordem dos arquivos: a lista mestre antes das listagens
+        ranked = heapq.nsmallest(limit, scores, key=lambda entry_id: (-scores[entry_id], entry_id))
+        return [
+            self.entries[entry_id][:3] + (round(scores[entry_id], 3),)
+            for entry_id in ranked
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_symbol_index():
+    """Índice compartilhado pelo processo"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SymbolIndex.from_file()
+        return _index
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+import analytics
+
+
+def _frame(dates, closes):
+    return pd.DataFrame({'Close': closes}, index=pd.DatetimeIndex(dates))
+
+
+def _series(days, seed):
+    rng = np.random.default_rng(seed)
+    return 30 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+
+
+def test_mixed_calendars_do_not_change_per_symbol_metrics():
+    """Um ativo que negocia todo dia não muda as métricas de uma ação de pregões úteis"""
+    all_days = pd.date_range('2024-01-01', periods=140, freq='D')
+    weekdays = all_days[all_days.dayofweek < 5]
+
+    petr = _frame(weekdays, _series(weekdays, 1))
+    btc = _frame(all_days, _series(all_days, 2))
+    bvsp = _frame(weekdays, _series(weekdays, 3))
+
+    _, alone_symbols, alone = analytics.price_matrix({'PETR4.SA': petr, '^BVSP': bvsp})
+    alone_metrics = analytics.metrics_by_symbol(
+        alone_symbols, analytics.compute_metrics(alone, benchmark=alone[:, 1])
+    )
+
+    _, mixed_symbols, mixed = analytics.price_matrix({'PETR4.SA': petr, 'BTC-USD': btc, '^BVSP': bvsp})
+    assert np.isnan(mixed[:, 0]).any()  # Fins de semana sem cotação da PETR4
+    mixed_metrics = analytics.metrics_by_symbol(
+        mixed_symbols, analytics.compute_metrics(mixed, benchmark=mixed[:, 2])
+    )
+
+    assert mixed_metrics['PETR4.SA'] == alone_metrics['PETR4.SA']
+    assert mixed_metrics['PETR4.SA']['sma_20'] is not None
+    assert mixed_metrics['PETR4.SA']['observations'] == len(weekdays)
+
+    # O BTC usa todos os seus dias; o beta só as datas em comum com o índice
+    assert mixed_metrics['BTC-USD']['observations'] == len(all_days)
+    assert mixed_metrics['BTC-USD']['beta'] is not None
+    assert mixed_metrics['^BVSP']['beta'] == 1.0
+
+
+def test_pack_keeps_order_and_moves_gaps_to_the_top():
+    matrix = np.array([[1.0, np.nan], [np.nan, 5.0], [3.0, 6.0]])
+    packed = analytics.pack(matrix)
+    assert np.isnan(packed[0]).all()
+    assert packed[1:].tolist() == [[1.0, 5.0], [3.0, 6.0]]
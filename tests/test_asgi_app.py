@@ -0,0 +1,62 @@
+import json
+import asyncio
+
+from asgi_app import _ThreadedWebSocket
+from voice_pipeline import VoicePipeline
+
+
+class _QuartWebSocket:
+    """Lado servidor de um WebSocket do Quart com as mensagens do cliente já enfileiradas"""
+
+    def __init__(self, messages):
+        self.incoming = asyncio.Queue()
+        for message in messages:
+            self.incoming.put_nowait(message)
+        self.sent = []
+
+    async def receive(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise asyncio.CancelledError()  # Cliente desconectou
+        return message
+
+    async def send(self, data):
+        self.sent.append(data)
+
+
+class _Assistant:
+    def transcribe_bytes(self, audio, filename, mime):
+        return 'preço da petr4'
+
+    def stream_chat_with_assistant(self, message, session_id):
+        yield 'A PETR4 está em R$ 38,00.'
+
+    def text_to_speech(self, text):
+        return b'mp3'
+
+
+def test_voice_turn_over_the_quart_websocket():
+    async def scenario():
+        ws = _QuartWebSocket([
+            json.dumps({'type': 'start', 'session_id': 's1', 'mime': 'audio/webm'}),
+            b'audio',
+            json.dumps({'type': 'stop'}),
+        ])
+        bridge = _ThreadedWebSocket(ws, asyncio.get_running_loop())
+        pump = asyncio.create_task(bridge.pump())
+        handler = asyncio.create_task(asyncio.to_thread(VoicePipeline(_Assistant()).handle, bridge))
+
+        while not any('"done"' in message for message in ws.sent if isinstance(message, str)):
+            await asyncio.sleep(0.01)
+        ws.incoming.put_nowait(None)
+        try:
+            await asyncio.wait_for(handler, 2)
+        except ConnectionError:
+            pass
+        pump.cancel()
+        return ws.sent
+
+    sent = asyncio.run(scenario())
+    types = [json.loads(message)['type'] for message in sent if isinstance(message, str)]
+    assert types[0] == 'transcript' and types[-1] == 'done'
+    assert 'delta' in types and b'mp3' in sent
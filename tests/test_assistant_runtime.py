@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import assistant_runtime
+
+
+def _message(role, run_id, text):
+    block = SimpleNamespace(type='text', text=SimpleNamespace(value=text))
+    return SimpleNamespace(role=role, run_id=run_id, content=[block])
+
+
+class _Messages:
+    def __init__(self, messages):
+        self.messages = messages
+        self.filters = None
+
+    def list(self, thread_id, **filters):
+        self.filters = filters
+        return SimpleNamespace(data=self.messages)
+
+
+def _client(messages):
+    return SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(messages=messages)))
+
+
+def test_fallback_never_returns_the_user_question():
+    messages = _Messages([
+        _message('user', None, 'Quanto está a PETR4?'),
+        _message('assistant', 'run_old', 'Resposta anterior'),
+        _message('assistant', 'run_new', 'A PETR4 está em R$ 38,00'),
+    ])
+    client = _client(messages)
+
+    assert assistant_runtime.latest_message_text(client, 'thread', 'run_new') == 'A PETR4 está em R$ 38,00'
+    assert messages.filters['run_id'] == 'run_new'
+    assert assistant_runtime.latest_message_text(client, 'thread') == 'Resposta anterior'
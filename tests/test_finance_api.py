@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from finance_api import FinanceAPI
+from history_store import HistoryStore
+
+
+class _SlowProvider:
+    """Cada chamada ao provedor leva `latency` segundos, com um ou vários símbolos"""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.calls = []
+        self.days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=300)
+
+    def _frame(self, symbol):
+        rng = np.random.default_rng(sum(map(ord, symbol)))
+        prices = 30 * np.exp(np.cumsum(rng.normal(0, 0.02, len(self.days))))
+        frame = pd.DataFrame({column: prices for column in ['Open', 'High', 'Low', 'Close']}, index=self.days)
+        frame['Volume'] = 1000.0
+        return frame
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        time.sleep(self.latency)
+        self.calls.append(('history', symbol))
+        return self._frame(symbol)
+
+    def download(self, symbols, period='5d', interval='1d'):
+        time.sleep(self.latency)
+        self.calls.append(('download', tuple(symbols)))
+        return {symbol: self._frame(symbol) for symbol in symbols}
+
+
+def test_analyze_stocks_downloads_missing_histories_in_one_batch(tmp_path):
+    provider = _SlowProvider()
+    api = FinanceAPI(provider=provider, history_store=HistoryStore(str(tmp_path), provider))
+    symbols = ['PETR4.SA', 'VALE3.SA', 'ITUB4.SA', 'BBDC4.SA', 'WEGE3.SA']
+
+    started = time.monotonic()
+    result = api.analyze_stocks(symbols)
+    elapsed = time.monotonic() - started
+
+    assert provider.calls == [('download', (*symbols, '^BVSP'))]
+    assert elapsed < 3 * provider.latency  # um por símbolo levaria 6 x latência
+    assert sorted(result['metrics']) == sorted(symbols)
+    assert result['missing'] == []
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from history_store import HistoryStore
+
+
+class _Provider:
+    """Provedor com preços ajustados por um fator (muda após um provento)"""
+
+    def __init__(self):
+        self.factor = 1.0
+        self.periods = []
+        self.days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=300)
+
+    def history(self, symbol, period='1mo', interval='1d'):
+        self.periods.append(period)
+        prices = np.linspace(10, 20, len(self.days)) * self.factor
+        frame = pd.DataFrame({column: prices for column in ['Open', 'High', 'Low', 'Close']}, index=self.days)
+        frame['Volume'] = 1000.0
+        return frame.tail({'5d': 5, '1mo': 21}.get(period, len(self.days)))
+
+
+def test_new_adjustment_triggers_full_download(tmp_path):
+    provider = _Provider()
+    store = HistoryStore(str(tmp_path), provider, refresh_interval=0)
+
+    store.history('PETR4.SA', '1y')
+    store.history('PETR4.SA', '1y')
+    assert provider.periods == ['max', '1mo']
+    assert store.stats()['adjustment_reloads'] == 0
+
+    # Provento: o provedor reajusta toda a série passada
+    provider.factor = 0.9
+    closes = store.history('PETR4.SA', 'max')['Close']
+    assert provider.periods[-1] == 'max'
+    assert store.stats()['adjustment_reloads'] == 1
+    assert closes.iloc[0] == 9.0 and closes.iloc[-1] == 18.0
+
+
+def test_day_periods_count_stored_sessions(tmp_path):
+    provider = _Provider()
+    # Cripto: negocia todo dia, e o último pregão salvo cai num sábado
+    provider.days = pd.date_range(end='2026-10-17', periods=30, freq='D')
+    store = HistoryStore(str(tmp_path), provider, refresh_interval=3600)
+
+    assert list(store.history('BTC-USD', '1d').index) == [pd.Timestamp('2026-10-17')]
+    assert len(store.history('BTC-USD', '5d')) == 5
+    assert len(store.history('BTC-USD', '100d')) == 30
@@ -0,0 +1,38 @@
+from intent_router import IntentRouter
+
+
+class _FinanceAPI:
+    def get_quotes(self, symbols):
+        return {
+            symbol: {
+                'symbol': symbol, 'name': 'Johnson & Johnson', 'currency': 'USD',
+                'current_price': 150.0, 'previous_close': 148.0, 'change': 2.0,
+                'change_percent': 1.35, 'day_high': 151.0, 'day_low': 147.5
+            }
+            for symbol in symbols
+        }
+
+    def get_market_summary(self):
+        return [
+            {'symbol': '^BVSP', 'name': 'Ibovespa', 'price': 128000.0, 'change': 500.0, 'change_percent': 0.39},
+            {'symbol': '^GSPC', 'name': 'S&P 500', 'price': 5000.0, 'change': -10.0, 'change_percent': -0.2}
+        ]
+
+
+def test_vale_resolves_to_the_b3_listing():
+    router = IntentRouter(_FinanceAPI())
+    assert router.parse('preço da vale') == ('price', ['VALE3.SA'])
+    assert router.parse('quanto a Vale subiu hoje?') == ('change', ['VALE3.SA'])
+
+
+def test_answers_use_the_html_the_pages_render():
+    router = IntentRouter(_FinanceAPI(), enabled=True)
+
+    answer = router.route('preço da JNJ')
+    assert '<b>Johnson &amp; Johnson</b> (JNJ)' in answer
+    assert '**' not in answer
+
+    summary = router.route('como está o mercado?')
+    assert summary.startswith('📊 <b>Resumo do mercado</b><br>')
+    assert summary.count('<br>') == 2
+    assert 'S&amp;P 500' in summary and '\n' not in summary
@@ -0,0 +1,13 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from prefetcher import seconds_until_open
+
+SAO_PAULO = ZoneInfo('America/Sao_Paulo')
+
+
+def test_seconds_until_open_before_the_bell_and_over_the_weekend():
+    assert seconds_until_open('B3', datetime(2026, 10, 16, 9, 55, tzinfo=SAO_PAULO)) == 5 * 60
+    # Sexta depois do fechamento: próxima abertura na segunda às 10h
+    assert seconds_until_open('B3', datetime(2026, 10, 16, 18, 30, tzinfo=SAO_PAULO)) == 63.5 * 3600
+    assert seconds_until_open('CRYPTO') is None
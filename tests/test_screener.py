@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+import screener
+from screener import Screener
+
+UNIVERSE = [
+    ('PETR4.SA', 'Petrobras PN', 'B3'),
+    ('AAPL', 'Apple', 'US'),
+    ('BTC-USD', 'Bitcoin', 'CRYPTO'),
+    ('NOVA3.SA', 'Sem cotação', 'B3'),
+]
+
+
+class _Provider:
+    def __init__(self):
+        self.requested = []
+        self.days = pd.bdate_range(end='2026-10-16', periods=30)
+
+    def download(self, symbols, period='5d', interval='1d'):
+        self.requested.append(list(symbols))
+        frames = {}
+        for symbol in symbols:
+            closes = np.linspace(10, 20, len(self.days))
+            if symbol == 'NOVA3.SA':
+                # Só o último fechamento: sem variação, mas com histórico de volume
+                closes[:-1] = np.nan
+            frames[symbol] = pd.DataFrame({'Close': closes, 'Volume': 100.0}, index=self.days)
+        return frames
+
+
+def test_rank_returns_none_for_missing_values():
+    results = Screener(_Provider(), UNIVERSE).rank('volume_spike', limit=10)
+    new = next(result for result in results if result['symbol'] == 'NOVA3.SA')
+    assert new['price'] == 20.0
+    assert new['change_percent'] is None
+
+
+def test_refresh_skips_closed_markets(monkeypatch):
+    provider = _Provider()
+    scanner = Screener(provider, UNIVERSE, refresh_interval=0)
+    scanner.refresh()
+
+    # Fim de semana: só a cripto negocia
+    monkeypatch.setattr(screener, 'is_market_open', lambda market: market == 'CRYPTO')
+    scanner._refresh_due()
+    assert provider.requested[-1] == ['BTC-USD']
+    assert scanner.rank('change', market='B3', limit=1)[0]['symbol'] == 'PETR4.SA'
+
+    # Tudo fechado: nada é baixado
+    monkeypatch.setattr(screener, 'is_market_open', lambda market: False)
+    scanner._refresh_due()
+    assert len(provider.requested) == 2
+    assert scanner.stats()['skipped_builds'] == 1
@@ -0,0 +1,40 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from session_store import SessionStore, SQLiteSessionBackend, ThreadRegistry
+
+
+def test_reads_refresh_the_persisted_access_time(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SessionStore(SQLiteSessionBackend(path), touch_interval=0)
+    store.save('abc', 'thread_1')
+
+    # Sessão em uso contínuo, mas só lida (como o thread_id de uma conversa)
+    backend = SQLiteSessionBackend(path)
+    backend.touch('abc', time.time() - 7200)
+    store.get('abc')
+
+    # Depois de um reinício ela continua dentro do prazo de inatividade
+    restarted = SessionStore(SQLiteSessionBackend(path), idle_timeout=3600)
+    assert restarted.get('abc') == 'thread_1'
+
+
+def test_failed_create_does_not_block_the_session():
+    registry = ThreadRegistry(SessionStore())
+
+    def failing():
+        raise RuntimeError('API indisponível')
+
+    with pytest.raises(RuntimeError):
+        registry.get_or_create('abc', failing)
+    assert registry.get_or_create('abc', lambda: SimpleNamespace(id='thread_1')) == 'thread_1'
+
+    async def acreate():
+        raise RuntimeError('API indisponível')
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(registry.aget_or_create('xyz', acreate))
+    assert not registry._pending and not registry._apending
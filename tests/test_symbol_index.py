@@ -0,0 +1,31 @@
+from symbol_index import SymbolIndex, get_symbol_index
+
+
+def test_names_accents_and_typos_resolve_to_the_same_asset():
+    index = get_symbol_index()
+    assert index.search('Itaú', limit=1)[0][0] == 'ITUB4.SA'
+    assert index.search('itau', limit=1)[0][0] == 'ITUB4.SA'
+    assert index.search('banco brasil', limit=1)[0][:2] == ('BBAS3.SA', 'Banco do Brasil')
+    assert index.search('petrobas', limit=1)[0][0] == 'PETR4.SA'
+    assert index.search('vale', limit=1)[0][0] == 'VALE3.SA'
+    assert index.name_of('VALE') == 'Vale ADR'
+
+
+def test_listings_extend_the_curated_master():
+    index = get_symbol_index()
+    assert len(index.entries) > 1500
+    assert index.search('toyota', limit=1)[0][:3] == ('7203.T', 'Toyota', 'INTL')
+    assert index.search('mircosoft', limit=1)[0][0] == 'MSFT'
+    # Empate no nome inteiro: a lista curada vem antes das listagens
+    assert index.search('vale', limit=2)[1][0] == 'VALE'
+
+
+def test_prefix_lookup_only_touches_matching_words():
+    index = SymbolIndex([
+        ('AAA', 'Alpha Mining', 'US', []),
+        ('BBB', 'Beta Alpha', 'US', []),
+        ('CCC', 'Gamma', 'US', []),
+    ])
+    assert index._prefixed('alp') == {0, 1}
+    assert index._prefixed('zzz') == set()
+    assert {result[0] for result in index.search('alpha')} == {'AAA', 'BBB'}
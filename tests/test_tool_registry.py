@@ -0,0 +1,26 @@
+import time
+
+from assistant_runtime import TOOL_CALL_WORKERS
+from tool_registry import ToolSet
+
+
+def test_single_call_respects_the_timeout():
+    tools = ToolSet(None, names=['get_stock_info'],
+                    overrides={'get_stock_info': lambda symbol: time.sleep(2) or {'symbol': symbol}})
+
+    started = time.monotonic()
+    results = tools.execute_many([('get_stock_info', {'symbol': 'PETR4.SA'})], timeout=0.2)
+
+    assert time.monotonic() - started < 1
+    assert results == [{'error': 'Tempo esgotado ao executar get_stock_info'}]
+
+
+def test_queued_calls_get_their_full_timeout():
+    # Três levas de chamadas: as da última esperam duas na fila
+    tools = ToolSet(None, names=['get_stock_info'],
+                    overrides={'get_stock_info': lambda symbol: time.sleep(0.3) or {'symbol': symbol}})
+    calls = [('get_stock_info', {'symbol': f'S{i}'}) for i in range(3 * TOOL_CALL_WORKERS)]
+
+    results = tools.execute_many(calls, timeout=0.5)
+
+    assert results == [{'symbol': f'S{i}'} for i in range(3 * TOOL_CALL_WORKERS)]
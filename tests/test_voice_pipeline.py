@@ -0,0 +1,70 @@
+import os
+import time
+
+from voice_pipeline import IncrementalTranscriber
+
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'speech.webm')
+CLUSTER = b'\x1f\x43\xb6\x75'
+
+
+def test_partials_send_a_bounded_window_and_the_final_pass_sends_everything():
+    sent = []
+
+    def transcribe(audio, filename, mime):
+        sent.append(audio)
+        return f"{len(audio)} bytes"
+
+    transcriber = IncrementalTranscriber(transcribe, interval=0, window=0.05)
+    transcriber.add(b'H' * 10)  # Primeiro pedaço: cabeçalho do contêiner
+    for _ in range(20):
+        transcriber.add(CLUSTER + b'a' * 96)  # Um cluster por pedaço
+        transcriber._partial.result()
+        transcriber.poll()
+        time.sleep(0.01)
+
+    partials = list(sent)
+    assert max(len(audio) for audio in partials) < 1000
+    assert all(audio.startswith(b'H' * 10) for audio in partials)
+
+    assert transcriber.finish() == '2010 bytes'
+    assert sent[-1] == transcriber.audio
+
+
+def test_webm_partials_are_cut_on_cluster_boundaries():
+    # Gravação real: 8 s de Opus em WebM ao vivo, um cluster por segundo
+    with open(FIXTURE, 'rb') as f:
+        recording = f.read()
+    header = recording[:recording.index(CLUSTER)]
+
+    sent = []
+    transcriber = IncrementalTranscriber(
+        lambda audio, filename, mime: sent.append(audio) or 'ok',
+        mime='audio/webm;codecs=opus', interval=0, window=0.03
+    )
+    # Pedaços de tamanho arbitrário, como os do MediaRecorder
+    for start in range(0, len(recording), 700):
+        transcriber.add(recording[start:start + 700])
+        transcriber._partial.result()
+        transcriber.poll()
+        time.sleep(0.01)
+
+    windows = [audio for audio in sent if audio != recording[:len(audio)]]
+    assert windows and max(len(audio) for audio in windows) < len(recording) // 2
+    for audio in windows:
+        assert audio.startswith(header + CLUSTER)
+        assert audio[len(header):] in recording
+
+    assert transcriber.finish() == 'ok'
+    assert sent[-1] == recording
+
+
+def test_failed_partials_are_counted():
+    def transcribe(audio, filename, mime):
+        raise ValueError('Invalid file format')
+
+    transcriber = IncrementalTranscriber(transcribe, interval=0)
+    transcriber.add(b'H' * 10)
+    transcriber._partial.exception()
+    assert transcriber.poll() is None
+    assert transcriber.failures == 1
@@ -0,0 +1,72 @@
+"""
+Serialização compacta dos resultados de ferramentas enviados ao modelo
+
+Cada resultado fica no prompt de todas as rodadas seguintes da sessão, então
+cada token conta: campos ausentes ('N/A', None, '') saem, números são
+arredondados à precisão que importa e listas de registros com as mesmas
+chaves viram tabela (colunas uma vez, depois só as linhas). Usa orjson
+quando instalado.
+"""
+
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, str) and value in ('N/A', ''))
+
+
+def round_number(value):
+    """Inteiro a partir de 1000, 2 casas a partir de 1, 3 algarismos significativos abaixo"""
+    if math.isnan(value) or math.isinf(value):
+        return None
+    magnitude = abs(value)
+    if magnitude >= 1000:
+        return int(round(value))
+    if magnitude >= 1:
+        return round(value, 2)
+    if magnitude == 0:
+        return 0
+    return float(f"{value:.3g}")
+
+
+def compact(value):
+    """Versão enxuta de um resultado (dicts, listas e números)"""
+    if isinstance(value, dict):
+        return {key: compact(item) for key, item in value.items() if not _is_missing(item)}
+
+    if isinstance(value, (list, tuple)):
+        items = [compact(item) for item in value]
+        if len(items) > 1 and all(isinstance(item, dict) for item in items):
+            # Registros viram tabela: as chaves aparecem uma única vez
+            columns = list(dict.fromkeys(key for item in items for key in item))
+            return {'columns': columns, 'rows': [[item.get(key) for key in columns] for item in items]}
+        return items
+
+    if isinstance(value, float):
+        return round_number(value)
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        # Escalares do NumPy/pandas
+        return compact(value.item())
+    return value
+
+
+def _default(value):
+    """Tipos que o JSON não conhece (datas, Timestamps) viram texto"""
+    return str(value)
+
+
+def encode(result):
+    """Texto JSON compacto de um resultado; textos prontos passam direto"""
+    if isinstance(result, str):
+        return result
+
+    data = compact(result)
+    if orjson is not None:
+        return orjson.dumps(data, default=_default).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_default)
@@ -0,0 +1,225 @@
+"""
+Registro único das ferramentas financeiras expostas ao modelo
+
+Cada função é declarada uma vez (schema, execução padrão sobre a FinanceAPI,
+timeout e se a resposta pode ir para o cache de respostas). Os payloads no
+formato antigo (`functions`) e no atual (`tools`) são montados na importação
+e reaproveitados por app.py, app_assistant.py, speech_app.py e pelos CLIs.
+"""
+
+import json
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from finance_api import FinanceAPI
+from assistant_runtime import TOOL_CALL_WORKERS, TOOL_CALL_TIMEOUT, TimedCall
+from tool_output import encode
+
+# Pool das execuções em paralelo pedidas numa mesma resposta do modelo
+_executor = ThreadPoolExecutor(max_workers=TOOL_CALL_WORKERS, thread_name_prefix='tool')
+
+
+class Tool:
+    """Uma função exposta ao modelo"""
+
+    def __init__(self, name, description, properties=None, required=(), handler=None,
+                 timeout=None, cacheable=True):
+        self.name = name
+        self.handler = handler      # handler(finance_api, **argumentos)
+        self.timeout = timeout      # None usa o TOOL_CALL_TIMEOUT do assistant_runtime
+        self.cacheable = cacheable  # Respostas que a usam podem entrar no ResponseCache
+        self.properties = properties or {}
+
+        # Payloads prontos, montados uma única vez
+        self.function = {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": self.properties,
+                "required": list(required)
+            }
+        }
+        self.tool = {"type": "function", "function": self.function}
+
+
+def _screen_stocks(finance_api, criterion='change', market=None, limit=10, order='desc'):
+    return finance_api.screen_stocks(criterion, market, min(int(limit), 50), order)
+
+
+_SYMBOL = {"type": "string", "description": "Símbolo da ação (ex: PETR4.SA, AAPL, BTC-USD)"}
+
+TOOLS = {tool.name: tool for tool in [
+    Tool(
+        "get_stock_info",
+        "Obtém a cotação atual de uma ação: preço, variação, volume, máxima e mínima do dia",
+        {"symbol": _SYMBOL},
+        required=["symbol"],
+        handler=FinanceAPI.get_stock_info
+    ),
+    Tool(
+        "get_stock_fundamentals",
+        "Obtém fundamentos de uma ação (P/L, valor de mercado, dividend yield, P/VP, setor, "
+        "máxima e mínima de 52 semanas). Use só quando a pergunta envolver esses dados",
+        {"symbol": _SYMBOL},
+        required=["symbol"],
+        handler=FinanceAPI.get_fundamentals
+    ),
+    Tool(
+        "get_stock_history",
+        "Obtém histórico de preços de uma ação",
+        {
+            "symbol": _SYMBOL,
+            "period": {
+                "type": "string",
+                "description": "Período: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max",
+                "default": "1mo"
+            }
+        },
+        required=["symbol"],
+        handler=FinanceAPI.get_stock_history
+    ),
+    Tool(
+        "search_stocks",
+        "Busca ações por nome ou símbolo",
+        {"query": {"type": "string", "description": "Nome ou símbolo da empresa/ação para buscar"}},
+        required=["query"],
+        handler=FinanceAPI.search_stocks
+    ),
+    Tool(
+        "get_market_summary",
+        "Obtém resumo dos principais índices do mercado",
+        handler=FinanceAPI.get_market_summary
+    ),
+    Tool(
+        "get_trending_stocks",
+        "Obtém lista de ações em alta/tendência",
+        handler=FinanceAPI.get_trending_stocks
+    ),
+    Tool(
+        "screen_stocks",
+        "Ranqueia centenas de ações da B3, EUA e criptomoedas por variação do dia, pico de volume ou momentum (20 pregões)",
+        {
+            "criterion": {
+                "type": "string",
+                "enum": ["change", "volume_spike", "momentum"],
+                "description": "Critério: change (variação do dia), volume_spike (volume vs média de 20 pregões) ou momentum (retorno em 20 pregões)"
+            },
+            "market": {
+                "type": "string",
+                "enum": ["B3", "US", "CRYPTO"],
+                "description": "Filtra por mercado (omita para todos)"
+            },
+            "order": {
+                "type": "string",
+                "enum": ["desc", "asc"],
+                "description": "desc para maiores altas, asc para maiores quedas",
+                "default": "desc"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Quantidade de resultados (máx. 50)",
+                "default": 10
+            }
+        },
+        required=["criterion"],
+        handler=_screen_stocks,
+        timeout=20
+    ),
+    Tool(
+        "analyze_stocks",
+        "Calcula métricas históricas de vários ativos de uma vez: retorno, volatilidade anualizada, "
+        "drawdown máximo, médias móveis, RSI e beta contra um índice",
+        {
+            "symbols": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Lista de símbolos (ex: PETR4.SA, VALE3.SA, AAPL)"
+            },
+            "period": {
+                "type": "string",
+                "description": "Período: 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max",
+                "default": "1y"
+            },
+            "benchmark": {
+                "type": "string",
+                "description": "Índice de referência para o beta (^BVSP ou ^GSPC)",
+                "default": "^BVSP"
+            }
+        },
+        required=["symbols"],
+        handler=FinanceAPI.analyze_stocks,
+        timeout=30,
+        # Revalidar no cache de respostas exigiria recalcular tudo de novo
+        cacheable=False
+    ),
+]}
+
+# Payloads completos, prontos na importação
+FINANCE_FUNCTIONS = [tool.function for tool in TOOLS.values()]
+FINANCE_TOOLS = [tool.tool for tool in TOOLS.values()]
+
+
+class ToolSet:
+    """Ferramentas de uma aplicação: payloads prontos e despacho por dicionário
+
+    `target` é a FinanceAPI usada pelas execuções padrão; `overrides` troca a
+    execução de algumas ferramentas (ex.: os CLIs formatam suas próprias
+    respostas) e recebe apenas os argumentos.
+    """
+
+    def __init__(self, target, names=None, overrides=None):
+        self.tools = [TOOLS[name] for name in (names or TOOLS)]
+        self.functions = [tool.function for tool in self.tools]
+        self.payload = [tool.tool for tool in self.tools]
+
+        self._tools = {tool.name: tool for tool in self.tools}
+        self._handlers = {tool.name: partial(tool.handler, target) for tool in self.tools}
+        self._handlers.update(overrides or {})
+
+    def execute(self, name, arguments):
+        """Executa a ferramenta; erros viram {"error": ...} para o modelo"""
+        tool = self._tools.get(name)
+        if tool is None:
+            return {"error": "Função não encontrada"}
+
+        # Ignora argumentos inventados pelo modelo
+        arguments = {key: value for key, value in (arguments or {}).items() if key in tool.properties}
+        try:
+            return self._handlers[name](**arguments)
+        except Exception as e:
+            return {"error": f"Erro ao executar {name}: {str(e)}"}
+
+    def execute_many(self, calls, timeout=TOOL_CALL_TIMEOUT):
+        """Executa [(nome, argumentos)] em paralelo e devolve os resultados na ordem
+
+        Mesmo uma chamada só passa pelo pool, para respeitar o timeout, que
+        conta a partir do início de cada chamada (não do envio do lote).
+        """
+        submitted = [TimedCall(_executor, self.execute, name, arguments) for name, arguments in calls]
+
+        results = []
+        for (name, _), call in zip(calls, submitted):
+            try:
+                results.append(call.result(self.timeout_for(name) or timeout))
+            except FutureTimeoutError:
+                results.append({"error": f"Tempo esgotado ao executar {name}"})
+        return results
+
+    def __call__(self, tool_call):
+        """Handler de tool calls da Assistants API (retorna o texto da saída)"""
+        try:
+            arguments = json.loads(tool_call.function.arguments or "{}")
+        except ValueError:
+            return encode({"error": "Argumentos inválidos"})
+
+        return encode(self.execute(tool_call.function.name, arguments))
+
+    def timeout_for(self, name):
+        """Timeout próprio da ferramenta, ou None para o padrão"""
+        tool = self._tools.get(name)
+        return tool.timeout if tool else None
+
+    def cacheable(self, names):
+        """Indica se uma resposta gerada com essas ferramentas pode ir para o cache"""
+        return all(name in self._tools and self._tools[name].cacheable for name in names)
@@ -0,0 +1,381 @@
+"""
+Pipeline de voz em uma única conexão WebSocket
+
+Em vez de três idas e voltas (/transcribe, /chat, /speak), o navegador envia
+o áudio em pedaços enquanto o usuário fala. O servidor transcreve parcialmente
+em segundo plano, manda a transcrição final direto para o assistente e começa
+a sintetizar a fala assim que a primeira frase da resposta fica pronta.
+As mesmas peças (SentenceChunker, SpeechQueue) alimentam o /speak, que
+transmite o MP3 frase a frase em vez de esperar o áudio inteiro.
+
+Protocolo (mensagens de texto são JSON):
+    cliente -> {"type": "start", "session_id": "...", "mime": "audio/webm"}
+    cliente -> pedaços binários de áudio
+    cliente -> {"type": "stop"}
+    servidor -> {"type": "partial", "text": "..."}       transcrição parcial
+    servidor -> {"type": "transcript", "text": "..."}    transcrição final
+    servidor -> {"type": "delta", "text": "..."}         trecho da resposta
+    servidor -> {"type": "audio", "index": n, "text": "..."} seguido do MP3 binário
+    servidor -> {"type": "done"} | {"type": "error", "message": "..."}
+"""
+
+import os
+import re
+import json
+import time
+import bisect
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Intervalo (segundos) entre transcrições parciais durante a fala
+VOICE_PARTIAL_INTERVAL = float(os.getenv('VOICE_PARTIAL_INTERVAL', '1.5'))
+# Segundos finais de áudio enviados em cada transcrição parcial
+VOICE_PARTIAL_WINDOW = float(os.getenv('VOICE_PARTIAL_WINDOW', '6'))
+# Limite de upload da API de transcrição
+VOICE_MAX_AUDIO_BYTES = int(os.getenv('VOICE_MAX_AUDIO_BYTES', str(25 * 1024 * 1024)))
+# Sínteses de fala em paralelo por resposta
+TTS_WORKERS = int(os.getenv('TTS_WORKERS', '3'))
+# Frases muito curtas são juntadas à seguinte (menos chamadas de TTS)
+SENTENCE_MIN_CHARS = int(os.getenv('SENTENCE_MIN_CHARS', '40'))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+|\n+')
+_MARKUP = re.compile(r'<[^>]+>|[*_#`]+')
+
+_EXTENSIONS = {'audio/webm': 'webm', 'audio/ogg': 'ogg', 'audio/mp4': 'mp4', 'audio/wav': 'wav'}
+# Início das unidades que decodificam sozinhas depois do cabeçalho do contêiner:
+# (marcador, bytes do início da unidade até o marcador)
+_BOUNDARIES = {
+    'audio/webm': (b'\x1f\x43\xb6\x75', 0),  # Cluster do Matroska
+    'audio/mp4': (b'moof', 4)                  # Fragmento do MP4 (o tamanho da caixa vem antes)
+}
+
+
+def speech_text(text):
+    """Remove HTML e marcações de Markdown que não devem ser lidas em voz alta"""
+    return ' '.join(_MARKUP.sub(' ', text).split())
+
+
+class SentenceChunker:
+    """Agrupa o texto que chega em trechos com frases completas"""
+
+    def __init__(self, min_chars=SENTENCE_MIN_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ''
+
+    def feed(self, text):
+        """Acrescenta texto e retorna os trechos já completos"""
+        self._buffer += text
+        parts = _SENTENCE_END.split(self._buffer)
+        # O último pedaço ainda pode estar no meio de uma frase
+        self._buffer = parts.pop()
+
+        chunks = []
+        pending = ''
+        for part in parts:
+            pending = f"{pending} {part}".strip()
+            if len(pending) >= self.min_chars:
+                chunks.append(pending)
+                pending = ''
+        if pending:
+            # Frase curta demais: volta para o buffer e sai junto com a próxima
+            self._buffer = f"{pending} {self._buffer}"
+        return chunks
+
+    def flush(self):
+        """Retorna o que sobrou no buffer"""
+        rest, self._buffer = self._buffer.strip(), ''
+        return [rest] if rest else []
+
+
+def split_sentences(text, min_chars=SENTENCE_MIN_CHARS):
+    """Divide um texto completo em trechos prontos para o TTS"""
+    chunker = SentenceChunker(min_chars)
+    chunks = chunker.feed(text) + chunker.flush()
+    return [spoken for spoken in map(speech_text, chunks) if spoken]
+
+
+class SpeechQueue:
+    """Sintetiza frases em paralelo (pool limitado) e entrega os áudios na ordem"""
+
+    def __init__(self, text_to_speech, workers=TTS_WORKERS):
+        self.text_to_speech = text_to_speech
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tts')
+        self._pending = deque()  # (índice, texto, Future) na ordem das frases
+        self.submitted = 0
+
+    def submit(self, sentences):
+        """Agenda a síntese das frases"""
+        for sentence in sentences:
+            spoken = speech_text(sentence)
+            if spoken:
+                future = self._executor.submit(self.text_to_speech, spoken)
+                self._pending.append((self.submitted, spoken, future))
+                self.submitted += 1
+
+    def ready(self, block=False):
+        """Gera (índice, texto, áudio) na ordem; sem `block`, para na primeira frase pendente"""
+        while self._pending and (block or self._pending[0][2].done()):
+            index, spoken, future = self._pending.popleft()
+            audio = future.result()
+            if audio:
+                yield index, spoken, audio
+
+    def close(self):
+        """Descarta o que não foi entregue e libera o pool"""
+        for _, _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def astream_speech(sentences, atext_to_speech, workers=TTS_WORKERS):
+    """Versão assíncrona de SpeechQueue: gera os áudios das frases na ordem"""
+    semaphore = asyncio.Semaphore(workers)
+
+    async def synthesize(sentence):
+        async with semaphore:
+            return await atext_to_speech(sentence)
+
+    tasks = [asyncio.create_task(synthesize(sentence)) for sentence in sentences]
+    try:
+        for task in tasks:
+            audio = await task
+            if audio:
+                yield audio
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class IncrementalTranscriber:
+    """Acumula o áudio recebido e transcreve parcialmente em segundo plano
+
+    Cada parcial envia o cabeçalho do contêiner (tudo antes do primeiro
+    cluster do WebM ou fragmento do MP4) seguido dos clusters que cobrem os
+    últimos `window` segundos, então o custo de uma parcial não cresce com a
+    duração da fala e o trecho enviado continua decodificável. Em formatos
+    sem essas divisões a parcial leva todo o áudio. O áudio completo é
+    transcrito uma única vez, no fim.
+    """
+
+    def __init__(self, transcribe, mime='audio/webm', interval=VOICE_PARTIAL_INTERVAL,
+                 window=VOICE_PARTIAL_WINDOW):
+        self.transcribe = transcribe
+        self.mime = mime.split(';')[0]
+        self.interval = interval
+        self.window = window
+        self.audio = bytearray()
+        self.failures = 0             # Parciais que a API não conseguiu transcrever
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='voice-partial')
+        self._marker, self._marker_offset = _BOUNDARIES.get(self.mime, (None, 0))
+        self._boundaries = []         # Posições onde começa cada cluster/fragmento
+        self._scanned = 0             # Bytes já procurados pelo marcador
+        self._chunks = deque()        # (chegada, posição inicial) dos pedaços recebidos
+        self._partial = None          # Future da transcrição parcial em andamento
+        self._partial_size = None     # Bytes cobertos pela parcial em andamento (None: só o fim)
+        self._last_text = ''
+        self._last_size = None        # Bytes cobertos por `_last_text`, se ela cobre todo o áudio
+        self._last_started = time.monotonic()
+
+    @property
+    def filename(self):
+        return f"speech.{_EXTENSIONS.get(self.mime, 'webm')}"
+
+    def _scan(self):
+        """Acha os clusters/fragmentos que começam nos bytes recém-chegados"""
+        if self._marker is None:
+            return
+        position = self.audio.find(self._marker, max(self._marker_offset, self._scanned - len(self._marker) + 1))
+        while position >= 0:
+            self._boundaries.append(position - self._marker_offset)
+            position = self.audio.find(self._marker, position + 1)
+        self._scanned = len(self.audio)
+
+    def _recent_audio(self):
+        """Cabeçalho + clusters da janela; retorna (áudio, cobre tudo?)"""
+        cutoff = time.monotonic() - self.window
+        while self._chunks and self._chunks[0][0] < cutoff:
+            self._chunks.popleft()
+
+        # Recua até o início do cluster que contém o primeiro byte da janela
+        start = self._chunks[0][1] if self._chunks else len(self.audio)
+        index = bisect.bisect_right(self._boundaries, start) - 1
+        if index <= 0:
+            return bytes(self.audio), True
+        header = self._boundaries[0]
+        return bytes(self.audio[:header] + self.audio[self._boundaries[index]:]), False
+
+    def add(self, data):
+        """Recebe um pedaço de áudio; dispara uma parcial se já passou o intervalo"""
+        if len(self.audio) + len(data) > VOICE_MAX_AUDIO_BYTES:
+            raise ValueError('Áudio muito longo')
+        self._chunks.append((time.monotonic(), len(self.audio)))
+        self.audio.extend(data)
+        self._scan()
+
+        if self._partial is None and time.monotonic() - self._last_started >= self.interval:
+            audio, complete = self._recent_audio()
+            self._partial_size = len(self.audio) if complete else None
+            self._partial = self._executor.submit(self.transcribe, audio, self.filename, self.mime)
+            self._last_started = time.monotonic()
+
+    def poll(self):
+        """Texto de uma parcial recém-concluída, ou None"""
+        if self._partial is None or not self._partial.done():
+            return None
+        future, self._partial = self._partial, None
+        try:
+            text = future.result()
+        except Exception as e:
+            # A final ainda transcreve o áudio inteiro, mas a falha precisa aparecer
+            self.failures += 1
+            print(f"⚠️ Transcrição parcial falhou ({self.mime}, {len(self.audio)} bytes): {e}")
+            return None
+        self._last_text, self._last_size = text, self._partial_size
+        return text
+
+    def finish(self):
+        """Transcrição final de todo o áudio recebido"""
+        if self._partial is not None:
+            if self._partial_size == len(self.audio):
+                # Fala curta: a parcial em andamento já cobre todo o áudio
+                wait([self._partial])
+                self.poll()
+            else:
+                self._partial.cancel()
+                self._partial = None
+        self._executor.shutdown(wait=False)
+
+        if self._last_text and self._last_size == len(self.audio):
+            return self._last_text
+        if not self.audio:
+            return ''
+        return self.transcribe(bytes(self.audio), self.filename, self.mime)
+
+
+class VoicePipeline:
+    """Conduz turnos de voz (áudio -> transcrição -> resposta -> fala) em um WebSocket
+
+    `assistant` precisa oferecer `transcribe_bytes(audio, filename, mime)`,
+    `stream_chat_with_assistant(message, session_id)` e `text_to_speech(text)`.
+    """
+
+    def __init__(self, assistant, tts_workers=TTS_WORKERS):
+        self.assistant = assistant
+        self.tts_workers = tts_workers
+        self._lock = threading.Lock()
+        self._stats = {
+            'turns': 0,
+            'errors': 0,
+            'partials': 0,
+            'partial_errors': 0,
+            'tts_chunks': 0,
+            'transcribe_seconds': 0.0,
+            'first_audio_seconds': 0.0
+        }
+
+    def _send(self, ws, message_type, **fields):
+        ws.send(json.dumps({'type': message_type, **fields}, ensure_ascii=False))
+
+    def handle(self, ws):
+        """Atende a conexão até o cliente fechá-la (vários turnos por conexão)"""
+        while True:
+            message = ws.receive()
+            if message is None:
+                return
+            if isinstance(message, bytes):
+                continue  # Áudio fora de um turno
+
+            data = json.loads(message)
+            if data.get('type') != 'start':
+                continue
+            try:
+                self._turn(ws, data.get('session_id', 'default'), data.get('mime', 'audio/webm'))
+            except Exception as e:
+                if not getattr(ws, 'connected', True):
+                    return  # Cliente desconectou no meio do turno
+                with self._lock:
+                    self._stats['errors'] += 1
+                self._send(ws, 'error', message=str(e))
+
+    def _turn(self, ws, session_id, mime):
+        """Um turno completo de conversa por voz"""
+        transcriber = IncrementalTranscriber(self.assistant.transcribe_bytes, mime)
+
+        # 1. Recebe o áudio enquanto o usuário fala, com transcrições parciais
+        while True:
+            message = ws.receive(timeout=0.2)
+            if isinstance(message, bytes):
+                transcriber.add(message)
+            elif message is not None and json.loads(message).get('type') == 'stop':
+                break
+
+            partial = transcriber.poll()
+            if partial:
+                with self._lock:
+                    self._stats['partials'] += 1
+                self._send(ws, 'partial', text=partial)
+
+        # 2. Transcrição final: o áudio já chegou, falta só a última chamada
+        stopped_at = time.perf_counter()
+        transcript = transcriber.finish().strip()
+        transcribed_at = time.perf_counter()
+        if transcriber.failures:
+            with self._lock:
+                self._stats['partial_errors'] += transcriber.failures
+        if not transcript:
+            raise ValueError('Não foi possível transcrever o áudio. Tente falar mais claramente.')
+        self._send(ws, 'transcript', text=transcript)
+
+        # 3. Resposta em streaming; cada frase completa já vai para o TTS
+        chunker = SentenceChunker()
+        first_audio = None
+
+        with SpeechQueue(self.assistant.text_to_speech, self.tts_workers) as speech:
+            def send_ready(block):
+                # Envia os áudios prontos, sempre na ordem das frases
+                nonlocal first_audio
+                for index, spoken, audio in speech.ready(block):
+                    if first_audio is None:
+                        first_audio = time.perf_counter()
+                    self._send(ws, 'audio', index=index, text=spoken)
+                    ws.send(audio)
+
+            for delta in self.assistant.stream_chat_with_assistant(transcript, session_id):
+                self._send(ws, 'delta', text=delta)
+                speech.submit(chunker.feed(delta))
+                send_ready(block=False)
+
+            speech.submit(chunker.flush())
+            send_ready(block=True)
+            chunks = speech.submitted
+
+        self._send(ws, 'done')
+
+        with self._lock:
+            self._stats['turns'] += 1
+            self._stats['tts_chunks'] += chunks
+            self._stats['transcribe_seconds'] += transcribed_at - stopped_at
+            if first_audio is not None:
+                self._stats['first_audio_seconds'] += first_audio - stopped_at
+
+    def stats(self):
+        """Métricas dos turnos de voz (tempos médios medidos a partir do fim da fala)"""
+        with self._lock:
+            stats = dict(self._stats)
+        turns = stats.pop('turns')
+        transcribe_seconds = stats.pop('transcribe_seconds')
+        first_audio_seconds = stats.pop('first_audio_seconds')
+        stats['turns'] = turns
+        stats['avg_transcribe_seconds'] = round(transcribe_seconds / turns, 3) if turns else None
+        stats['avg_first_audio_seconds'] = round(first_audio_seconds / turns, 3) if turns else None
+        return stats